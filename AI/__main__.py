@@ -0,0 +1,252 @@
+import argparse
+import time
+
+'''
+Command line for the models: python -m AI {train, pretrain, generate, import, evaluate, example} ...
+
+Only argparse is imported at start; torch and the model modules are imported by the command that needs
+them, so --help and argument errors return immediately.
+
+train    - self-play training (training.py) from fresh models or --resume, checkpoints written with
+           checkpoint.save_checkpoint every --save-every episodes and at the end
+pretrain - supervised bidding model training on recorded PBN/LIN auctions (pretraining.py), written as
+           a checkpoint that train --resume continues from
+generate - self-play episodes of a checkpoint (or fresh models) appended to a trajectory store
+           (trajectories.py) for offline training
+import   - recorded PBN/LIN auctions encoded into a trajectory store
+evaluate - duplicate match of a checkpoint against a bot from agents.py (duplicate.py), all deals
+           played; python duplicate.py compares two checkpoints with early stopping
+example  - runs both models on one dealt hand and prints the outputs
+
+python -m AI train --episodes 10000 --out checkpoint.pt --batch-episodes 16 --baseline-decay 0.99
+python -m AI train --episodes 2000 --profile-every 10 --capture cprofile
+python -m AI pretrain boards.pbn --epochs 2 --out checkpoint.pt --workers 4
+python -m AI generate --checkpoint checkpoint.pt --episodes 100000 --out selfplay
+python -m AI evaluate checkpoint.pt --deals 500 --opponent rule
+'''
+
+
+def train(args):
+    import random
+
+    import torch
+    import torch.optim as optim
+
+    import profiling
+    from AI import training
+    from AI.checkpoint import load_checkpoint, save_checkpoint
+    from AI.encoding import ROLES, StateEncoder
+    from AI.models import BiddingModel, PlayingModel, playing_parameters, shared_playing_models
+
+    random.seed(args.seed)
+    torch.manual_seed(args.seed)
+    episodes = 0
+    baseline = training.RewardBaseline(args.baseline_decay)
+    if args.resume:
+        bidding_model, playing_models, checkpoint = load_checkpoint(args.resume)
+        episodes = checkpoint['metadata'].get('episodes', 0)
+        baseline.value = checkpoint['metadata'].get('baseline', 0.0)
+        baseline.initialized = episodes > 0
+    elif args.shared_playing:
+        bidding_model, playing_models = BiddingModel(), shared_playing_models(role_heads=args.role_heads)
+    else:
+        bidding_model, playing_models = BiddingModel(), {role: PlayingModel() for role in ROLES}
+    bidding_model.train()
+    for model in playing_models.values():
+        model.train()
+    optimizers = (optim.Adam(bidding_model.parameters(), lr=args.lr),
+                  optim.Adam(playing_parameters(playing_models), lr=args.lr))
+    if args.resume and 'optimizers' in checkpoint:
+        for optimizer, state in zip(optimizers, checkpoint['optimizers']):
+            optimizer.load_state_dict(state)
+
+    replay = None
+    if args.replay_capacity:
+        from AI.replay import ReplayMemory
+        replay = ReplayMemory(args.replay_capacity, args.replay_capacity, seed=args.seed)
+
+    # After the imports above: the training functions are looked up on the module so the patched ones run
+    profiled = profiling.from_args(args)
+    encoder = StateEncoder()
+    target = episodes + args.episodes
+    saved = episodes
+    start = time.perf_counter()
+    while episodes < target:
+        trajectories = [training.play_episode(bidding_model, playing_models, encoder)
+                        for _ in range(min(args.batch_episodes, target - episodes))]
+        if replay is None:
+            training.update_models(bidding_model, playing_models, *optimizers, trajectories, baseline.value,
+                                   args.accumulation_steps)
+        else:
+            replay.add(trajectories, baseline.value)
+            for _ in range(args.replay_updates):
+                replay.update(bidding_model, playing_models, *optimizers, args.replay_batch, args.replay_batch)
+        baseline.update([trajectory['reward'] for trajectory in trajectories])
+        episodes += len(trajectories)
+        profiling.step(len(trajectories))
+        if episodes - saved >= args.save_every or episodes == target:
+            save_checkpoint(args.out, bidding_model, playing_models, optimizers, episodes=episodes,
+                            baseline=baseline.value)
+            saved = episodes
+            print(f"episodes {episodes}  baseline {baseline.value:.1f}  "
+                  f"{(episodes - target + args.episodes) / (time.perf_counter() - start):.1f} episodes/s")
+    if profiled:
+        profiling.disable()
+
+
+def generate(args):
+    import random
+
+    import torch
+
+    from AI.checkpoint import load_checkpoint
+    from AI.encoding import ROLES, StateEncoder
+    from AI.models import BiddingModel, PlayingModel
+    from AI.trajectories import TrajectoryWriter
+    from AI.training import play_episode
+
+    random.seed(args.seed)
+    torch.manual_seed(args.seed)
+    if args.checkpoint:
+        bidding_model, playing_models, _ = load_checkpoint(args.checkpoint)
+    else:
+        bidding_model, playing_models = BiddingModel(), {role: PlayingModel() for role in ROLES}
+    encoder = StateEncoder()
+    start = time.perf_counter()
+    with TrajectoryWriter(args.out, args.shard_size) as writer:
+        for _ in range(args.episodes):
+            writer.append(play_episode(bidding_model, playing_models, encoder))
+        total = writer.index['episodes']
+    print(f"episodes: {args.episodes} ({total} in {args.out})")
+    print(f"episodes_per_second: {args.episodes / (time.perf_counter() - start):.1f}")
+
+
+def pretrain(args):
+    import torch
+    import torch.optim as optim
+
+    from AI.checkpoint import load_checkpoint, save_checkpoint
+    from AI.encoding import ROLES
+    from AI.models import BiddingModel, PlayingModel
+    from AI.pretraining import auction_batches, pretrain
+
+    torch.manual_seed(args.seed)
+    metadata = {}
+    if args.resume:
+        bidding_model, playing_models, checkpoint = load_checkpoint(args.resume)
+        metadata = checkpoint['metadata']
+    else:
+        bidding_model, playing_models = BiddingModel(), {role: PlayingModel() for role in ROLES}
+    optimizer = optim.Adam(bidding_model.parameters(), lr=args.lr)
+    rejected = []
+    start = time.perf_counter()
+    for epoch in range(args.epochs):
+        rejected.clear()
+        batches = auction_batches(args.paths, args.batch_size, args.workers, args.chunk_boards, args.shuffle_chunks,
+                                  seed=args.seed + epoch, rejected=rejected)
+        loss, accuracy = pretrain(bidding_model, batches, optimizer)
+        print(f"epoch {epoch + 1}  loss {loss:.4f}  accuracy {accuracy:.3f}  rejected boards {len(rejected)}  "
+              f"{time.perf_counter() - start:.1f}s")
+    metadata['pretrained_epochs'] = metadata.get('pretrained_epochs', 0) + args.epochs
+    save_checkpoint(args.out, bidding_model, playing_models, **metadata)
+
+
+def import_records(args):
+    from AI.pretraining import import_auctions
+
+    rejected = []
+    start = time.perf_counter()
+    boards = import_auctions(args.paths, args.out, args.workers, args.chunk_boards, args.shard_size, rejected)
+    print(f"boards: {boards}")
+    print(f"rejected: {len(rejected)}")
+    print(f"boards_per_second: {boards / (time.perf_counter() - start):.1f}")
+
+
+def evaluate(args):
+    from duplicate import compare
+    from game.deals import generate_deals
+
+    summary = compare(args.checkpoint, args.opponent, generate_deals(args.deals, args.seed), args.workers,
+                      seed=args.seed, greedy=args.greedy, early_stop=False)
+    print(f"opponent: {args.opponent}")
+    for key, value in summary.items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+def example(args):
+    from AI.AI import example
+    example()
+
+
+def main(argv=None):
+    from profiling import add_arguments as add_profiling_arguments
+
+    parser = argparse.ArgumentParser(prog='python -m AI', description="Train and evaluate the bridge models")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_train = commands.add_parser('train', help="self-play training")
+    parser_train.add_argument('--episodes', type=int, default=10000)
+    parser_train.add_argument('--out', default='checkpoint.pt', help="checkpoint to write")
+    parser_train.add_argument('--resume', help="checkpoint to continue from")
+    parser_train.add_argument('--batch-episodes', type=int, default=16)
+    parser_train.add_argument('--accumulation-steps', type=int, default=1)
+    parser_train.add_argument('--baseline-decay', type=float, help="running reward baseline, off by default")
+    parser_train.add_argument('--lr', type=float, default=0.001)
+    parser_train.add_argument('--shared-playing', action='store_true', help="one playing model for all roles")
+    parser_train.add_argument('--role-heads', action='store_true', help="per-role output heads on the shared model")
+    parser_train.add_argument('--replay-capacity', type=int, default=0,
+                              help="decisions per prioritized replay buffer (bidding and each role), 0 for none")
+    parser_train.add_argument('--replay-batch', type=int, default=256)
+    parser_train.add_argument('--replay-updates', type=int, default=1, help="replay updates per batch of episodes")
+    parser_train.add_argument('--save-every', type=int, default=1000, help="episodes between checkpoints")
+    parser_train.add_argument('--seed', type=int, default=0)
+    add_profiling_arguments(parser_train)
+    parser_train.set_defaults(run=train)
+
+    parser_pretrain = commands.add_parser('pretrain', help="supervised bidding training on PBN/LIN auctions")
+    parser_pretrain.add_argument('paths', nargs='+', help=".pbn or .lin files, optionally gzipped")
+    parser_pretrain.add_argument('--out', default='checkpoint.pt', help="checkpoint to write")
+    parser_pretrain.add_argument('--resume', help="checkpoint to continue from")
+    parser_pretrain.add_argument('--epochs', type=int, default=1)
+    parser_pretrain.add_argument('--batch-size', type=int, default=256)
+    parser_pretrain.add_argument('--lr', type=float, default=0.001)
+    parser_pretrain.add_argument('--workers', type=int, default=1, help="parsing and encoding processes")
+    parser_pretrain.add_argument('--chunk-boards', type=int, default=1000)
+    parser_pretrain.add_argument('--shuffle-chunks', type=int, default=8, help="chunks mixed per shuffle window")
+    parser_pretrain.add_argument('--seed', type=int, default=0)
+    parser_pretrain.set_defaults(run=pretrain)
+
+    parser_generate = commands.add_parser('generate', help="write self-play episodes to a trajectory store")
+    parser_generate.add_argument('--checkpoint', help="models to play with, fresh models when omitted")
+    parser_generate.add_argument('--episodes', type=int, default=10000)
+    parser_generate.add_argument('--out', default='selfplay', help="store directory, appended to if it exists")
+    parser_generate.add_argument('--shard-size', type=int, default=1_000_000, help="decisions per shard")
+    parser_generate.add_argument('--seed', type=int, default=0)
+    parser_generate.set_defaults(run=generate)
+
+    parser_import = commands.add_parser('import', help="write PBN/LIN auctions to a trajectory store")
+    parser_import.add_argument('paths', nargs='+', help=".pbn or .lin files, optionally gzipped")
+    parser_import.add_argument('--out', default='recorded', help="store directory, appended to if it exists")
+    parser_import.add_argument('--workers', type=int, default=1)
+    parser_import.add_argument('--chunk-boards', type=int, default=1000)
+    parser_import.add_argument('--shard-size', type=int, default=1_000_000, help="decisions per shard")
+    parser_import.set_defaults(run=import_records)
+
+    parser_evaluate = commands.add_parser('evaluate', help="duplicate match against a bot")
+    parser_evaluate.add_argument('checkpoint')
+    parser_evaluate.add_argument('--deals', type=int, default=200)
+    parser_evaluate.add_argument('--opponent', default='rule', help="agent name from agents.py")
+    parser_evaluate.add_argument('--greedy', action='store_true', help="argmax actions instead of sampling")
+    parser_evaluate.add_argument('--workers', type=int, default=1)
+    parser_evaluate.add_argument('--seed', type=int, default=0)
+    parser_evaluate.set_defaults(run=evaluate)
+
+    parser_example = commands.add_parser('example', help="run both models on one deal")
+    parser_example.set_defaults(run=example)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
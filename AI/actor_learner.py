@@ -0,0 +1,167 @@
+import argparse
+import copy
+import queue
+import random
+import time
+
+import torch
+import torch.multiprocessing as mp
+import torch.optim as optim
+
+from AI.encoding import ROLES, StateEncoder
+from AI.models import BiddingModel, PlayingModel, playing_parameters, role_groups, shared_playing_models
+from AI.training import RewardBaseline, play_episode, update_models
+
+'''
+Self-play actor/learner for train_models.
+
+actors  - worker processes, each with its own copy of the bidding model and the role playing models,
+          playing deals with play_episode and putting the trajectories on a queue. Tensors sent through
+          a torch.multiprocessing queue are moved to shared memory, so only handles are pickled.
+learner - the main process, batching trajectories into update_models and publishing the new weights
+          into shared-memory models. Actors reload them when the version counter moves.
+
+python -m AI.actor_learner --actors 8 --episodes 10000 --batch-episodes 32
+'''
+
+
+def make_models(shared_playing=False, role_heads=False):
+    if shared_playing:
+        return BiddingModel(), shared_playing_models(role_heads=role_heads)
+    return BiddingModel(), {role: PlayingModel() for role in ROLES}
+
+
+def copy_models(source, target):
+    # (bidding model, playing models) -> same, parameters copied in place so shared storage is kept
+    target[0].load_state_dict(source[0].state_dict())
+    for (model, _), (copied, _) in zip(role_groups(source[1]), role_groups(target[1])):
+        copied.load_state_dict(model.state_dict())
+
+
+def actor(rank, shared, version, trajectories, stop, sync_every, seed):
+    torch.set_num_threads(1)
+    random.seed(seed + rank)
+    torch.manual_seed(seed + rank)
+    # Private copy with the learner's architecture, a shared playing model stays one model
+    models = copy.deepcopy(shared)
+    encoder = StateEncoder()
+    seen = -1
+    episodes = 0
+    while not stop.is_set():
+        if episodes % sync_every == 0 and version.value != seen:
+            with version.get_lock():
+                copy_models(shared, models)
+                seen = version.value
+        trajectory = play_episode(models[0], models[1], encoder)
+        trajectory['version'] = seen
+        trajectory['actor'] = rank
+        episodes += 1
+        while not stop.is_set():
+            try:
+                trajectories.put(trajectory, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+    # Trajectories still buffered are dropped, the learner has stopped reading
+    trajectories.cancel_join_thread()
+
+
+class ActorLearner:
+    def __init__(self, num_actors, batch_episodes=16, sync_every=1, lr=0.001, queue_size=256, seed=0,
+                 models=None, baseline_decay=None, accumulation_steps=1, shared_playing=False, role_heads=False):
+        self.num_actors = num_actors
+        self.batch_episodes = batch_episodes
+        self.baseline = RewardBaseline(baseline_decay)
+        self.accumulation_steps = accumulation_steps
+        self.sync_every = sync_every
+        self.seed = seed
+        self.context = mp.get_context('spawn')
+
+        if models is None:
+            models = make_models(shared_playing, role_heads)
+        self.bidding_model, self.playing_models = models
+        self.optimizer_bidding = optim.Adam(self.bidding_model.parameters(), lr=lr)
+        self.optimizer_playing = optim.Adam(playing_parameters(self.playing_models), lr=lr)
+
+        self.shared = copy.deepcopy((self.bidding_model, self.playing_models))
+        self.shared[0].share_memory()
+        for model in self.shared[1].values():
+            model.share_memory()
+        self.version = self.context.Value('i', 0)
+        self.trajectories = self.context.Queue(queue_size)
+        self.stop = self.context.Event()
+        self.actors = []
+
+    def publish(self):
+        with self.version.get_lock():
+            copy_models((self.bidding_model, self.playing_models), self.shared)
+            self.version.value += 1
+
+    def start(self):
+        for rank in range(self.num_actors):
+            process = self.context.Process(target=actor, daemon=True,
+                                           args=(rank, self.shared, self.version, self.trajectories, self.stop,
+                                                 self.sync_every, self.seed))
+            process.start()
+            self.actors.append(process)
+
+    def shutdown(self):
+        self.stop.set()
+        for process in self.actors:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self.actors = []
+
+    def train(self, episodes, log_every=0):
+        # Runs until the learner has consumed `episodes` trajectories, returns throughput and staleness stats
+        self.start()
+        start = time.perf_counter()
+        consumed = 0
+        updates = 0
+        staleness = 0
+        try:
+            while consumed < episodes:
+                batch = [self.trajectories.get() for _ in range(min(self.batch_episodes, episodes - consumed))]
+                staleness += sum(self.version.value - trajectory['version'] for trajectory in batch)
+                update_models(self.bidding_model, self.playing_models, self.optimizer_bidding,
+                              self.optimizer_playing, batch, self.baseline.value, self.accumulation_steps)
+                self.baseline.update([trajectory['reward'] for trajectory in batch])
+                self.publish()
+                consumed += len(batch)
+                updates += 1
+                if log_every and updates % log_every == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"episodes {consumed}  updates {updates}  {consumed / elapsed:.1f} episodes/s")
+        finally:
+            self.shutdown()
+        elapsed = time.perf_counter() - start
+        return {'episodes': consumed, 'updates': updates, 'seconds': elapsed,
+                'episodes_per_second': consumed / elapsed, 'mean_staleness': staleness / max(consumed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process self-play training")
+    parser.add_argument('--actors', type=int, default=max(1, mp.cpu_count() - 1))
+    parser.add_argument('--episodes', type=int, default=10000)
+    parser.add_argument('--batch-episodes', type=int, default=16)
+    parser.add_argument('--sync-every', type=int, default=1, help="episodes between weight checks in an actor")
+    parser.add_argument('--lr', type=float, default=0.001)
+    parser.add_argument('--baseline-decay', type=float, help="running reward baseline, off by default")
+    parser.add_argument('--accumulation-steps', type=int, default=1)
+    parser.add_argument('--shared-playing', action='store_true', help="one playing model for all roles")
+    parser.add_argument('--role-heads', action='store_true', help="per-role output heads on the shared model")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log-every', type=int, default=10, help="updates between progress lines")
+    args = parser.parse_args()
+
+    learner = ActorLearner(args.actors, args.batch_episodes, args.sync_every, args.lr, seed=args.seed,
+                           baseline_decay=args.baseline_decay, accumulation_steps=args.accumulation_steps,
+                           shared_playing=args.shared_playing, role_heads=args.role_heads)
+    stats = learner.train(args.episodes, args.log_every)
+    for key, value in stats.items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import numpy as np
+import torch
+
+from AI.encoding import ROLES, StateEncoder, role_of
+from AI.models import BiddingModel, PlayingModel, logit_mask
+from agents import Agent, RuleBasedAgent, auction_ranges
+from ismcts import HandConstraint, make_pool, search
+
+
+class ModelAgent(Agent):
+    # Plays with the bidding model and one playing model per role, states come from an incremental encoder
+    name = 'model'
+
+    def __init__(self, bidding_model=None, playing_models=None, greedy=False, seed=None):
+        self.bidding_model = bidding_model or BiddingModel()
+        self.playing_models = playing_models or {role: PlayingModel() for role in ROLES}
+        self.greedy = greedy
+        self.generator = torch.Generator()
+        if seed is not None:
+            self.generator.manual_seed(seed)
+        self.encoder = StateEncoder()
+        self.declarer = None
+
+    def reset(self, hands, dealer, vulnerable):
+        self.encoder.reset(hands, dealer, vulnerable)
+        self.declarer = None
+
+    def observe_bid(self, seat, action):
+        self.encoder.record_bid(seat, action)
+
+    def start_play(self, declarer, contract):
+        self.declarer = declarer
+        self.encoder.start_play(declarer, contract)
+
+    def observe_card(self, seat, card):
+        self.encoder.record_card(seat, card)
+
+    def choose_bid(self, obs, mask):
+        with torch.no_grad():
+            logits = self.bidding_model(self.encoder.bidding_state(obs.seat))
+        return self._select(logits, mask)
+
+    def role(self, seat):
+        return role_of(seat, self.declarer)
+
+    def choose_card(self, obs, mask):
+        model = self.playing_models[self.role(obs.seat)]
+        with torch.no_grad():
+            logits = model(self.encoder.playing_state(obs.seat), logit_mask(mask))
+        return self._select(logits, mask)
+
+    def _select(self, logits, mask):
+        logits = logits + logit_mask(mask)
+        if self.greedy:
+            return int(logits.argmax())
+        return int(torch.multinomial(torch.softmax(logits, dim=-1), 1, generator=self.generator))
+
+
+class ISMCTSAgent(ModelAgent):
+    # Card play by information-set MCTS (ismcts.py) with the role playing model as a prior at the root;
+    # bidding is left to another agent. The hidden hands are sampled to fit the auction
+    # (constraint='auction', read with agents.auction_ranges), a HandConstraint, or freely (None).
+    # last_policy keeps the root visit distribution, e.g. for distillation.
+    name = 'ismcts'
+
+    def __init__(self, bidder=None, simulations=1000, time_limit=None, workers=1, use_prior=True,
+                 constraint='auction', seed=None, **kwargs):
+        super().__init__(seed=seed, **kwargs)
+        self.bidder = bidder or RuleBasedAgent()
+        self.simulations = simulations
+        self.time_limit = time_limit
+        self.workers = workers
+        self.use_prior = use_prior
+        self.constraint = constraint
+        self.seed = seed
+        self.moves = 0
+        self.pool = make_pool(workers) if workers > 1 else None
+        self.last_policy = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def choose_bid(self, obs, mask):
+        return self.bidder.choose_bid(obs, mask)
+
+    def choose_card(self, obs, mask):
+        legal = np.flatnonzero(mask)
+        if len(legal) == 1:
+            return int(legal[0])
+        prior = None
+        if self.use_prior:
+            model = self.playing_models[self.role(obs.seat)]
+            with torch.no_grad():
+                logits = model(self.encoder.playing_state(obs.seat), logit_mask(mask))
+            prior = torch.softmax(logits, dim=-1).tolist()
+        seed = None if self.seed is None else self.seed * 1000 + self.moves
+        self.moves += 1
+        constraint = self.constraint
+        if constraint == 'auction':
+            constraint = HandConstraint(auction_ranges(obs.bids))
+        visits = search(obs.game, self.simulations, self.time_limit, prior, constraint, self.pool, self.workers, seed)
+        total = sum(visits.values())
+        self.last_policy = np.zeros(52, dtype=np.float32)
+        for card, count in visits.items():
+            self.last_policy[card] = count / total
+        return max(visits, key=visits.get)
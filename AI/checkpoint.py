@@ -0,0 +1,74 @@
+import os
+
+import torch
+
+from AI.models import BiddingModel, PlayingModel, SharedPlayingModel
+
+'''
+Training checkpoints: the bidding model, the playing models, optional optimizer states and metadata in
+one torch.save file. Each distinct playing model is stored once with the role -> model aliases, so a
+shared playing model comes back shared.
+
+load_checkpoint is the fast start path for workers and tools: torch.load with weights_only (plain tensors
+and containers, nothing unpickled as code) and mmap=True, so tensors are mapped from the file rather than
+read, and the models are built on the meta device and take the mapped tensors with assign=True, without
+a random init or a copy. The mapping is private, training on loaded weights never writes to the file.
+'''
+
+MODEL_CLASSES = {'BiddingModel': BiddingModel, 'PlayingModel': PlayingModel, 'SharedPlayingModel': SharedPlayingModel}
+
+
+def model_spec(model):
+    return {'class': type(model).__name__, 'role_heads': getattr(model, 'role_heads', False)}
+
+
+def build_model(spec):
+    cls = MODEL_CLASSES[spec['class']]
+    return cls(spec['role_heads']) if cls is SharedPlayingModel else cls()
+
+
+def distinct(models):
+    # {first name: model} over the distinct models, and name -> first name
+    firsts, aliases = {}, {}
+    for name, model in models.items():
+        first = next((f for f, m in firsts.items() if m is model), name)
+        firsts.setdefault(first, model)
+        aliases[name] = first
+    return firsts, aliases
+
+
+def load_weights(spec, state):
+    with torch.device('meta'):
+        model = build_model(spec)
+    model.load_state_dict(state, assign=True)
+    return model
+
+
+def save_checkpoint(path, bidding_model, playing_models, optimizers=None, **metadata):
+    # optimizers - optional (bidding, playing) optimizers, metadata - plain values (episodes, baseline...)
+    firsts, aliases = distinct(playing_models)
+    checkpoint = {
+        'bidding': bidding_model.state_dict(),
+        'playing': {name: model.state_dict() for name, model in firsts.items()},
+        'specs': {name: model_spec(model) for name, model in firsts.items()},
+        'aliases': aliases,
+        'metadata': metadata,
+    }
+    if optimizers is not None:
+        checkpoint['optimizers'] = [optimizer.state_dict() for optimizer in optimizers]
+    # Written next to the target and renamed, a reader never sees a partial file
+    temporary = f"{path}.tmp"
+    torch.save(checkpoint, temporary)
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path, mmap=True):
+    # -> (bidding model, playing models, checkpoint dict with 'metadata' and maybe 'optimizers'), in eval mode
+    checkpoint = torch.load(path, map_location='cpu', mmap=mmap, weights_only=True)
+    bidding_model = load_weights({'class': 'BiddingModel', 'role_heads': False}, checkpoint['bidding'])
+    models = {name: load_weights(checkpoint['specs'][name], state) for name, state in checkpoint['playing'].items()}
+    playing_models = {role: models[first] for role, first in checkpoint['aliases'].items()}
+    bidding_model.eval()
+    for model in models.values():
+        model.eval()
+    return bidding_model, playing_models, checkpoint
@@ -0,0 +1,266 @@
+import numpy as np
+
+from game.bids import BID_ORDINAL, DOUBLE, PASS, REDOUBLE, legal_bid_masks as legal_bid_masks_from_state
+from game.bitboard import trick_winner
+from game.deals import card_bits
+from game.vec_env import follow_suit
+
+'''
+Model input layout. Seats in the history and cards-played blocks are relative to the observer
+(0 self, 1 left-hand opponent, 2 partner, 3 right-hand opponent).
+
+bidding state (212): hand 52 | bidding history 156 | auction position 4
+playing state (524): hand 52 | bidding history 156 | last bid value 1 | last bid suit 5 |
+                     cards played by 4 players 208 | role indicator 4 | dummy hand 52 | trick leader 4 |
+                     current trick winner 4 | own tricks 14 | opponent tricks 14 | doubled 3 | vulnerable 2 |
+                     position in trick 4 | trick number 1
+bidding history: 39 slots per relative seat - 35 bids, double, redouble, last action was pass, dealer
+
+torch is imported when the first encoder or batch is built, the layout constants and role helpers
+load without it.
+'''
+
+BIDDING_STATE_SIZE = 212
+PLAYING_STATE_SIZE = 524
+
+HAND = 0
+HISTORY = 52
+HISTORY_SLOTS = 39
+DOUBLE_SLOT = 35
+REDOUBLE_SLOT = 36
+PASS_SLOT = 37
+DEALER_SLOT = 38
+AUCTION_POSITION = 208
+
+LAST_BID_VALUE = 208
+LAST_BID_SUIT = 209
+PLAYED = 214
+ROLE = 422
+DUMMY = 426
+LEADER = 478
+CURRENT_WINNER = 482
+OWN_TRICKS = 486
+OPPONENT_TRICKS = 500
+DOUBLED = 514
+VULNERABLE = 517
+TRICK_POSITION = 519
+TRICK_NUMBER = 523
+
+ROLES = ['quarterback', 'partner', 'defender1', 'defender2']
+ROLE_BY_OFFSET = ['quarterback', 'defender1', 'partner', 'defender2']  # seat offset from the declarer
+
+
+def hand_bits(hand):
+    return np.unpackbits(np.array([hand], dtype='<u8').view(np.uint8), bitorder='little')[:52]
+
+
+def role_of(seat, declarer):
+    return ROLE_BY_OFFSET[(seat - declarer) % 4]
+
+
+class StateEncoder:
+    # Preallocated per-seat input buffers, updated in place as the deal progresses
+    def __init__(self):
+        self.bidding = np.zeros((4, BIDDING_STATE_SIZE), dtype=np.float32)
+        self.playing = np.zeros((4, PLAYING_STATE_SIZE), dtype=np.float32)
+        import torch
+        self.bidding_tensor = torch.from_numpy(self.bidding)
+        self.playing_tensor = torch.from_numpy(self.playing)
+        self.hands = [0, 0, 0, 0]
+        self.dealer = 0
+        self.declarer = None
+        self.trump = None
+        self.doubled = 0
+        self.leader = 0
+        self.trick = []
+        self.tricks_won = [0, 0]
+        self.tricks_played = 0
+
+    def reset(self, hands, dealer=0, vulnerable=(False, False)):
+        self.bidding.fill(0)
+        self.playing.fill(0)
+        self.hands = [int(hand) for hand in hands]
+        self.dealer = dealer
+        self.declarer = None
+        self.trump = None
+        self.doubled = 0
+        self.trick = []
+        self.tricks_won = [0, 0]
+        self.tricks_played = 0
+        for seat in range(4):
+            bits = hand_bits(self.hands[seat])
+            self.bidding[seat, HAND:HAND + 52] = bits
+            self.playing[seat, HAND:HAND + 52] = bits
+            dealer_slot = HISTORY + ((dealer - seat) % 4) * HISTORY_SLOTS + DEALER_SLOT
+            self.bidding[seat, dealer_slot] = 1
+            self.playing[seat, dealer_slot] = 1
+            self.bidding[seat, AUCTION_POSITION + (seat - dealer) % 4] = 1
+            self.playing[seat, VULNERABLE] = vulnerable[seat % 2]
+            self.playing[seat, VULNERABLE + 1] = vulnerable[1 - seat % 2]
+
+    def reset_from_game(self, game):
+        self.reset([player.mask for player in game.players], game.current_player_index, game.vulnerable)
+
+    def record_bid(self, seat, action):
+        # Double and redouble slots describe the current contract, so a new bid clears them
+        slot = {DOUBLE: DOUBLE_SLOT, REDOUBLE: REDOUBLE_SLOT}.get(action, action)
+        for observer in range(4):
+            base = HISTORY + ((seat - observer) % 4) * HISTORY_SLOTS
+            if action == PASS:
+                self.bidding[observer, base + PASS_SLOT] = 1
+                self.playing[observer, base + PASS_SLOT] = 1
+                continue
+            if action < DOUBLE:
+                for relative in range(4):
+                    start = HISTORY + relative * HISTORY_SLOTS + DOUBLE_SLOT
+                    self.bidding[observer, start:start + 2] = 0
+                    self.playing[observer, start:start + 2] = 0
+            self.bidding[observer, base + slot] = 1
+            self.playing[observer, base + slot] = 1
+            self.bidding[observer, base + PASS_SLOT] = 0
+            self.playing[observer, base + PASS_SLOT] = 0
+        if action == DOUBLE:
+            self.doubled = 1
+        elif action == REDOUBLE:
+            self.doubled = 2
+        elif action != PASS:
+            self.doubled = 0
+            self.playing[:, LAST_BID_VALUE] = action // 5 + 1
+            self.playing[:, LAST_BID_SUIT:LAST_BID_SUIT + 5] = 0
+            self.playing[:, LAST_BID_SUIT + action % 5] = 1
+
+    def start_play(self, declarer, contract):
+        self.declarer = declarer
+        self.trump = None if contract % 5 == 4 else contract % 5
+        self.leader = (declarer + 1) % 4
+        for seat in range(4):
+            self.playing[seat, ROLE + ROLES.index(role_of(seat, declarer))] = 1
+            self.playing[seat, OWN_TRICKS] = 1
+            self.playing[seat, OPPONENT_TRICKS] = 1
+            self.playing[seat, DOUBLED + self.doubled] = 1
+        self._start_trick()
+
+    def record_card(self, seat, card):
+        dummy = (self.declarer + 2) % 4
+        if self.tricks_played == 0 and not self.trick:
+            # Dummy is shown to everyone after the opening lead
+            self.playing[:, DUMMY:DUMMY + 52] = hand_bits(self.hands[dummy])
+
+        self.hands[seat] &= ~(1 << card)
+        self.playing[seat, HAND + card] = 0
+        if seat == dummy:
+            self.playing[:, DUMMY + card] = 0
+        for observer in range(4):
+            self.playing[observer, PLAYED + ((seat - observer) % 4) * 52 + card] = 1
+
+        self.trick.append(card)
+        winner = (self.leader + trick_winner(self.trick, self.trump)) % 4
+        if len(self.trick) < 4:
+            for observer in range(4):
+                self.playing[observer, CURRENT_WINNER:CURRENT_WINNER + 4] = 0
+                self.playing[observer, CURRENT_WINNER + (winner - observer) % 4] = 1
+            return
+
+        for observer in range(4):
+            own, opponents = self.tricks_won[observer % 2], self.tricks_won[1 - observer % 2]
+            self.playing[observer, OWN_TRICKS + own] = 0
+            self.playing[observer, OPPONENT_TRICKS + opponents] = 0
+        self.tricks_won[winner % 2] += 1
+        for observer in range(4):
+            own, opponents = self.tricks_won[observer % 2], self.tricks_won[1 - observer % 2]
+            self.playing[observer, OWN_TRICKS + own] = 1
+            self.playing[observer, OPPONENT_TRICKS + opponents] = 1
+        self.tricks_played += 1
+        self.leader = winner
+        self.trick = []
+        self._start_trick()
+
+    def _start_trick(self):
+        for observer in range(4):
+            self.playing[observer, LEADER:LEADER + 4] = 0
+            self.playing[observer, LEADER + (self.leader - observer) % 4] = 1
+            self.playing[observer, CURRENT_WINNER:CURRENT_WINNER + 4] = 0
+            self.playing[observer, TRICK_POSITION:TRICK_POSITION + 4] = 0
+            self.playing[observer, TRICK_POSITION + (observer - self.leader) % 4] = 1
+        self.playing[:, TRICK_NUMBER] = self.tricks_played / 13
+
+    def bidding_state(self, seat):
+        return self.bidding_tensor[seat]
+
+    def playing_state(self, seat):
+        return self.playing_tensor[seat]
+
+    def hand_mask(self, seat):
+        return self.playing_tensor[seat, HAND:HAND + 52]
+
+
+def bid_action(bid):
+    # 'Pass', 'X', 'XX' or a VALID_BIDS string such as '3NT'
+    return BID_ORDINAL[bid]
+
+
+def _replay(encoder, game):
+    # Rebuilds a GameLogic deal into encoder from its public history
+    seats = {player.name: i for i, player in enumerate(game.players)}
+    hands = [player.mask for player in game.players]
+    for trick in game.tricks:
+        for player, card in trick.cards:
+            hands[seats[player.name]] |= 1 << card.index
+    encoder.reset(hands)
+    for name, bid in game.bidding.bids:
+        encoder.record_bid(seats[name], bid_action(bid))
+    if game.bidding.declarer is not None and game.bidding.is_bidding_over():
+        encoder.start_play(seats[game.bidding.declarer.name], bid_action(game.bidding.current_highest_bid))
+        for trick in game.tricks:
+            for player, card in trick.cards:
+                encoder.record_card(seats[player.name], card.index)
+
+
+def encode_bidding_batch(games, seats, out=None):
+    import torch
+    out = torch.zeros(len(games), BIDDING_STATE_SIZE) if out is None else out
+    rows = out.numpy()
+    encoder = StateEncoder()
+    for i, (game, seat) in enumerate(zip(games, seats)):
+        _replay(encoder, game)
+        rows[i] = encoder.bidding[seat]
+    return out
+
+
+def encode_playing_batch(games, seats, out=None):
+    # Fills an (N, 524) buffer from GameLogic objects, one row per (game, seat)
+    import torch
+    out = torch.zeros(len(games), PLAYING_STATE_SIZE) if out is None else out
+    rows = out.numpy()
+    encoder = StateEncoder()
+    for i, (game, seat) in enumerate(zip(games, seats)):
+        _replay(encoder, game)
+        rows[i] = encoder.playing[seat]
+    return out
+
+
+def legal_bid_masks(games):
+    # (N, 38) bool, one row per GameLogic for the player to bid; the auction states are gathered and
+    # looked up in one go (bids.legal_bid_masks, as VecBridgeEnv does)
+    import torch
+    bidding = [game.bidding for game in games]
+    highest = np.fromiter((b.highest for b in bidding), dtype=np.int64, count=len(games))
+    doubled = np.fromiter((b.doubled for b in bidding), dtype=np.int64, count=len(games))
+    passes = np.fromiter((b.passes for b in bidding), dtype=np.int64, count=len(games))
+    out = legal_bid_masks_from_state(highest, doubled, passes)
+    over = np.fromiter((b.is_bidding_over() for b in bidding), dtype=bool, count=len(games))
+    if over.any():
+        out = out & ~over[:, None]
+    return torch.from_numpy(out)
+
+
+def legal_play_masks(games, seats=None):
+    # (N, 52) bool; seats defaults to the player whose turn it is in each game
+    import torch
+    if seats is None:
+        seats = [game.current_player_index for game in games]
+    hands = np.fromiter((game.players[seat].mask for game, seat in zip(games, seats)), dtype=np.uint64,
+                        count=len(games))
+    lead = np.array([-1 if suit is None else suit for suit in (game.leading_suit() for game in games)],
+                    dtype=np.int64)
+    return torch.from_numpy(card_bits(follow_suit(hands, lead)).astype(bool))
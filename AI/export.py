@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import time
+import warnings
+
+import torch
+import torch.nn as nn
+
+from AI.agents import ModelAgent
+from AI.checkpoint import distinct, load_weights, model_spec
+from AI.encoding import BIDDING_STATE_SIZE, PLAYING_STATE_SIZE, ROLES
+from AI.inference import serving_models
+from AI.models import logit_mask, shared_playing_models
+from game.deals import generate_deals
+from match import MatchRunner
+
+'''
+CPU inference variants of the policy models.
+
+float    - eager float32, the reference
+compiled - torch.compile of the float model, compiled on the first call of each batch shape
+int8     - dynamic int8 quantization of the Linear layers (weights int8, activations quantized per call)
+script   - frozen TorchScript of the float model
+int8-script - frozen TorchScript of the int8 model
+
+export() writes a directory with manifest.json (model classes, name -> stored model), one float state
+dict per distinct model and the TorchScript files. load_models() rebuilds any variant by name from it;
+the compiled and int8 variants are derived from the float weights at load time. Models shared between
+names (a shared playing model) stay shared.
+
+check() compares every variant with the float models on held-out states recorded from greedy play of the
+float models, and times them at batch sizes 1 and 64.
+
+python -m AI.export --out exported --deals 200
+'''
+
+VARIANTS = ['float', 'compiled', 'int8', 'script', 'int8-script']
+
+
+def quiet(function, *args):
+    # Runs a torch.jit / torch.ao call without its deprecation warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return function(*args)
+
+
+def quantize(model):
+    return quiet(torch.ao.quantization.quantize_dynamic, model, {nn.Linear}, torch.qint8)
+
+
+def script(model):
+    return quiet(lambda m: torch.jit.freeze(torch.jit.script(m)), model)
+
+
+def make_variant(model, variant):
+    # Float model -> variant, in eval mode
+    model = model.eval()
+    if variant == 'float':
+        return model
+    if variant == 'compiled':
+        return torch.compile(model)
+    if variant == 'int8':
+        return quantize(model)
+    if variant == 'script':
+        return script(model)
+    if variant == 'int8-script':
+        return script(quantize(model))
+    raise ValueError(f"Unknown variant {variant}")
+
+
+def export(models, directory, variants=('script', 'int8-script')):
+    os.makedirs(directory, exist_ok=True)
+    firsts, aliases = distinct(models)
+    manifest = {'models': {}, 'aliases': aliases}
+    for name, model in firsts.items():
+        manifest['models'][name] = model_spec(model)
+        torch.save(model.state_dict(), os.path.join(directory, f"{name}.float.pt"))
+        for variant in variants:
+            if variant in ('script', 'int8-script'):
+                quiet(torch.jit.save, make_variant(model, variant), os.path.join(directory, f"{name}.{variant}.pt"))
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_float(directory, name, manifest):
+    path = os.path.join(directory, f"{name}.float.pt")
+    return load_weights(manifest['models'][name], torch.load(path, mmap=True, weights_only=True)).eval()
+
+
+def load_models(directory, variant='float'):
+    # name -> model of the variant, same names as the exported dict
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+    loaded = {}
+    for name in manifest['models']:
+        path = os.path.join(directory, f"{name}.{variant}.pt")
+        if variant in ('script', 'int8-script') and os.path.exists(path):
+            loaded[name] = quiet(torch.jit.load, path).eval()
+        else:
+            loaded[name] = make_variant(load_float(directory, name, manifest), variant)
+    return {name: loaded[first] for name, first in manifest['aliases'].items()}
+
+
+class RecordingModelAgent(ModelAgent):
+    # Greedy ModelAgent that keeps every (model name, state, legal mask) it decided on
+    def __init__(self, models):
+        super().__init__(models['bidding'], {role: models[role] for role in ROLES}, greedy=True)
+        self.records = []
+
+    def choose_bid(self, obs, mask):
+        self.records.append(('bidding', self.encoder.bidding_state(obs.seat).clone(), torch.tensor(mask)))
+        return super().choose_bid(obs, mask)
+
+    def choose_card(self, obs, mask):
+        self.records.append((self.role(obs.seat), self.encoder.playing_state(obs.seat).clone(), torch.tensor(mask)))
+        return super().choose_card(obs, mask)
+
+
+def held_out_states(models, deals=200, seed=12345):
+    # name -> (states, legal masks) from greedy play of `models` on deals not used in training
+    agent = RecordingModelAgent(models)
+    runner = MatchRunner([agent] * 4)
+    for hands in generate_deals(deals, seed):
+        runner.play_deal([int(hand) for hand in hands])
+    states = {}
+    for name, state, mask in agent.records:
+        states.setdefault(name, ([], []))
+        states[name][0].append(state)
+        states[name][1].append(mask)
+    return {name: (torch.stack(s), torch.stack(m)) for name, (s, m) in states.items()}
+
+
+def run(model, name, states, masks):
+    with torch.no_grad():
+        if name == 'bidding':
+            return model(states) + logit_mask(masks)
+        return model(states, logit_mask(masks))
+
+
+def accuracy(reference, candidate, states):
+    # Agreement of the greedy (legal) actions and the largest absolute difference of the legal logits
+    agree, total, error = 0, 0, 0.0
+    for name, (s, m) in states.items():
+        expected, actual = run(reference[name], name, s, m), run(candidate[name], name, s, m)
+        agree += int((expected.argmax(dim=-1) == actual.argmax(dim=-1)).sum())
+        total += len(s)
+        error = max(error, float((expected - actual)[m.bool()].abs().max()))
+    return {'agreement': agree / total, 'max_abs_error': error}
+
+
+def latency(models, batch_size, number=200):
+    # Seconds per forward pass of the bidding model and of a playing model at batch_size
+    timings = {}
+    inputs = {'bidding': (torch.rand(batch_size, BIDDING_STATE_SIZE),),
+              'playing': (torch.rand(batch_size, PLAYING_STATE_SIZE), torch.zeros(batch_size, 52))}
+    for name, model in (('bidding', models['bidding']), ('playing', models[ROLES[0]])):
+        with torch.no_grad():
+            for _ in range(3):
+                model(*inputs[name])  # warm-up, compiles the compiled variant
+            start = time.perf_counter()
+            for _ in range(number):
+                model(*inputs[name])
+        timings[name] = (time.perf_counter() - start) / number
+    return timings
+
+
+def check(directory, variants=VARIANTS, deals=200, batch_sizes=(1, 64)):
+    # variant -> accuracy against the float models and latencies per batch size
+    reference = load_models(directory, 'float')
+    states = held_out_states(reference, deals)
+    report = {}
+    for variant in variants:
+        models = load_models(directory, variant)
+        report[variant] = accuracy(reference, models, states)
+        for batch_size in batch_sizes:
+            for name, seconds in latency(models, batch_size).items():
+                report[variant][f"{name}_b{batch_size}_us"] = seconds * 1e6
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the policy models for CPU inference and check the variants")
+    parser.add_argument('--out', default='exported', help="export directory")
+    parser.add_argument('--variants', nargs='+', default=VARIANTS, choices=VARIANTS)
+    parser.add_argument('--deals', type=int, default=200, help="held-out deals for the accuracy check")
+    parser.add_argument('--shared-playing', action='store_true')
+    parser.add_argument('--threads', type=int, help="torch intra-op threads")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+    playing_models = shared_playing_models() if args.shared_playing else None
+    export(serving_models(playing_models=playing_models), args.out)
+    for variant, row in check(args.out, args.variants, args.deals).items():
+        print(f"{variant:<12} " + "  ".join(f"{key} {value:.4g}" for key, value in row.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import argparse
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+
+from AI.agents import ModelAgent
+from AI.encoding import ROLES
+from AI.models import BiddingModel, PlayingModel, logit_mask
+from game.deals import generate_deals
+from match import MatchRunner
+
+'''
+Batched inference for self-play. Games submit (model name, state, legal mask) requests from their own
+threads. One server thread collects requests until max_batch_size is reached or max_wait seconds have
+passed since the first one, runs each model once on its stacked requests and resolves the futures
+with the chosen actions. Torch releases the GIL during the forward pass, so game threads keep
+stepping while a batch runs.
+
+models - name -> model, normally 'bidding' plus one PlayingModel per role (see serving_models). Names
+         mapped to the same model (shared_playing_models) are batched together, so all four seats share
+         one forward pass
+
+python -m AI.inference --games 64 --deals 2000 --max-batch-size 64 --max-wait 0.002
+'''
+
+
+class InferenceServer:
+    def __init__(self, models, max_batch_size=256, max_wait=0.002, greedy=False, seed=None):
+        self.models = models
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.greedy = greedy
+        self.generator = torch.Generator()
+        if seed is not None:
+            self.generator.manual_seed(seed)
+        self.requests = queue.SimpleQueue()
+        self.thread = None
+        self.batches = 0
+        self.served = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.requests.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def submit(self, model, state, mask):
+        future = Future()
+        self.requests.put((model, state, mask, future))
+        return future
+
+    def act(self, model, state, mask):
+        return self.submit(model, state, mask).result()
+
+    def _serve(self):
+        running = True
+        while running:
+            request = self.requests.get()
+            if request is None:
+                break
+            batch = [request]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    running = False
+                    break
+                batch.append(request)
+            self._run(batch)
+
+    def _run(self, batch):
+        groups = {}
+        for request in batch:
+            model = self.models[request[0]]
+            groups.setdefault(id(model), (model, []))[1].append(request)
+        for model, requests in groups.values():
+            try:
+                actions = self._forward(model, requests[0][0] == 'bidding', requests)
+            except Exception as error:
+                for request in requests:
+                    request[3].set_exception(error)
+                continue
+            for request, action in zip(requests, actions):
+                request[3].set_result(action)
+        self.batches += 1
+        self.served += len(batch)
+
+    def _forward(self, model, bidding, requests):
+        states = torch.stack([request[1] for request in requests])
+        mask = logit_mask(np.stack([request[2] for request in requests]))
+        with torch.no_grad():
+            logits = model(states) if bidding else model(states, mask)
+        logits = logits + mask
+        if self.greedy:
+            return logits.argmax(dim=-1).tolist()
+        return torch.multinomial(torch.softmax(logits, dim=-1), 1, generator=self.generator)[:, 0].tolist()
+
+    def mean_batch_size(self):
+        return self.served / self.batches if self.batches else 0.0
+
+
+def serving_models(bidding_model=None, playing_models=None):
+    models = {'bidding': bidding_model or BiddingModel()}
+    models.update(playing_models or {role: PlayingModel() for role in ROLES})
+    for model in models.values():
+        model.eval()
+    return models
+
+
+class InferenceAgent(ModelAgent):
+    # ModelAgent whose forward passes go through an InferenceServer, one agent per concurrent game
+    name = 'served'
+
+    def __init__(self, server):
+        super().__init__(bidding_model=server.models['bidding'],
+                         playing_models={role: server.models[role] for role in ROLES})
+        self.server = server
+
+    def choose_bid(self, obs, mask):
+        return self.server.act('bidding', self.encoder.bidding_state(obs.seat), mask)
+
+    def choose_card(self, obs, mask):
+        return self.server.act(self.role(obs.seat), self.encoder.playing_state(obs.seat), mask)
+
+
+def self_play(server, deals, games):
+    # Plays deals on `games` threads, each a MatchRunner with its own InferenceAgent
+    results = []
+    chunks = [deals[i::games] for i in range(games)]
+
+    def play(chunk):
+        runner = MatchRunner([InferenceAgent(server)] * 4)
+        results.extend(runner.play(chunk))
+
+    threads = [threading.Thread(target=play, args=(chunk,)) for chunk in chunks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Self-play throughput through the batched inference server")
+    parser.add_argument('--games', type=int, default=64, help="concurrent games")
+    parser.add_argument('--deals', type=int, default=1000)
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-wait', type=float, default=0.002, help="seconds")
+    parser.add_argument('--models', help="directory written by AI.export, fresh models when omitted")
+    parser.add_argument('--variant', default='float', help="model variant to serve from --models, see AI/export.py")
+    parser.add_argument('--threads', type=int, help="torch intra-op threads")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+    deals = [[int(hand) for hand in hands] for hands in generate_deals(args.deals, args.seed)]
+    if args.models:
+        from AI.export import load_models
+        models = load_models(args.models, args.variant)
+    else:
+        models = serving_models()
+    with InferenceServer(models, args.max_batch_size, args.max_wait, seed=args.seed) as server:
+        start = time.perf_counter()
+        results = self_play(server, deals, args.games)
+        elapsed = time.perf_counter() - start
+    print(f"deals: {len(results)}")
+    print(f"seconds: {elapsed:.2f}")
+    print(f"decisions_per_second: {server.served / elapsed:.1f}")
+    print(f"mean_batch_size: {server.mean_batch_size():.1f}")
+
+
+if __name__ == "__main__":
+    main()
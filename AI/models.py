@@ -0,0 +1,98 @@
+import torch
+import torch.nn as nn
+
+from AI.encoding import ROLE, ROLES
+from game.bids import NUM_BID_ACTIONS
+
+'''
+Policy networks and action masking. Importing this module imports torch; the training loop is in
+training.py, checkpoints in checkpoint.py and the command line in __main__.py (python -m AI).
+'''
+
+
+# Define Bidding Model
+class BiddingModel(nn.Module):
+    def __init__(self):
+        super(BiddingModel, self).__init__()
+        self.fc1 = nn.Linear(212, 128)  # 212 = 52 (hand) + 156 (bidding history) + 4 (role indicator)
+        self.fc2 = nn.Linear(128, 64)
+        self.fc3 = nn.Linear(64, NUM_BID_ACTIONS)  # 35 bids, pass, double, redouble
+
+    def forward(self, x):
+        x = torch.relu(self.fc1(x))
+        x = torch.relu(self.fc2(x))
+        x = self.fc3(x)
+        return x
+
+
+# Define Playing Model
+class PlayingModel(nn.Module):
+    def __init__(self):
+        super(PlayingModel, self).__init__()
+        self.fc1 = nn.Linear(524, 128)  # 524 = 52 (hand) + 156 (bidding history) + 1 (last bid value) + 5 (last bid suit) + 208 (cards played by 4 players) + 4 (role indicator)
+        self.fc2 = nn.Linear(128, 64)
+        self.fc3 = nn.Linear(64, 52)  # 52 possible cards to play
+
+    def forward(self, x, hand_mask):
+        x = torch.relu(self.fc1(x))
+        x = torch.relu(self.fc2(x))
+        x = self.fc3(x)
+        x = x + hand_mask  # Apply the mask to the logits
+        return x
+
+
+class SharedPlayingModel(nn.Module):
+    # One playing model for all four roles, conditioned on the role indicator already in the state.
+    # role_heads adds a small output layer per role on top of the shared trunk
+    def __init__(self, role_heads=False):
+        super(SharedPlayingModel, self).__init__()
+        self.role_heads = role_heads
+        self.role = ROLE  # first role indicator column of the playing state
+        self.roles = len(ROLES)
+        self.fc1 = nn.Linear(524, 128)
+        self.fc2 = nn.Linear(128, 64)
+        self.fc3 = nn.Linear(64, 52 * self.roles if role_heads else 52)
+
+    def forward(self, x, hand_mask):
+        role = x[..., self.role:self.role + self.roles]
+        x = torch.relu(self.fc1(x))
+        x = torch.relu(self.fc2(x))
+        x = self.fc3(x)
+        if self.role_heads:
+            # Every row picks its role's head with the one-hot indicator
+            x = (x.unflatten(-1, (self.roles, 52)) * role.unsqueeze(-1)).sum(dim=-2)
+        return x + hand_mask
+
+
+def shared_playing_models(model=None, role_heads=False):
+    # playing_models dict with one SharedPlayingModel behind every role
+    model = model or SharedPlayingModel(role_heads)
+    return {role: model for role in ROLES}
+
+
+def playing_parameters(playing_models):
+    # Parameters of the distinct models in playing_models, a shared model is counted once
+    models = list({id(model): model for model in playing_models.values()}.values())
+    return [parameter for model in models for parameter in model.parameters()]
+
+
+def role_groups(playing_models):
+    # [(model, role indices)], roles served by the same model grouped so they take one forward pass
+    groups = {}
+    for i, role in enumerate(ROLES):
+        groups.setdefault(id(playing_models[role]), (playing_models[role], []))[1].append(i)
+    return list(groups.values())
+
+
+# Action selection with masking
+def logit_mask(legal):
+    # Bool legal-action mask -> additive mask, 0 for legal actions and -inf otherwise
+    legal = legal.bool() if isinstance(legal, torch.Tensor) else torch.tensor(legal, dtype=torch.bool)
+    return torch.zeros(legal.shape).masked_fill(~legal, float('-inf'))
+
+
+def sample_action(action_logits, legal):
+    action_logits = action_logits + logit_mask(legal)
+    action_probs = torch.softmax(action_logits, dim=-1)
+    action = torch.multinomial(action_probs, 1).item()
+    return action
@@ -0,0 +1,118 @@
+import numpy as np
+import torch
+import torch.nn as nn
+
+from AI.encoding import BIDDING_STATE_SIZE, PLAYING_STATE_SIZE, StateEncoder
+from AI.models import logit_mask
+from game.bids import NUM_BID_ACTIONS
+from game.records import legal_masks, map_chunks
+
+'''
+Supervised pretraining of the bidding model on recorded auctions (game/records.py).
+
+encode_auctions - one chunk of boards in the model input layout: every call replayed through a
+                  StateEncoder, giving the bidder's state (N, 212) float32, the recorded call, the legal
+                  mask before it, the auction position (0 dealer) and the number of calls per board. It
+                  runs inside the parsing workers of records.map_chunks, so only arrays leave them.
+auction_batches - shuffled training batches streamed from any number of files; shuffle_chunks encoded
+                  chunks are mixed at a time, which bounds memory whatever the size of the files.
+pretrain        - one pass of masked cross entropy (imitation of the recorded calls) over the batches.
+import_auctions - writes the encoded calls into a trajectory store (trajectories.py, kind 'bidding',
+                  reward 0) for the offline loaders.
+
+python -m AI pretrain boards.pbn archive.lin --epochs 2 --out checkpoint.pt --workers 4
+python -m AI import boards.pbn --out recorded
+'''
+
+_encoder = None
+
+
+def encode_auctions(records):
+    global _encoder
+    if _encoder is None:
+        _encoder = StateEncoder()
+    calls = np.array([len(record.auction) for record in records], dtype=np.int64)
+    rows = int(calls.sum())
+    chunk = {
+        'states': np.zeros((rows, BIDDING_STATE_SIZE), dtype=np.float32),
+        'actions': np.zeros(rows, dtype=np.int64),
+        'masks': np.zeros((rows, NUM_BID_ACTIONS), dtype=bool),
+        'position': np.zeros(rows, dtype=np.int64),
+        'calls': calls,
+    }
+    row = 0
+    for record in records:
+        _encoder.reset(record.hands, record.dealer, record.vulnerable)
+        count = len(record.auction)
+        chunk['masks'][row:row + count] = legal_masks(record.auction)
+        for i, call in enumerate(record.auction):
+            seat = (record.dealer + i) % 4
+            chunk['states'][row + i] = _encoder.bidding[seat]
+            _encoder.record_bid(seat, call)
+        chunk['actions'][row:row + count] = record.auction
+        chunk['position'][row:row + count] = np.arange(count) % 4
+        row += count
+    return chunk
+
+
+def encoded_chunks(paths, workers=1, chunk_boards=1000, rejected=None):
+    for path in paths:
+        yield from map_chunks(path, encode_auctions, workers, chunk_boards, rejected=rejected)
+
+
+def auction_batches(paths, batch_size=256, workers=1, chunk_boards=1000, shuffle_chunks=8, seed=0, rejected=None):
+    # Dicts of states, actions, masks tensors
+    rng = np.random.default_rng(seed)
+    window = []
+
+    def mixed():
+        columns = {key: np.concatenate([chunk[key] for chunk in window]) for key in ('states', 'actions', 'masks')}
+        order = rng.permutation(len(columns['actions']))
+        for start in range(0, len(order), batch_size):
+            index = order[start:start + batch_size]
+            yield {key: torch.from_numpy(values[index]) for key, values in columns.items()}
+
+    for chunk in encoded_chunks(paths, workers, chunk_boards, rejected):
+        if len(chunk['actions']):
+            window.append(chunk)
+        if len(window) == shuffle_chunks:
+            yield from mixed()
+            window = []
+    if window:
+        yield from mixed()
+
+
+def pretrain(bidding_model, batches, optimizer):
+    # -> (mean loss, accuracy of the argmax call) over the batches
+    loss_fn = nn.CrossEntropyLoss()
+    bidding_model.train()
+    total_loss, correct, count = 0.0, 0, 0
+    for batch in batches:
+        logits = bidding_model(batch['states']) + logit_mask(batch['masks'])
+        loss = loss_fn(logits, batch['actions'])
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        total_loss += loss.item() * len(batch['actions'])
+        correct += int((logits.argmax(dim=1) == batch['actions']).sum())
+        count += len(batch['actions'])
+    return total_loss / max(count, 1), correct / max(count, 1)
+
+
+def import_auctions(paths, directory, workers=1, chunk_boards=1000, shard_size=1_000_000, rejected=None):
+    # -> number of boards written; each board is one episode of the store
+    from AI.trajectories import TrajectoryWriter
+
+    no_play = {'playing_states': np.zeros((0, PLAYING_STATE_SIZE), dtype=np.float32),
+               'playing_actions': np.zeros(0, dtype=np.int64), 'playing_masks': np.zeros((0, 52), dtype=bool),
+               'playing_roles': np.zeros(0, dtype=np.int64)}
+    boards = 0
+    with TrajectoryWriter(directory, shard_size) as writer:
+        for chunk in encoded_chunks(paths, workers, chunk_boards, rejected):
+            ends = np.cumsum(chunk['calls'])
+            for start, end in zip(ends - chunk['calls'], ends):
+                writer.append(dict(no_play, bidding_states=chunk['states'][start:end],
+                                   bidding_actions=chunk['actions'][start:end],
+                                   bidding_masks=chunk['masks'][start:end], reward=0.0))
+            boards += len(chunk['calls'])
+    return boards
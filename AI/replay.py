@@ -0,0 +1,197 @@
+import numpy as np
+import torch
+
+from AI.encoding import BIDDING_STATE_SIZE, PLAYING_STATE_SIZE, ROLES
+from AI.models import logit_mask, role_groups
+from AI.training import stack_trajectories
+from game.bids import NUM_BID_ACTIONS
+
+'''
+Prioritized experience replay (Schaul et al.) for the bidding and playing decisions.
+
+SumTree      - priorities in a flat binary tree, the leaves are the buffer slots. Batched update and
+               stratified sampling are vectorized over the batch, one numpy step per tree level.
+ReplayBuffer - fixed-capacity ring of preallocated tensors (states, legal masks, actions, advantages)
+               with a SumTree. New decisions get the largest priority seen so far. Sampling probability
+               is priority ** alpha, the importance weights (N * P) ** -beta are scaled to max 1.
+ReplayMemory - one ReplayBuffer for the bidding decisions and one per playing role, filled from
+               play_episode trajectories. sample() returns a batch in the layout of stack_trajectories,
+               weights already multiplied by the importance weights, so policy_loss takes it directly;
+               update() takes an optimizer step on a sample and refreshes its priorities.
+
+train_models(..., replay=ReplayMemory()) inserts every batch of episodes and updates from samples.
+'''
+
+
+class SumTree:
+    def __init__(self, capacity):
+        self.leaves = 1 << max(int(capacity - 1).bit_length(), 0)
+        self.depth = self.leaves.bit_length() - 1
+        self.tree = np.zeros(2 * self.leaves)
+
+    def total(self):
+        return self.tree[1]
+
+    def update(self, slots, priorities):
+        nodes = np.asarray(slots) + self.leaves
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        # Slots whose cumulative priority range contains each value
+        nodes = np.ones(len(values), dtype=np.int64)
+        values = np.array(values, dtype=np.float64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            right = values > self.tree[left]
+            values -= np.where(right, self.tree[left], 0.0)
+            nodes = left + right
+        return nodes - self.leaves
+
+    def priorities(self, slots):
+        return self.tree[np.asarray(slots) + self.leaves]
+
+
+class ReplayBuffer:
+    def __init__(self, capacity, state_size, num_actions, alpha=0.6, beta=0.4, epsilon=1e-3, seed=None):
+        self.capacity = capacity
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self.states = torch.zeros(capacity, state_size)
+        self.masks = torch.zeros(capacity, num_actions, dtype=torch.bool)
+        self.actions = torch.zeros(capacity, dtype=torch.long)
+        self.advantages = torch.zeros(capacity)
+        self.tree = SumTree(capacity)
+        self.max_priority = 1.0
+        self.position = 0
+        self.size = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, states, actions, masks, advantages, priorities=None):
+        # Batched insert, overwriting the oldest slots once full; priorities default to the maximum so far
+        count = len(actions)
+        if count > self.capacity:
+            states, actions, masks, advantages = (x[-self.capacity:] for x in (states, actions, masks, advantages))
+            priorities = None if priorities is None else priorities[-self.capacity:]
+            count = self.capacity
+        slots = (self.position + np.arange(count)) % self.capacity
+        index = torch.from_numpy(slots)
+        self.states[index] = states
+        self.actions[index] = actions
+        self.masks[index] = masks
+        self.advantages[index] = advantages
+        if priorities is None:
+            self.tree.update(slots, self.max_priority ** self.alpha)
+        else:
+            self.update_priorities(slots, priorities)
+        self.position = (self.position + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+        return slots
+
+    def sample(self, batch_size):
+        # -> (slots, importance weights), one draw per equal slice of the total priority
+        if not self.size:
+            raise ValueError("cannot sample from an empty replay buffer")
+        total = self.tree.total()
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * total / batch_size
+        slots = np.minimum(self.tree.find(values), self.size - 1)
+        probabilities = self.tree.priorities(slots) / total
+        weights = (self.size * probabilities) ** -self.beta
+        return slots, torch.from_numpy((weights / weights.max()).astype(np.float32))
+
+    def update_priorities(self, slots, priorities):
+        priorities = np.abs(np.asarray(priorities, dtype=np.float64)) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(slots, priorities ** self.alpha)
+
+    def get(self, slots):
+        index = torch.from_numpy(np.asarray(slots))
+        return self.states[index], self.actions[index], self.masks[index], self.advantages[index]
+
+
+class ReplayMemory:
+    def __init__(self, bidding_capacity=100_000, playing_capacity=100_000, alpha=0.6, beta=0.4, seed=None):
+        # playing_capacity is per role
+        self.bidding = ReplayBuffer(bidding_capacity, BIDDING_STATE_SIZE, NUM_BID_ACTIONS, alpha, beta, seed=seed)
+        self.playing = {role: ReplayBuffer(playing_capacity, PLAYING_STATE_SIZE, 52, alpha, beta,
+                                           seed=None if seed is None else seed + 1 + i)
+                        for i, role in enumerate(ROLES)}
+
+    def add(self, trajectories, baseline=0.0):
+        # All decisions of the trajectories, one batched insert per buffer at the largest priority so far, so
+        # every new decision is likely to be sampled once before update() sets its own priority
+        batch = stack_trajectories(trajectories, baseline)
+        masks = torch.cat([t['bidding_masks'] for t in trajectories])
+        self.bidding.add(batch['bidding_states'], batch['bidding_actions'], masks, batch['bidding_weights'])
+        for i, role in enumerate(ROLES):
+            rows = batch['playing_roles'] == i
+            if rows.any():
+                self.playing[role].add(batch['playing_states'][rows], batch['playing_actions'][rows],
+                                       batch['playing_masks'][rows], batch['playing_weights'][rows])
+
+    def sample(self, bidding_batch=256, playing_batch=256):
+        # (batch for policy_loss, slots per buffer); the playing rows are split evenly over the roles with data
+        bidding_slots, bidding_importance = self.bidding.sample(bidding_batch)
+        states, actions, _, advantages = self.bidding.get(bidding_slots)
+        batch = {'bidding_states': states, 'bidding_actions': actions,
+                 'bidding_weights': advantages * bidding_importance, 'bidding_importance': bidding_importance}
+        slots = {'bidding': bidding_slots}
+        roles = [role for role in ROLES if len(self.playing[role])]
+        parts = {key: [] for key in ('playing_states', 'playing_actions', 'playing_masks', 'playing_roles',
+                                     'playing_weights', 'playing_importance')}
+        for role in roles:
+            role_slots, importance = self.playing[role].sample(max(1, playing_batch // len(roles)))
+            states, actions, masks, advantages = self.playing[role].get(role_slots)
+            parts['playing_states'].append(states)
+            parts['playing_actions'].append(actions)
+            parts['playing_masks'].append(masks)
+            parts['playing_roles'].append(torch.full((len(actions),), ROLES.index(role)))
+            parts['playing_weights'].append(advantages * importance)
+            parts['playing_importance'].append(importance)
+            slots[role] = role_slots
+        for key, values in parts.items():
+            batch[key] = torch.cat(values) if values else torch.zeros(0)
+        return batch, slots
+
+    def update_priorities(self, slots, batch_priorities):
+        # slots as returned by sample(), batch_priorities - buffer name -> new priorities for those slots
+        for name, priorities in batch_priorities.items():
+            buffer = self.bidding if name == 'bidding' else self.playing[name]
+            buffer.update_priorities(slots[name], priorities)
+
+    def update(self, bidding_model, playing_models, optimizer_bidding, optimizer_playing, bidding_batch=256,
+               playing_batch=256):
+        # One optimizer step on a prioritized sample; the new priorities are the per-decision
+        # |advantage * cross entropy|, without the importance weights
+        batch, slots = self.sample(bidding_batch, playing_batch)
+        loss_fn = torch.nn.CrossEntropyLoss(reduction='none')
+        optimizer_bidding.zero_grad()
+        optimizer_playing.zero_grad()
+        bidding_logits = bidding_model(batch['bidding_states'])
+        bidding_losses = loss_fn(bidding_logits, batch['bidding_actions']) * batch['bidding_weights']
+        loss = bidding_losses.mean()
+        playing_losses = torch.zeros(len(batch['playing_actions']))
+        for model, roles in role_groups(playing_models):
+            rows = torch.isin(batch['playing_roles'], torch.tensor(roles))
+            if rows.any():
+                logits = model(batch['playing_states'][rows], logit_mask(batch['playing_masks'][rows]))
+                playing_losses[rows] = loss_fn(logits, batch['playing_actions'][rows]) * batch['playing_weights'][rows]
+        if len(playing_losses):
+            loss = loss + playing_losses.mean()
+        loss.backward()
+        optimizer_bidding.step()
+        optimizer_playing.step()
+
+        priorities = {'bidding': (bidding_losses / batch['bidding_importance']).detach().numpy()}
+        playing_priorities = (playing_losses / batch['playing_importance']).detach() if len(playing_losses) else None
+        for i, role in enumerate(ROLES):
+            if role in slots:
+                priorities[role] = playing_priorities[batch['playing_roles'] == i].numpy()
+        self.update_priorities(slots, priorities)
+        return loss.item()
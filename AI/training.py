@@ -0,0 +1,270 @@
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+import profiling
+from AI.encoding import ROLES, StateEncoder, bid_action, role_of
+from AI.models import logit_mask, playing_parameters, role_groups, sample_action
+from game.bids import BID_NAMES
+from game.scoring import imps, score_batch
+from game_local import Card, GameLogic, Trick
+
+'''
+REINFORCE self-play: play_episode samples a deal with the current models, update_models takes one
+optimizer step over a list of episodes, train_models loops the two. python -m AI train runs it with
+checkpoints.
+
+The episode reward is the declaring side's duplicate score converted to IMPs (against 0), so rewards stay
+within +-24 whatever the contract. Every decision is weighted from its own side's point of view: the
+declaring side's bids and cards by reward - baseline, the other side's by the negation.
+'''
+
+
+# Training loop for both models with episodic rewards
+def train_models(bidding_model, playing_models, episodes, batch_episodes=1, baseline_decay=None,
+                 accumulation_steps=1, reward_cache=None, replay=None, replay_batch=256, replay_updates=1):
+    # batch_episodes deals per update; baseline_decay turns on a running-mean reward baseline (advantages).
+    # With a ReplayMemory (replay.py) the episodes are stored and each update is `replay_updates` steps on
+    # prioritized samples of replay_batch decisions instead of one pass over the new episodes
+    optimizer_bidding = optim.Adam(bidding_model.parameters(), lr=0.001)
+    optimizer_playing = optim.Adam(playing_parameters(playing_models), lr=0.001)
+    encoder = StateEncoder()
+    baseline = RewardBaseline(baseline_decay)
+
+    for start in range(0, episodes, batch_episodes):
+        trajectories = [play_episode(bidding_model, playing_models, encoder, reward_cache=reward_cache)
+                        for _ in range(min(batch_episodes, episodes - start))]
+        if replay is None:
+            update_models(bidding_model, playing_models, optimizer_bidding, optimizer_playing, trajectories,
+                          baseline.value, accumulation_steps)
+        else:
+            replay.add(trajectories, baseline.value)
+            for _ in range(replay_updates):
+                replay.update(bidding_model, playing_models, optimizer_bidding, optimizer_playing, replay_batch,
+                              replay_batch)
+        baseline.update([trajectory['reward'] for trajectory in trajectories])
+        profiling.step(len(trajectories))
+
+
+class RewardBaseline:
+    # Exponential moving average of episode rewards, stays at 0 when decay is None
+    def __init__(self, decay=None):
+        self.decay = decay
+        self.value = 0.0
+        self.initialized = False
+
+    def update(self, rewards):
+        if self.decay is None or not rewards:
+            return
+        mean = sum(rewards) / len(rewards)
+        self.value = mean if not self.initialized else self.decay * self.value + (1 - self.decay) * mean
+        self.initialized = True
+
+
+def play_episode(bidding_model, playing_models, encoder, game=None, reward_cache=None):
+    # One self-play deal with sampled actions, returned as stacked tensors (encoder buffers are reused,
+    # so the states are copies)
+    game = GameLogic() if game is None else game
+    state_bidding = initialize_bidding_state(game, encoder)
+    dealer = game.current_player_index
+
+    bidding_states = []
+    bidding_actions = []
+    bidding_masks = []
+    with torch.no_grad():
+        while True:
+            action_logits = bidding_model(state_bidding)
+            legal = game.bidding.legal_bid_mask()
+            action = sample_action(action_logits, legal)
+            bidding_states.append(state_bidding.clone())
+            bidding_actions.append(action)
+            bidding_masks.append(torch.tensor(legal))
+            next_state, done = step_bidding(game, encoder, action)
+            if done:
+                break
+            state_bidding = next_state
+
+        # Determine roles and start playing phase
+        state_playing = initialize_playing_state(game, encoder)
+        playing_states = []
+        playing_actions = []
+        playing_masks = []
+        playing_roles = []
+        while not is_game_over(game):
+            role = get_current_role(game)
+            legal = game.legal_play_mask(game.current_player_index)
+            action_logits = playing_models[role].forward(state_playing, logit_mask(legal))
+            action = sample_action(action_logits, legal)
+            playing_states.append(state_playing.clone())
+            playing_actions.append(action)
+            playing_masks.append(torch.tensor(legal))
+            playing_roles.append(ROLES.index(role))
+            next_state, done = step_playing(game, encoder, action)
+            if done:
+                break
+            state_playing = next_state
+
+    declarer = game.players.index(game.bidding.declarer) if game.bidding.declarer is not None else dealer
+    return {
+        'bidding_states': torch.stack(bidding_states),
+        'bidding_seats': (dealer + torch.arange(len(bidding_actions))) % 4,
+        'declarer': declarer,
+        'bidding_actions': torch.tensor(bidding_actions),
+        'bidding_masks': torch.stack(bidding_masks),
+        'playing_states': torch.stack(playing_states) if playing_states else torch.zeros(0, 524),
+        'playing_actions': torch.tensor(playing_actions, dtype=torch.long),
+        'playing_masks': torch.stack(playing_masks) if playing_masks else torch.zeros(0, 52, dtype=torch.bool),
+        'playing_roles': torch.tensor(playing_roles, dtype=torch.long),
+        'reward': float(calculate_reward(game, reward_cache)),
+    }
+
+
+def decision_signs(trajectory):
+    # (bidding, playing) +1 for the declaring side's decisions and -1 for the other side's
+    bidding = 1 - 2 * ((trajectory['bidding_seats'] - trajectory['declarer']) % 2)
+    playing = torch.where(trajectory['playing_roles'] < 2, 1, -1)  # quarterback, partner | defenders
+    return bidding.float(), playing.float()
+
+
+def stack_trajectories(trajectories, baseline=0.0):
+    # Concatenates trajectories into one batch, every sample weighted by its episode's advantage for the
+    # declaring side (a precomputed 'advantage' entry, otherwise reward - baseline) times its side's sign
+    bidding_weights, playing_weights = [], []
+    for t in trajectories:
+        advantage = float(t.get('advantage', t['reward'] - baseline))
+        bidding_signs, playing_signs = decision_signs(t)
+        bidding_weights.append(bidding_signs * advantage)
+        playing_weights.append(playing_signs * advantage)
+
+    batch = {key: torch.cat([t[key] for t in trajectories])
+             for key in ('bidding_states', 'bidding_actions', 'playing_states', 'playing_actions', 'playing_masks',
+                         'playing_roles')}
+    batch['bidding_weights'] = torch.cat(bidding_weights)
+    batch['playing_weights'] = torch.cat(playing_weights)
+    return batch
+
+
+def policy_loss(bidding_model, playing_models, batch, episodes):
+    # One forward per distinct model: weighted cross entropy summed per episode and averaged over `episodes`
+    loss_fn = nn.CrossEntropyLoss(reduction='none')
+    loss = (loss_fn(bidding_model(batch['bidding_states']), batch['bidding_actions']) * batch['bidding_weights']).sum()
+    for model, roles in role_groups(playing_models):
+        rows = torch.isin(batch['playing_roles'], torch.tensor(roles))
+        if rows.any():
+            action_logits = model(batch['playing_states'][rows], logit_mask(batch['playing_masks'][rows]))
+            loss = loss + (loss_fn(action_logits, batch['playing_actions'][rows]) * batch['playing_weights'][rows]).sum()
+    return loss / episodes
+
+
+def update_models(bidding_model, playing_models, optimizer_bidding, optimizer_playing, trajectories, baseline=0.0,
+                  accumulation_steps=1):
+    # One optimizer step for the whole list of trajectories; with accumulation_steps > 1 the batch is split into
+    # that many chunks whose gradients are accumulated before the step, to bound memory
+    optimizer_bidding.zero_grad()
+    optimizer_playing.zero_grad()
+    chunk = -(-len(trajectories) // accumulation_steps)
+    total = 0.0
+    for start in range(0, len(trajectories), chunk):
+        batch = stack_trajectories(trajectories[start:start + chunk], baseline)
+        loss = policy_loss(bidding_model, playing_models, batch, len(trajectories))
+        loss.backward()
+        total += loss.item()
+    optimizer_bidding.step()
+    optimizer_playing.step()
+    return total
+
+
+# Game steps, states come from the incremental encoder
+def initialize_bidding_state(game, encoder):
+    # Deal and return the bidding state of the first seat to bid
+    game.start_game()
+    encoder.reset_from_game(game)
+    return encoder.bidding_state(game.current_player_index)
+
+
+def step_bidding(game, encoder, action):
+    # Execute the bidding action (an ordinal from legal_bid_mask) and return the new state and done flag
+    seat = game.current_player_index
+    if not game.bid(game.players[seat], BID_NAMES[action]):
+        raise ValueError(f"Illegal bid {BID_NAMES[action]}")
+    encoder.record_bid(seat, action)
+    game.next_turn()
+    done = game.bidding.is_bidding_over()
+    return encoder.bidding_state(game.current_player_index), done
+
+
+def initialize_playing_state(game, encoder):
+    # Set up the contract and return the playing state of the opening leader, None when passed out
+    if game.bidding.declarer is None:
+        return None
+    game.set_trump_and_declarer()
+    game.set_current_player_to_next_of_declarer()
+    encoder.start_play(game.players.index(game.declarer), bid_action(game.bidding.current_highest_bid))
+    game.tricks.append(Trick())
+    return encoder.playing_state(game.current_player_index)
+
+
+def step_playing(game, encoder, action):
+    # Execute the playing action and return the new state and done flag, the state is unchanged if the card is refused
+    seat = game.current_player_index
+    if not game.play_card(game.players[seat], str(Card.from_index(action))):
+        return encoder.playing_state(seat), False
+    encoder.record_card(seat, action)
+    game.next_turn()
+
+    trick = game.tricks[-1]
+    if len(trick.cards) == 4:
+        game.complete_trick()
+        if len(game.tricks) < 13:
+            game.tricks.append(Trick())
+    return encoder.playing_state(game.current_player_index), is_game_over(game)
+
+
+def get_current_role(game):
+    # Return the role of the player to move
+    return role_of(game.current_player_index, game.players.index(game.declarer))
+
+
+def is_game_over(game):
+    # Check if the game is over
+    if game.bidding.declarer is None:
+        return True
+    return len(game.tricks) == 13 and len(game.tricks[-1].cards) == 4
+
+
+def calculate_reward(game, cache=None):
+    # Duplicate score of the finished deal for the declarer's side in IMPs, 0 when passed out. With an
+    # OutcomeCache (game/deal_cache.py) the double-dummy result of the final contract is scored instead of
+    # the tricks taken when the cache has the deal (OutcomeCache.fill solves deals offline); a miss scores the
+    # tricks taken rather than running the solver inside the episode
+    if cache is None:
+        return float(calculate_rewards([game])[0])
+    if game.bidding.declarer is None:
+        return 0
+    hands = [player.mask for player in game.players]
+    for trick in game.tricks:
+        for player, card in trick.cards:
+            hands[game.players.index(player)] |= 1 << card.index
+    declarer = game.players.index(game.bidding.declarer)
+    vulnerable = game.vulnerable[declarer % 2]
+    outcome = cache.outcome(hands, game.bidding.highest, declarer, game.bidding.doubled, vulnerable,
+                            fallback=game.tricks_won[1 + declarer % 2])
+    return float(imps(outcome[1]))
+
+
+def declarer_sides(games):
+    return [game.players.index(game.bidding.declarer) % 2 if game.bidding.declarer is not None else 0
+            for game in games]
+
+
+def calculate_rewards(games):
+    # Batched calculate_reward without a cache: one table lookup for all games, each scored with its own
+    # vulnerability, returned in IMPs
+    sides = declarer_sides(games)
+    contracts = np.array([game.bidding.highest if game.bidding.declarer is not None else -1 for game in games])
+    doubled = np.array([game.bidding.doubled for game in games])
+    vulnerable = np.array([game.vulnerable[side] for game, side in zip(games, sides)])
+    tricks = np.array([game.tricks_won[1 + side] if game.bidding.declarer is not None else 0
+                       for game, side in zip(games, sides)])
+    return imps(score_batch(contracts, doubled, vulnerable, tricks))
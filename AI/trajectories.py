@@ -0,0 +1,238 @@
+import json
+import os
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, IterableDataset, get_worker_info
+
+from AI.encoding import BIDDING_STATE_SIZE, LAST_BID_VALUE, PLAYING_STATE_SIZE, TRICK_NUMBER
+from AI.training import decision_signs
+from game.bids import NUM_BID_ACTIONS
+
+'''
+Columnar on-disk store of self-play decisions for offline training.
+
+A store is a directory with index.json and, per kind ('bidding', 'playing') and shard, one .npy file per
+column, e.g. playing.states.000003.npy. Shards hold up to shard_size decisions and are written when full.
+
+columns  states    - the 0/1 state bits packed 8 per byte (bidding 27 bytes, playing 66 bytes)
+         scalars   - the non-binary playing features as uint8: last bid level, tricks played
+         actions   - uint8 action ordinal
+         masks     - legal actions packed 8 per byte
+         position  - auction position (0 dealer) for bidding, role index (encoding.ROLES) for playing
+         rewards   - float32 episode reward (IMPs) from the deciding side, negated on the other side's decisions
+         episodes  - int64 episode number in the store
+
+TrajectoryWriter appends play_episode dicts into preallocated shard buffers. TrajectoryDataset streams
+batches back as an IterableDataset: shards in random order, each read as windows of randomly chosen
+contiguous blocks that are shuffled in memory, so at most one window per reader is in RAM. With
+DataLoader workers the shards are split between the workers.
+
+python -m AI generate --episodes 100000 --out selfplay
+'''
+
+STATE_SIZES = {'bidding': BIDDING_STATE_SIZE, 'playing': PLAYING_STATE_SIZE}
+ACTION_COUNTS = {'bidding': NUM_BID_ACTIONS, 'playing': 52}
+# Playing state columns that are not 0/1, stored as value * scale in the scalars column
+PLAYING_SCALARS = [(LAST_BID_VALUE, 1), (TRICK_NUMBER, 13)]
+KINDS = list(STATE_SIZES)
+
+
+def packed_size(bits):
+    return -(-bits // 8)
+
+
+def column_shapes(kind):
+    shapes = {
+        'states': ((packed_size(STATE_SIZES[kind]),), np.uint8),
+        'actions': ((), np.uint8),
+        'masks': ((packed_size(ACTION_COUNTS[kind]),), np.uint8),
+        'position': ((), np.uint8),
+        'rewards': ((), np.float32),
+        'episodes': ((), np.int64),
+    }
+    if kind == 'playing':
+        shapes['scalars'] = ((len(PLAYING_SCALARS),), np.uint8)
+    return shapes
+
+
+def encode_states(kind, states):
+    # (N, size) float states -> packed bits (and the playing scalars)
+    states = np.asarray(states, dtype=np.float32)
+    columns = {}
+    if kind == 'playing':
+        columns['scalars'] = np.stack([np.rint(states[:, i] * scale) for i, scale in PLAYING_SCALARS],
+                                      axis=1).astype(np.uint8)
+        states = states.copy()
+        states[:, [i for i, _ in PLAYING_SCALARS]] = 0
+    columns['states'] = np.packbits(states > 0.5, axis=1, bitorder='little')
+    return columns
+
+
+def decode_states(kind, states, scalars=None):
+    out = np.unpackbits(states, axis=1, count=STATE_SIZES[kind], bitorder='little').astype(np.float32)
+    if kind == 'playing':
+        for j, (i, scale) in enumerate(PLAYING_SCALARS):
+            out[:, i] = scalars[:, j] / scale
+    return out
+
+
+def shard_path(directory, kind, column, shard):
+    return os.path.join(directory, f"{kind}.{column}.{shard:06d}.npy")
+
+
+class TrajectoryWriter:
+    def __init__(self, directory, shard_size=1_000_000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_size = shard_size
+        self.index = self._read_index()
+        self.buffers = {kind: {column: np.zeros((shard_size,) + shape, dtype=dtype)
+                               for column, (shape, dtype) in column_shapes(kind).items()} for kind in KINDS}
+        self.rows = {kind: 0 for kind in KINDS}
+
+    def _read_index(self):
+        path = os.path.join(self.directory, 'index.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        return {'episodes': 0, 'shards': {kind: [] for kind in KINDS}}
+
+    def append(self, trajectory):
+        # One play_episode dict
+        episode = self.index['episodes']
+        count = len(trajectory['bidding_actions'])
+        reward = float(trajectory['reward'])
+        # Imported auctions (pretraining.py) have no declarer and reward 0
+        bidding_signs, playing_signs = decision_signs(trajectory) if 'declarer' in trajectory else (1.0, 1.0)
+        self._append('bidding', trajectory['bidding_states'], trajectory['bidding_actions'],
+                     trajectory['bidding_masks'], np.arange(count) % 4, np.asarray(bidding_signs) * reward, episode)
+        self._append('playing', trajectory['playing_states'], trajectory['playing_actions'],
+                     trajectory['playing_masks'], trajectory['playing_roles'], np.asarray(playing_signs) * reward,
+                     episode)
+        self.index['episodes'] += 1
+
+    def extend(self, trajectories):
+        for trajectory in trajectories:
+            self.append(trajectory)
+
+    def _append(self, kind, states, actions, masks, position, reward, episode):
+        count = len(actions)
+        if not count:
+            return
+        columns = encode_states(kind, states)
+        columns['actions'] = np.asarray(actions)
+        columns['masks'] = np.packbits(np.asarray(masks, dtype=bool), axis=1, bitorder='little')
+        columns['position'] = np.asarray(position)
+        columns['rewards'] = reward
+        columns['episodes'] = episode
+        start = 0
+        while start < count:
+            rows = self.rows[kind]
+            take = min(count - start, self.shard_size - rows)
+            for column, buffer in self.buffers[kind].items():
+                value = columns[column]
+                buffer[rows:rows + take] = value[start:start + take] if np.ndim(value) else value
+            self.rows[kind] += take
+            start += take
+            if self.rows[kind] == self.shard_size:
+                self._write_shard(kind)
+
+    def _write_shard(self, kind):
+        rows = self.rows[kind]
+        if not rows:
+            return
+        shard = len(self.index['shards'][kind])
+        for column, buffer in self.buffers[kind].items():
+            np.save(shard_path(self.directory, kind, column, shard), buffer[:rows])
+        self.index['shards'][kind].append(rows)
+        self.rows[kind] = 0
+        self._write_index()
+
+    def _write_index(self):
+        path = os.path.join(self.directory, 'index.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.index, f)
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        # Writes the partly filled shards; the store stays appendable by a new writer
+        for kind in KINDS:
+            self._write_shard(kind)
+        self._write_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TrajectoryDataset(IterableDataset):
+    # Yields dicts of batch_size decisions: states (float32), actions, masks (bool), position, rewards, episodes
+    def __init__(self, directory, kind='playing', batch_size=256, block_size=1024, window_blocks=64, seed=0,
+                 shuffle=True):
+        with open(os.path.join(directory, 'index.json')) as f:
+            self.shards = json.load(f)['shards'][kind]
+        self.directory = directory
+        self.kind = kind
+        self.batch_size = batch_size
+        self.block_size = block_size
+        self.window_blocks = window_blocks
+        self.seed = seed
+        self.shuffle = shuffle
+        self.epoch = 0
+
+    def __len__(self):
+        # Decisions, not batches
+        return sum(self.shards)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        rng = np.random.default_rng((self.seed, self.epoch))
+        shards = rng.permutation(len(self.shards)) if self.shuffle else np.arange(len(self.shards))
+        worker = get_worker_info()
+        if worker is not None:
+            shards = shards[worker.id::worker.num_workers]
+            rng = np.random.default_rng((self.seed, self.epoch, worker.id))
+        for shard in shards:
+            yield from self._shard_batches(int(shard), rng)
+
+    def _shard_batches(self, shard, rng):
+        columns = {column: np.load(shard_path(self.directory, self.kind, column, shard), mmap_mode='r')
+                   for column in column_shapes(self.kind)}
+        rows = self.shards[shard]
+        starts = np.arange(0, rows, self.block_size)
+        if self.shuffle:
+            starts = rng.permutation(starts)
+        for w in range(0, len(starts), self.window_blocks):
+            # Blocks are read in file order, the rows are shuffled once in memory
+            index = np.concatenate([np.arange(start, min(start + self.block_size, rows))
+                                    for start in np.sort(starts[w:w + self.window_blocks])])
+            window = {column: values[index] for column, values in columns.items()}
+            if self.shuffle:
+                order = rng.permutation(len(index))
+                window = {column: values[order] for column, values in window.items()}
+            for start in range(0, len(index), self.batch_size):
+                yield self._decode({column: values[start:start + self.batch_size]
+                                    for column, values in window.items()})
+
+    def _decode(self, columns):
+        masks = np.unpackbits(columns['masks'], axis=1, count=ACTION_COUNTS[self.kind], bitorder='little')
+        return {
+            'states': torch.from_numpy(decode_states(self.kind, columns['states'], columns.get('scalars'))),
+            'actions': torch.from_numpy(columns['actions'].astype(np.int64)),
+            'masks': torch.from_numpy(masks.astype(bool)),
+            'position': torch.from_numpy(columns['position'].astype(np.int64)),
+            'rewards': torch.from_numpy(columns['rewards']),
+            'episodes': torch.from_numpy(columns['episodes']),
+        }
+
+
+def trajectory_loader(directory, kind='playing', batch_size=256, num_workers=0, seed=0, **options):
+    # DataLoader over a TrajectoryDataset; batching is done by the dataset, so batch_size=None here. Workers
+    # are not persistent: each epoch's iterator copies the dataset again, so set_epoch() reaches them
+    dataset = TrajectoryDataset(directory, kind, batch_size, seed=seed, **options)
+    return DataLoader(dataset, batch_size=None, num_workers=num_workers)
@@ -0,0 +1,172 @@
+import random
+
+import numpy as np
+
+from game.bids import PASS, bid_strain
+from game.bitboard import SUIT_MASKS, iter_cards, trick_winner
+
+'''
+Agents for the match runner (match.py). The runner calls choose_bid / choose_card with an Observation
+and a bool mask of legal actions (38 bid ordinals, see game/bids.py, or 52 card indices) and expects
+a legal action back. The observe hooks let an agent keep its own incremental state.
+'''
+
+HONOUR_POINTS = {12: 4, 11: 3, 10: 2, 9: 1}  # A, K, Q, J by rank index
+
+
+class Agent:
+    name = 'agent'
+
+    def reset(self, hands, dealer, vulnerable):
+        pass
+
+    def observe_bid(self, seat, action):
+        pass
+
+    def start_play(self, declarer, contract):
+        pass
+
+    def observe_card(self, seat, card):
+        pass
+
+    def choose_bid(self, obs, mask):
+        raise NotImplementedError
+
+    def choose_card(self, obs, mask):
+        raise NotImplementedError
+
+
+class RandomAgent(Agent):
+    name = 'random'
+
+    def __init__(self, seed=None, pass_probability=0.5):
+        self.rng = random.Random(seed)
+        self.pass_probability = pass_probability
+
+    def choose_bid(self, obs, mask):
+        if self.rng.random() < self.pass_probability:
+            return PASS
+        return int(self.rng.choice(np.flatnonzero(mask)))
+
+    def choose_card(self, obs, mask):
+        return int(self.rng.choice(np.flatnonzero(mask)))
+
+
+def high_card_points(hand):
+    return sum(HONOUR_POINTS.get(card % 13, 0) for card in iter_cards(hand))
+
+
+def suit_lengths(hand):
+    return [(hand & SUIT_MASKS[suit]).bit_count() for suit in range(4)]
+
+
+class RuleBasedAgent(Agent):
+    # Natural bidding on high card points and fit, simple second hand low / third hand high play
+    name = 'rule'
+
+    def choose_bid(self, obs, mask):
+        points = high_card_points(obs.hand)
+        lengths = suit_lengths(obs.hand)
+        partner = (obs.seat + 2) % 4
+        partner_bids = [action for seat, action in obs.bids if seat == partner and action < PASS]
+        own_bids = [action for seat, action in obs.bids if seat == obs.seat and action < PASS]
+
+        if partner_bids:
+            strain = bid_strain(partner_bids[-1])
+            fit = strain == 4 or lengths[strain] >= 3
+            total = points + 13
+            limit = 6 if total >= 33 else 4 if total >= 26 else 3 if total >= 23 else 2
+            if fit and points >= 6:
+                return self._cheapest(mask, strain, limit)
+            return PASS
+        if not own_bids and points >= 12:
+            if 15 <= points <= 17 and min(lengths) >= 2 and sorted(lengths)[1] >= 3:
+                return self._cheapest(mask, 4, 1)
+            longest = max(range(4), key=lambda suit: (lengths[suit], suit))
+            return self._cheapest(mask, longest, 2)
+        return PASS
+
+    def _cheapest(self, mask, strain, limit):
+        for level in range(1, limit + 1):
+            action = (level - 1) * 5 + strain
+            if mask[action]:
+                return action
+        return PASS
+
+    def choose_card(self, obs, mask):
+        legal = [int(card) for card in np.flatnonzero(mask)]
+        if not obs.trick:
+            # Lead the top card of the longest side suit
+            lengths = suit_lengths(obs.hand)
+            suits = [suit for suit in range(4) if lengths[suit] and suit != obs.trump] or [obs.trump]
+            suit = max(suits, key=lambda suit: lengths[suit])
+            return max(card for card in legal if card // 13 == suit)
+
+        cards = [card for _, card in obs.trick]
+        winning = trick_winner(cards, obs.trump)
+        if len(cards) - winning == 2:
+            return self._lowest(legal, obs.trump)
+        winners = [card for card in legal if trick_winner(cards + [card], obs.trump) == len(cards)]
+        if winners:
+            return min(winners, key=lambda card: (card // 13 == obs.trump, card % 13))
+        return self._lowest(legal, obs.trump)
+
+    def _lowest(self, legal, trump):
+        return min(legal, key=lambda card: (card // 13 == trump, card % 13))
+
+
+def auction_ranges(bids):
+    # What the calls show about each hand when read as RuleBasedAgent's: {seat: ([min, max] points,
+    # [[min, max] length] per suit)}. A pass that RuleBasedAgent makes for several reasons only bounds the
+    # hand when every reason does
+    ranges = {seat: ([0, 37], [[0, 13] for _ in range(4)]) for seat in range(4)}
+    highest = -1
+    for i, (seat, action) in enumerate(bids):
+        points, lengths = ranges[seat]
+        partner_bids = [a for s, a in bids[:i] if s == (seat + 2) % 4 and a < PASS]
+        own_bids = [a for s, a in bids[:i] if s == seat and a < PASS]
+        if partner_bids:
+            strain = bid_strain(partner_bids[-1])
+            if action < PASS:
+                # A raise: 6 points and a fit
+                points[0] = max(points[0], 6)
+                if strain < 4:
+                    lengths[strain][0] = max(lengths[strain][0], 3)
+        elif not own_bids:
+            if action < PASS:
+                points[0] = max(points[0], 12)
+                strain = bid_strain(action)
+                if strain == 4:
+                    # 15-17 balanced: no singleton and at most one doubleton
+                    points[:] = [max(points[0], 15), min(points[1], 17)]
+                    for length in lengths:
+                        length[:] = [max(length[0], 2), min(length[1], 5)]
+                else:
+                    lengths[strain][0] = max(lengths[strain][0], 4)  # the longest suit
+            elif highest < 4:
+                # Every opening was still available, so fewer than 12 points
+                points[1] = min(points[1], 11)
+        if action < PASS:
+            highest = action
+    return ranges
+
+
+AGENTS = {
+    'random': RandomAgent,
+    'rule': RuleBasedAgent,
+}
+
+
+MODEL_AGENTS = ['model', 'ismcts']  # need torch, imported on demand
+
+
+def make_agent(name, seed=None):
+    if name == 'model':
+        from AI.agents import ModelAgent
+        return ModelAgent(seed=seed)
+    if name == 'ismcts':
+        from AI.agents import ISMCTSAgent
+        return ISMCTSAgent(simulations=200, seed=seed)
+    if name == 'random':
+        return RandomAgent(seed)
+    return AGENTS[name]()
@@ -0,0 +1,54 @@
+import argparse
+import fnmatch
+import sys
+
+from benchmarks import engine, models  # noqa: F401 - registers the benchmarks
+from benchmarks.harness import BENCHMARKS, compare, format_time, load, run, save
+
+'''
+python -m benchmarks                                  run everything and print a table
+python -m benchmarks -o bench.json                    also write the results as JSON
+python -m benchmarks --baseline base.json             flag regressions against a stored run, exit code 1 on any
+python -m benchmarks -k 'forward.*' --threads 1       run a subset
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Engine, encoder, inference and training benchmarks")
+    parser.add_argument('-k', '--filter', action='append', help="glob on benchmark names, may be repeated")
+    parser.add_argument('-o', '--output', help="write results as JSON")
+    parser.add_argument('--baseline', help="JSON results to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1, help="relative slowdown counted as a regression")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiplier on the calls per repeat")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--threads', type=int, help="torch intra-op threads")
+    parser.add_argument('--list', action='store_true')
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if not args.filter or any(fnmatch.fnmatch(name, f) for f in args.filter)]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    def report(result):
+        print(f"{result['name']:<28} {format_time(result['median']):>12} {result['ops_per_second']:>14.1f} ops/s")
+
+    data = run(names, seed=args.seed, scale=args.scale, report=report)
+    if args.output:
+        save(data, args.output)
+
+    if not args.baseline:
+        return 0
+    rows = compare(data, load(args.baseline), args.threshold)
+    print()
+    for row in rows:
+        print(f"{row['name']:<28} {format_time(row['baseline']):>12} -> {format_time(row['current']):>12} "
+              f"{row['ratio']:>6.2f}x  {row['status']}")
+    return 1 if any(row['status'] == 'regression' for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
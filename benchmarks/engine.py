@@ -0,0 +1,97 @@
+import itertools
+import random
+
+import numpy as np
+
+from agents import RandomAgent
+from benchmarks.harness import benchmark
+from game.bids import PASS
+from game.deals import generate_deals
+from game_local import CARDS, SUITS, VALID_BIDS, Bidding, Deck, GameLogic, Player, Trick
+from match import MatchRunner
+
+
+@benchmark('deck.deal_hands', number=5000)
+def deck_deal_hands():
+    return lambda: Deck().deal_hands()
+
+
+@benchmark('deck.deal_52', number=1000)
+def deck_deal_52():
+    # Card by card, as the original deal loop did
+    def op():
+        deck = Deck()
+        for _ in range(52):
+            deck.deal()
+    return op
+
+
+@benchmark('deals.generate_10k', number=5)
+def generate_10k():
+    seeds = itertools.count()
+    return lambda: generate_deals(10_000, next(seeds))
+
+
+@benchmark('bidding.is_valid_bid', number=200)
+def is_valid_bid():
+    # 38 calls per operation: every contract bid plus pass and doubles, from a mid-auction position
+    bidding = Bidding()
+    bidding.place_bid(Player("Player 1"), '2H')
+    calls = VALID_BIDS + ['Pass', 'X', 'XX']
+
+    def op():
+        for bid in calls:
+            bidding.is_valid_bid(bid)
+    return op
+
+
+@benchmark('trick.determine_winner', number=20)
+def determine_winner():
+    # 1000 full tricks per operation, half of them with a trump suit
+    rng = random.Random(0)
+    players = [Player(f"Player {i + 1}") for i in range(4)]
+    tricks = []
+    for i in range(1000):
+        trick = Trick()
+        for player, card in zip(players, rng.sample(CARDS, 4)):
+            trick.play_card(player, card)
+        tricks.append((trick, SUITS[i % 4] if i % 2 else None))
+
+    def op():
+        for trick, trump in tricks:
+            trick.determine_winner(trump)
+    return op
+
+
+@benchmark('game.random_deal', number=100)
+def random_deal():
+    # One complete deal (auction and 52 cards) through GameLogic with random agents
+    runner = MatchRunner([RandomAgent(seat) for seat in range(4)])
+    deals = [[int(hand) for hand in hands] for hands in generate_deals(1000, 0)]
+    position = itertools.count()
+    return lambda: runner.play_deal(deals[next(position) % len(deals)])
+
+
+@benchmark('game.apply_undo', number=200)
+def apply_undo():
+    # Make and unmake every action of a recorded deal (auction and 52 cards)
+    game = GameLogic(hands=[int(hand) for hand in generate_deals(1, 0)[0]])
+    game.start_game()
+    start = game.snapshot()
+    rng = random.Random(0)
+    actions = []
+    while not game.is_over() or game.declarer is None:
+        if game.is_over():
+            game.restore(start)
+            actions = []
+        legal = np.flatnonzero(game.legal_action_mask())
+        passing = not game.bidding.is_bidding_over() and game.bidding.bids and rng.random() < 0.6
+        actions.append(PASS if passing else int(rng.choice(legal)))
+        game.apply(actions[-1])
+    game.restore(start)
+
+    def op():
+        tokens = [game.apply(action) for action in actions]
+        for token in reversed(tokens):
+            game.undo(token)
+    return op
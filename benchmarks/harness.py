@@ -0,0 +1,122 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+
+import numpy as np
+
+'''
+Benchmark registry and timing. A benchmark is a setup function registered with @benchmark that
+returns the zero-argument operation to time. Each repeat calls it `number` times, results are
+seconds per operation.
+'''
+
+BENCHMARKS = {}
+
+
+class Benchmark:
+    def __init__(self, name, setup, number, repeat, group):
+        self.name = name
+        self.setup = setup
+        self.number = number
+        self.repeat = repeat
+        self.group = group
+
+
+def benchmark(name, number=100, repeat=5):
+    def register(setup):
+        BENCHMARKS[name] = Benchmark(name, setup, number, repeat, setup.__module__.split('.')[-1])
+        return setup
+    return register
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.manual_seed(seed)
+
+
+def run_benchmark(bench, seed=0, scale=1.0):
+    seed_everything(seed)
+    op = bench.setup()
+    number = max(1, int(bench.number * scale))
+    op()  # warm up caches and lazy initialisation
+    times = []
+    for _ in range(bench.repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        times.append((time.perf_counter() - start) / number)
+    return {
+        'name': bench.name,
+        'group': bench.group,
+        'number': number,
+        'repeat': bench.repeat,
+        'best': min(times),
+        'median': statistics.median(times),
+        'ops_per_second': 1 / statistics.median(times),
+    }
+
+
+def environment():
+    info = {'python': platform.python_version(), 'platform': platform.platform(), 'numpy': np.__version__}
+    try:
+        import torch
+        info['torch'] = torch.__version__
+        info['torch_threads'] = torch.get_num_threads()
+    except ImportError:
+        pass
+    try:
+        info['commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                        check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return info
+
+
+def run(names, seed=0, scale=1.0, report=None):
+    results = []
+    for name in names:
+        result = run_benchmark(BENCHMARKS[name], seed, scale)
+        results.append(result)
+        if report:
+            report(result)
+    return {'environment': environment(), 'results': results}
+
+
+def save(data, path):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(data, baseline, threshold=0.1):
+    # Median time ratio against the baseline, a benchmark regresses when it is slower by more than threshold
+    previous = {result['name']: result for result in baseline['results']}
+    rows = []
+    for result in data['results']:
+        base = previous.get(result['name'])
+        if base is None:
+            continue
+        ratio = result['median'] / base['median']
+        status = 'regression' if ratio > 1 + threshold else 'improvement' if ratio < 1 - threshold else 'ok'
+        rows.append({'name': result['name'], 'baseline': base['median'], 'current': result['median'],
+                     'ratio': ratio, 'status': status})
+    return rows
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
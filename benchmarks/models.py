@@ -0,0 +1,120 @@
+import itertools
+
+import torch
+
+from AI.encoding import BIDDING_STATE_SIZE, PLAYING_STATE_SIZE, ROLES, StateEncoder, encode_playing_batch
+from AI.models import BiddingModel, PlayingModel, logit_mask, playing_parameters, shared_playing_models
+from AI.training import play_episode, train_models, update_models
+from agents import RandomAgent
+from benchmarks.harness import benchmark
+from game.deals import generate_deals
+from match import MatchRunner
+
+
+class RecordingAgent(RandomAgent):
+    # Random player that keeps the events of the last deal and a reference to its game
+    def reset(self, hands, dealer, vulnerable):
+        self.events = [('reset', hands, dealer, vulnerable)]
+        self.game = None
+
+    def observe_bid(self, seat, action):
+        self.events.append(('record_bid', seat, action))
+
+    def start_play(self, declarer, contract):
+        self.events.append(('start_play', declarer, contract))
+
+    def observe_card(self, seat, card):
+        self.events.append(('record_card', seat, card))
+
+    def choose_card(self, obs, mask):
+        self.game = obs.game
+        return super().choose_card(obs, mask)
+
+
+def recorded_deals(count):
+    # Deals that reached the play, as (events, finished GameLogic)
+    agent = RecordingAgent(0, pass_probability=0.8)
+    runner = MatchRunner([agent] * 4)
+    recorded = []
+    for hands in generate_deals(count * 2, 0):
+        if runner.play_deal([int(hand) for hand in hands])['contract'] is not None:
+            recorded.append((agent.events, agent.game))
+        if len(recorded) == count:
+            break
+    return recorded
+
+
+@benchmark('encode.incremental_deal', number=100)
+def encode_incremental_deal():
+    # Encoder reset, auction and all 52 cards of one deal
+    encoder = StateEncoder()
+    deals = itertools.cycle([events for events, _ in recorded_deals(16)])
+
+    def op():
+        reset, *events = next(deals)
+        encoder.reset(*reset[1:])
+        for name, *args in events:
+            getattr(encoder, name)(*args)
+    return op
+
+
+@benchmark('encode.playing_batch_64', number=5)
+def encode_playing_batch_64():
+    # Replays finished games into a (64, 524) buffer
+    games = [game for _, game in recorded_deals(64)]
+    out = torch.zeros(len(games), PLAYING_STATE_SIZE)
+    seats = [i % 4 for i in range(len(games))]
+    return lambda: encode_playing_batch(games, seats, out)
+
+
+def forward(batch_size):
+    bidding_model = BiddingModel().eval()
+    playing_model = PlayingModel().eval()
+    bidding_states = torch.rand(batch_size, BIDDING_STATE_SIZE)
+    playing_states = torch.rand(batch_size, PLAYING_STATE_SIZE)
+    hand_mask = logit_mask(torch.rand(batch_size, 52) < 0.25)
+
+    def op():
+        with torch.no_grad():
+            bidding_model(bidding_states)
+            playing_model(playing_states, hand_mask)
+    return op
+
+
+@benchmark('forward.single', number=2000)
+def forward_single():
+    # Bidding and playing model on one state each
+    return forward(1)
+
+
+@benchmark('forward.batch_256', number=200)
+def forward_batch_256():
+    return forward(256)
+
+
+@benchmark('train.episode', number=3, repeat=3)
+def train_episode():
+    bidding_model = BiddingModel()
+    playing_models = {role: PlayingModel() for role in ROLES}
+    return lambda: train_models(bidding_model, playing_models, episodes=1)
+
+
+def update_32(playing_models):
+    bidding_model = BiddingModel()
+    optimizer_bidding = torch.optim.Adam(bidding_model.parameters())
+    optimizer_playing = torch.optim.Adam(playing_parameters(playing_models))
+    encoder = StateEncoder()
+    trajectories = [play_episode(bidding_model, playing_models, encoder) for _ in range(32)]
+    return lambda: update_models(bidding_model, playing_models, optimizer_bidding, optimizer_playing, trajectories)
+
+
+@benchmark('train.update_32', number=5, repeat=3)
+def train_update_32():
+    # One batched update over 32 recorded self-play episodes
+    return update_32({role: PlayingModel() for role in ROLES})
+
+
+@benchmark('train.update_32_shared', number=5, repeat=3)
+def train_update_32_shared():
+    # Same with one role-conditioned playing model, a single playing forward per update
+    return update_32(shared_playing_models(role_heads=True))
@@ -0,0 +1,198 @@
+import argparse
+import itertools
+import math
+import multiprocessing
+import sys
+import time
+from statistics import NormalDist
+
+import numpy as np
+
+from agents import AGENTS, MODEL_AGENTS, make_agent
+from game.deals import DealArchive, generate_deals
+from game.records import iter_records
+from game.scoring import contract_score, imps
+from match import MatchRunner
+
+'''
+Duplicate comparison of two agents. Every board is played at two tables with the same cards: agent A
+north-south against B at the first, the seats swapped at the second, so the luck of the deal cancels
+and only the difference in play is left. Boards follow the standard 16-board dealer and vulnerability
+rotation.
+
+Per board A scores the IMPs of (north-south score at table 1 - north-south score at table 2), and
+matchpoints 1, 0.5 or 0 for beating, tying or losing to B's result in the same direction. Boards are
+spread over a process pool; the running mean, a normal confidence interval and an early stop once the
+IMP interval excludes 0 are checked every check_every boards after min_boards. Repeated looks make the
+nominal level optimistic, min_boards and a stricter --confidence keep that in check.
+
+Boards are dealt from --seed, read from a deal archive (--archive) or taken from recorded PBN/LIN files
+(--records, game/records.py); recorded deals keep their cards but are played in the rotation above.
+
+Agents are names from agents.py or a checkpoint path (python -m AI train), played greedily.
+
+python duplicate.py checkpoint.pt rule --boards 2000 --workers 4
+'''
+
+# Board 1..16: dealer seat, (north-south vulnerable, east-west vulnerable)
+VULNERABILITY = [(False, False), (True, False), (False, True), (True, True),
+                 (True, False), (False, True), (True, True), (False, False),
+                 (False, True), (True, True), (False, False), (True, False),
+                 (True, True), (False, False), (True, False), (False, True)]
+
+
+def board_conditions(board):
+    # Board numbers start at 1
+    return (board - 1) % 4, VULNERABILITY[(board - 1) % 16]
+
+
+def build_agent(spec, seed=None, greedy=True):
+    if spec in AGENTS or spec in MODEL_AGENTS:
+        return make_agent(spec, seed=seed)
+    from AI.agents import ModelAgent
+    from AI.checkpoint import load_checkpoint
+    bidding_model, playing_models, _ = load_checkpoint(spec)
+    return ModelAgent(bidding_model, playing_models, greedy=greedy, seed=seed)
+
+
+def north_south_score(result, vulnerable):
+    if result['contract'] is None:
+        return 0
+    declarer_side = result['declarer'] % 2
+    score = contract_score(result['contract'], result['doubled'], vulnerable[declarer_side],
+                           result['declarer_tricks'])
+    return score if declarer_side == 0 else -score
+
+
+class Tables:
+    # The two agents and the runners of both tables
+    def __init__(self, spec_a, spec_b, seed=0, greedy=True):
+        a, b = build_agent(spec_a, seed, greedy), build_agent(spec_b, seed + 1, greedy)
+        self.first = MatchRunner([a, b, a, b])
+        self.second = MatchRunner([b, a, b, a])
+
+    def play_board(self, board, hands):
+        # -> (board, north-south score at table 1, north-south score at table 2)
+        dealer, vulnerable = board_conditions(board)
+        first = self.first.play_deal(hands, dealer, vulnerable)
+        second = self.second.play_deal(hands, dealer, vulnerable)
+        return board, north_south_score(first, vulnerable), north_south_score(second, vulnerable)
+
+
+_tables = None
+
+
+def _init_worker(spec_a, spec_b, seed, greedy):
+    global _tables
+    _tables = Tables(spec_a, spec_b, seed + multiprocessing.current_process()._identity[0] * 2, greedy)
+    if 'torch' in sys.modules:
+        # One thread per worker, the pool is the parallelism
+        sys.modules['torch'].set_num_threads(1)
+
+
+def _play_boards(boards):
+    return [_tables.play_board(board, hands) for board, hands in boards]
+
+
+def interval(values, confidence):
+    # (mean, half width) of a normal confidence interval
+    n = len(values)
+    mean = float(np.mean(values))
+    if n < 2:
+        return mean, math.inf
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return mean, z * float(np.std(values, ddof=1)) / math.sqrt(n)
+
+
+def summarize(scores, confidence):
+    scores = np.asarray(scores, dtype=np.int64).reshape(-1, 2)
+    board_imps = imps(scores[:, 0] - scores[:, 1])
+    # A's result in each direction against B's result in the same direction
+    board_matchpoints = (np.sign(scores[:, 0] - scores[:, 1]) + 1) / 2
+    imp_mean, imp_width = interval(board_imps, confidence)
+    mp_mean, mp_width = interval(board_matchpoints, confidence)
+    return {
+        'boards': len(scores),
+        'imps_per_board': imp_mean,
+        'imps_low': imp_mean - imp_width,
+        'imps_high': imp_mean + imp_width,
+        'total_imps': int(board_imps.sum()),
+        'matchpoints': mp_mean,
+        'matchpoints_low': mp_mean - mp_width,
+        'matchpoints_high': mp_mean + mp_width,
+        'flat_boards': int((scores[:, 0] == scores[:, 1]).sum()),
+    }
+
+
+def significant(summary):
+    return summary['imps_low'] > 0 or summary['imps_high'] < 0
+
+
+def compare(spec_a, spec_b, deals, workers=1, confidence=0.95, min_boards=100, check_every=50, chunk_size=10,
+            seed=0, greedy=True, early_stop=True):
+    # deals - sequence of four-mask hands, board i + 1 is deals[i]; returns summarize() plus timing and
+    # whether the comparison stopped early
+    boards = [(i + 1, [int(hand) for hand in hands]) for i, hands in enumerate(deals)]
+    chunks = [boards[i:i + chunk_size] for i in range(0, len(boards), chunk_size)]
+    scores = {}
+    stopped = False
+    start = time.perf_counter()
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.get_context('spawn').Pool(workers, _init_worker, (spec_a, spec_b, seed, greedy))
+        results = pool.imap_unordered(_play_boards, chunks)
+    else:
+        tables = Tables(spec_a, spec_b, seed, greedy)
+        results = ([tables.play_board(board, hands) for board, hands in chunk] for chunk in chunks)
+    try:
+        checked = 0
+        for chunk in results:
+            for board, first, second in chunk:
+                scores[board] = (first, second)
+            if early_stop and len(scores) >= min_boards and len(scores) - checked >= check_every:
+                checked = len(scores)
+                if significant(summarize([scores[board] for board in sorted(scores)], confidence)):
+                    stopped = True
+                    break
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    summary = summarize([scores[board] for board in sorted(scores)], confidence)
+    seconds = time.perf_counter() - start
+    summary.update({'seconds': seconds, 'boards_per_second': len(scores) / seconds, 'stopped_early': stopped})
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Duplicate match between two agents")
+    parser.add_argument('a', help="agent name from agents.py or a checkpoint path")
+    parser.add_argument('b', help="agent name from agents.py or a checkpoint path")
+    parser.add_argument('--boards', type=int, default=1000, help="maximum number of boards")
+    parser.add_argument('--workers', type=int, default=max(1, multiprocessing.cpu_count() - 1))
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--min-boards', type=int, default=100, help="boards before the first significance check")
+    parser.add_argument('--check-every', type=int, default=50, help="boards between significance checks")
+    parser.add_argument('--no-early-stop', action='store_true')
+    parser.add_argument('--sample', action='store_true', help="sample model actions instead of argmax")
+    parser.add_argument('--archive', help="deal archive to read boards from instead of dealing them")
+    parser.add_argument('--records', help="PBN or LIN file to read boards from, invalid boards are skipped")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.records:
+        deals = [record.hands for record in itertools.islice(iter_records(args.records, strict=False), args.boards)]
+    elif args.archive:
+        deals = DealArchive(args.archive)[:args.boards]
+    else:
+        deals = generate_deals(args.boards, args.seed)
+    summary = compare(args.a, args.b, deals, args.workers, args.confidence, args.min_boards, args.check_every,
+                      seed=args.seed, greedy=not args.sample, early_stop=not args.no_early_stop)
+    print(f"a: {args.a}")
+    print(f"b: {args.b}")
+    for key, value in summary.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
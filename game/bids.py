@@ -0,0 +1,70 @@
+import numpy as np
+
+'''
+Bid ordinals. Contract bids are numbered in auction order, so a bid is legal when its ordinal
+is above the current highest one.
+
+0..34  - 1C, 1D, 1H, 1S, 1NT, 2C, ... 7NT (same order as VALID_BIDS)
+35     - Pass
+36     - Double (X)
+37     - Redouble (XX)
+'''
+
+BID_SUITS = ['C', 'D', 'H', 'S', 'NT']
+VALID_BIDS = [f"{rank}{suit}" for rank in range(1, 8) for suit in BID_SUITS]
+
+NUM_BIDS = 35
+PASS = 35
+DOUBLE = 36
+REDOUBLE = 37
+NUM_BID_ACTIONS = 38
+
+BID_NAMES = VALID_BIDS + ['Pass', 'X', 'XX']
+BID_ORDINAL = {name: i for i, name in enumerate(BID_NAMES)}
+BID_ORDINAL.update({'PASS': PASS, 'pass': PASS, 'DOUBLE': DOUBLE, 'REDOUBLE': REDOUBLE})
+
+
+def bid_level(ordinal):
+    return ordinal // 5 + 1
+
+
+def bid_strain(ordinal):
+    return ordinal % 5
+
+
+def _legal_bid_table():
+    # table[highest + 1, can_double, can_redouble] -> legal actions
+    table = np.zeros((NUM_BIDS + 1, 2, 2, NUM_BID_ACTIONS), dtype=bool)
+    for highest in range(-1, NUM_BIDS):
+        table[highest + 1, :, :, highest + 1:NUM_BIDS] = True
+    table[:, :, :, PASS] = True
+    table[:, 1, :, DOUBLE] = True
+    table[:, :, 1, REDOUBLE] = True
+    table.flags.writeable = False
+    return table
+
+
+LEGAL_BID_MASKS = _legal_bid_table()
+NO_LEGAL_BIDS = np.zeros(NUM_BID_ACTIONS, dtype=bool)
+NO_LEGAL_BIDS.flags.writeable = False
+
+
+def can_double(highest, doubled, passes):
+    # The last call was a bid by an opponent (RHO with no passes since, or LHO followed by two passes);
+    # ints or arrays of auction states
+    return (highest >= 0) & (doubled == 0) & ((passes == 0) | (passes == 2))
+
+
+def can_redouble(doubled, passes):
+    return (doubled == 1) & ((passes == 0) | (passes == 2))
+
+
+def legal_bid_mask(highest, doubled, passes):
+    return LEGAL_BID_MASKS[highest + 1, int(can_double(highest, doubled, passes)), int(can_redouble(doubled, passes))]
+
+
+def legal_bid_masks(highest, doubled, passes):
+    # (N, 38) bool from arrays of auction states, one table lookup for the batch
+    highest, doubled, passes = (np.asarray(values, dtype=np.int64) for values in (highest, doubled, passes))
+    return LEGAL_BID_MASKS[highest + 1, can_double(highest, doubled, passes).astype(np.int8),
+                           can_redouble(doubled, passes).astype(np.int8)]
@@ -0,0 +1,99 @@
+'''
+Compact card model used by the engine.
+
+card - integer 0..51, suit * 13 + rank (suit order C, D, H, S; rank order 2..A)
+hand - 52-bit integer mask (fits one uint64), bit n set when card n is held
+'''
+
+SUITS = ['C', 'D', 'H', 'S']  # Clubs, Diamonds, Hearts, Spades
+SUIT_NAMES = ['clubs', 'diamonds', 'hearts', 'spades']
+RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+
+NUM_CARDS = 52
+FULL_DECK = (1 << NUM_CARDS) - 1
+
+SUIT_INDEX = {suit: i for i, suit in enumerate(SUITS)}
+SUIT_INDEX.update({name: i for i, name in enumerate(SUIT_NAMES)})
+RANK_INDEX = {rank: i for i, rank in enumerate(RANKS)}
+
+SUIT_MASKS = [((1 << 13) - 1) << (13 * suit) for suit in range(4)]
+
+CARD_NAMES = [f"{rank}{suit}" for suit in SUITS for rank in RANKS]
+CARD_BY_NAME = {name: i for i, name in enumerate(CARD_NAMES)}
+
+
+def card_index(suit, rank):
+    return SUIT_INDEX[suit] * 13 + RANK_INDEX[rank]
+
+
+def card_suit(card):
+    return card // 13
+
+
+def card_rank(card):
+    return card % 13
+
+
+def card_bit(card):
+    return 1 << card
+
+
+def parse_card(card_str):
+    # Returns the card index for strings like '10H', or None if it is not a card
+    return CARD_BY_NAME.get(card_str)
+
+
+def suit_cards(hand, suit):
+    return hand & SUIT_MASKS[suit]
+
+
+def has_card(hand, card):
+    return (hand >> card) & 1 == 1
+
+
+def count_cards(hand):
+    return hand.bit_count()
+
+
+def iter_cards(hand):
+    while hand:
+        low = hand & -hand
+        yield low.bit_length() - 1
+        hand ^= low
+
+
+def lowest_card(hand):
+    return (hand & -hand).bit_length() - 1
+
+
+def highest_card(hand):
+    return hand.bit_length() - 1
+
+
+def hand_from_cards(cards):
+    hand = 0
+    for card in cards:
+        hand |= 1 << card
+    return hand
+
+
+def legal_cards(hand, leading_suit=None):
+    # Follow suit if possible, otherwise any card in hand is legal
+    if leading_suit is None:
+        return hand
+    in_suit = hand & SUIT_MASKS[leading_suit]
+    return in_suit if in_suit else hand
+
+
+def trick_winner(cards, trump_suit=None):
+    # cards - card indices in play order; returns the position of the winning card
+    winner = 0
+    best = cards[0]
+    for position in range(1, len(cards)):
+        card = cards[position]
+        if card // 13 == best // 13:
+            if card > best:
+                winner, best = position, card
+        elif card // 13 == trump_suit:
+            winner, best = position, card
+    return winner
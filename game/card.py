@@ -1,7 +1,28 @@
+from .bitboard import CARD_NAMES, RANKS, SUIT_NAMES, SUITS, card_index
+
+
 class Card:
+    # View over a card index 0..51 (see bitboard.py)
     def __init__(self, suit, rank):
         self.suit = suit
         self.rank = rank
+        self.index = card_index(suit, rank)
+
+    @staticmethod
+    def from_index(index):
+        return CARDS[index]
+
+    def __eq__(self, other):
+        return isinstance(other, Card) and self.index == other.index
+
+    def __hash__(self):
+        return self.index
 
     def __repr__(self):
-        return f"{self.rank} {self.suit}"
\ No newline at end of file
+        return f"{self.rank}{self.suit}"
+
+
+CARDS = [Card(suit, rank) for suit in SUITS for rank in RANKS]
+# '10H' and the spelled out '10 hearts'
+CARD_BY_NAME = dict(zip(CARD_NAMES, CARDS))
+CARD_BY_NAME.update({f"{card.rank} {SUIT_NAMES[card.index // 13]}": card for card in CARDS})
@@ -0,0 +1,208 @@
+import argparse
+import hashlib
+import sqlite3
+from collections import OrderedDict
+
+import numpy as np
+
+from .bids import bid_strain
+from .deals import DealArchive, hands_to_seats, pack_seats
+from .scoring import contract_score
+
+'''
+Canonical deal keys and a two-tier outcome cache.
+
+A deal is stored as the 13-byte packed seat layout of deals.py, taken at the rotation (0..3 seats)
+that gives the smallest bytes, so the four rotations of a deal share one key. Seats in the key
+(the declarer) are relative to that rotation. deal_hash is a stable 64-bit hash of the key bytes.
+
+OutcomeCache maps (deal, contract, declarer, doubled, declarer vulnerable) to (declarer tricks, score),
+with an in-memory LRU in front of an SQLite table. Misses are scored from the deal's double-dummy table
+(declarer x strain tricks) when fill() has stored one, else from the fallback tricks the caller passes
+(training passes the tricks actually taken, so no solver runs inside an episode), else computed by an
+evaluator, by default the double-dummy solver.
+
+fill() solves deals in bulk with solver.solve_deals across processes, ahead of training:
+
+python -m game.deal_cache deals.bin outcomes.db --count 100000 --processes 8
+'''
+
+
+def canonical_deal(hands):
+    # -> (13 key bytes, rotation), rotation r maps seat s to (s - r) % 4 in the key
+    seats = hands_to_seats(np.asarray([hands], dtype=np.uint64))[0]
+    rotations = [pack_seats((seats - r) % 4).tobytes() for r in range(4)]
+    rotation = min(range(4), key=rotations.__getitem__)
+    return rotations[rotation], rotation
+
+
+def deal_hash(hands):
+    key, _ = canonical_deal(hands)
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+def double_dummy_tricks(hands, contract, declarer):
+    from .solver import solve_contract
+    return solve_contract(hands, bid_strain(contract), declarer)
+
+
+class OutcomeCache:
+    def __init__(self, path=None, capacity=100_000, evaluate=double_dummy_tricks, commit_every=100):
+        # path=None keeps only the in-memory tier; evaluate(hands, contract, declarer) -> declarer tricks
+        self.capacity = capacity
+        self.evaluate = evaluate
+        self.commit_every = commit_every
+        self.memory = OrderedDict()
+        self.pending = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS outcomes (deal BLOB, contract INTEGER, declarer INTEGER, "
+                            "doubled INTEGER, vulnerable INTEGER, tricks INTEGER, score INTEGER, "
+                            "PRIMARY KEY (deal, contract, declarer, doubled, vulnerable))")
+            # 20 bytes per deal, tricks[declarer * 5 + strain] with the declarer relative to the key rotation
+            self.db.execute("CREATE TABLE IF NOT EXISTS tables (deal BLOB PRIMARY KEY, tricks BLOB)")
+        self.fallbacks = 0
+
+    def key(self, hands, contract, declarer, doubled=0, vulnerable=False):
+        deal, rotation = canonical_deal(hands)
+        return deal, int(contract), (declarer - rotation) % 4, int(doubled), int(bool(vulnerable))
+
+    def get(self, hands, contract, declarer, doubled=0, vulnerable=False):
+        return self._lookup(self.key(hands, contract, declarer, doubled, vulnerable))
+
+    def _lookup(self, key):
+        outcome = self.memory.get(key)
+        if outcome is not None:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return outcome
+        if self.db is not None:
+            row = self.db.execute("SELECT tricks, score FROM outcomes WHERE deal=? AND contract=? AND declarer=? "
+                                  "AND doubled=? AND vulnerable=?", key).fetchone()
+            if row is not None:
+                self.disk_hits += 1
+                self._remember(key, row)
+                return row
+        return None
+
+    def _remember(self, key, outcome):
+        self.memory[key] = outcome
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def put(self, hands, contract, declarer, doubled, vulnerable, tricks):
+        key = self.key(hands, contract, declarer, doubled, vulnerable)
+        return self._store(key, tricks)
+
+    def _store(self, key, tricks):
+        outcome = (int(tricks), contract_score(key[1], key[3], key[4], int(tricks)))
+        self._remember(key, outcome)
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO outcomes VALUES (?, ?, ?, ?, ?, ?, ?)", key + outcome)
+            self.pending += 1
+            if self.pending >= self.commit_every:
+                self.flush()
+        return outcome
+
+    def table(self, deal):
+        # Double-dummy tricks of a canonical deal key (bytes, see tables above), None when not filled
+        table = self.memory.get(deal)
+        if table is not None:
+            self.memory.move_to_end(deal)
+            return table
+        if self.db is not None:
+            row = self.db.execute("SELECT tricks FROM tables WHERE deal=?", (deal,)).fetchone()
+            if row is not None:
+                self._remember(deal, row[0])
+                return row[0]
+        return None
+
+    def has_table(self, hands):
+        return self.table(canonical_deal(hands)[0]) is not None
+
+    def put_table(self, hands, table):
+        # table[declarer][strain] as returned by solver.solve_deal
+        deal, rotation = canonical_deal(hands)
+        tricks = bytes(table[(seat + rotation) % 4][strain] for seat in range(4) for strain in range(5))
+        self._remember(deal, tricks)
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO tables VALUES (?, ?)", (deal, tricks))
+            self.pending += 1
+            if self.pending >= self.commit_every:
+                self.flush()
+
+    def fill(self, deals, processes=None, chunk_deals=1000):
+        # Solves every deal without a table, chunk_deals at a time over a process pool; -> deals solved
+        from .solver import solve_deals
+        solved = 0
+        deals = iter(deals)
+        while True:
+            chunk = [[int(hand) for hand in hands] for _, hands in zip(range(chunk_deals), deals)]
+            if not chunk:
+                break
+            chunk = [hands for hands in chunk if not self.has_table(hands)]
+            if chunk:
+                for hands, table in zip(chunk, solve_deals(chunk, processes)):
+                    self.put_table(hands, table)
+                self.flush()
+                solved += len(chunk)
+        return solved
+
+    def outcome(self, hands, contract, declarer, doubled=0, vulnerable=False, fallback=None):
+        # (declarer tricks, score). A miss is scored from the filled table of the deal, else from the
+        # fallback declarer tricks (not stored), else evaluated; the table and evaluated results are stored
+        key = self.key(hands, contract, declarer, doubled, vulnerable)
+        outcome = self._lookup(key)
+        if outcome is not None:
+            return outcome
+        self.misses += 1
+        table = self.table(key[0])
+        if table is not None:
+            return self._store(key, table[key[2] * 5 + bid_strain(contract)])
+        if fallback is not None:
+            self.fallbacks += 1
+            return int(fallback), contract_score(key[1], key[3], key[4], int(fallback))
+        return self._store(key, self.evaluate(hands, contract, declarer))
+
+    def flush(self):
+        if self.db is not None and self.pending:
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        self.flush()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill an outcome cache with double-dummy tables of archived deals")
+    parser.add_argument('archive', help="deal archive (deals.py)")
+    parser.add_argument('path', help="SQLite cache file")
+    parser.add_argument('--start', type=int, default=0)
+    parser.add_argument('--count', type=int)
+    parser.add_argument('--processes', type=int)
+    args = parser.parse_args()
+    archive = DealArchive(args.archive)
+    stop = len(archive) if args.count is None else min(len(archive), args.start + args.count)
+    deals = (archive[i] for i in range(args.start, stop))
+    with OutcomeCache(args.path) as cache:
+        solved = cache.fill(deals, args.processes)
+    print(f"Solved {solved} of {stop - args.start} deals into {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import argparse
+import os
+
+import numpy as np
+
+'''
+Bulk deal generation and a memory-mapped deal archive.
+
+Archive layout: 16-byte header (8-byte magic, int64 seed) followed by 13 bytes per deal.
+Each byte holds the seats of four consecutive cards, 2 bits per card, card 0 in the low bits.
+'''
+
+MAGIC = b'BRDEALS1'
+HEADER_BYTES = 16
+DEAL_BYTES = 13
+
+SEAT_SHIFTS = np.array([0, 2, 4, 6], dtype=np.uint8)
+UNSHUFFLED_SEATS = np.repeat(np.arange(4, dtype=np.uint8), 13)
+
+
+def random_seats(rng, n):
+    # seats[i, card] - seat holding card in deal i, 13 cards per seat
+    return rng.permuted(np.broadcast_to(UNSHUFFLED_SEATS, (n, 52)), axis=1)
+
+
+def seats_to_hands(seats):
+    hands = np.zeros((len(seats), 4), dtype=np.uint64)
+    buffer = np.zeros((len(seats), 8), dtype=np.uint8)
+    for seat in range(4):
+        buffer[:, :7] = np.packbits(seats == seat, axis=1, bitorder='little')
+        hands[:, seat] = buffer.view('<u8')[:, 0]
+    return hands
+
+
+def hands_to_seats(hands):
+    hands = np.asarray(hands, dtype=np.uint64)
+    seats = np.zeros((len(hands), 52), dtype=np.uint8)
+    for seat in range(1, 4):
+        seats[card_bits(hands[:, seat]) == 1] = seat
+    return seats
+
+
+def card_bits(hands):
+    # (N,) 52-bit masks -> (N, 52) uint8 with one entry per card
+    hands = np.asarray(hands, dtype=np.uint64).astype('<u8').reshape(-1, 1)
+    return np.unpackbits(hands.view(np.uint8), axis=1, bitorder='little')[:, :52]
+
+
+def pack_seats(seats):
+    return (seats.reshape(-1, 13, 4) << SEAT_SHIFTS).sum(axis=2, dtype=np.uint8)
+
+
+def unpack_seats(packed):
+    return ((packed[:, :, None] >> SEAT_SHIFTS) & 3).reshape(-1, 52)
+
+
+def deal_hands(rng, n):
+    return seats_to_hands(random_seats(rng, n))
+
+
+def generate_deals(n, seed):
+    return deal_hands(np.random.default_rng(seed), n)
+
+
+def write_archive(path, count, seed, chunk_size=1_000_000):
+    rng = np.random.default_rng(seed)
+    with open(path, 'wb') as f:
+        f.write(MAGIC + np.int64(seed).tobytes())
+        for start in range(0, count, chunk_size):
+            f.write(pack_seats(random_seats(rng, min(chunk_size, count - start))).tobytes())
+
+
+def append_hands(path, hands, seed=-1):
+    # Appends already dealt hands (N, 4) to an archive, creating it if needed
+    new = not os.path.exists(path)
+    with open(path, 'ab') as f:
+        if new:
+            f.write(MAGIC + np.int64(seed).tobytes())
+        f.write(pack_seats(hands_to_seats(hands)).tobytes())
+
+
+class DealArchive:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_BYTES)
+        if header[:8] != MAGIC:
+            raise ValueError(f"{path} is not a deal archive")
+        self.path = path
+        self.seed = int(np.frombuffer(header[8:], dtype=np.int64)[0])
+        self.data = np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER_BYTES).reshape(-1, DEAL_BYTES)
+        self.position = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        # Integer index -> four Python int hands, slice or index array -> (N, 4) uint64
+        if isinstance(index, (int, np.integer)):
+            # self.data[index] raises IndexError out of range and handles negative indices
+            return [int(hand) for hand in seats_to_hands(unpack_seats(self.data[index][None]))[0]]
+        return seats_to_hands(unpack_seats(np.asarray(self.data[index])))
+
+    def seats(self, start, stop):
+        return unpack_seats(np.asarray(self.data[start:stop]))
+
+    def next_hands(self, n):
+        # Sequential reads that wrap around at the end of the archive
+        idx = (self.position + np.arange(n)) % len(self)
+        self.position = (self.position + n) % len(self)
+        return self[idx]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a seeded deal archive")
+    parser.add_argument('path')
+    parser.add_argument('--count', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    write_archive(args.path, args.count, args.seed)
+    print(f"Wrote {args.count} deals to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
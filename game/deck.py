@@ -1,16 +1,21 @@
 import random
-from .card import Card
+from .card import CARDS
 
 class Deck:
-    suits = ['hearts', 'diamonds', 'clubs', 'spades']
-    ranks = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-
     def __init__(self):
-        self.cards = [Card(suit, rank) for suit in self.suits for rank in self.ranks]
+        self.cards = list(range(52))  # card indices, dealt from the end
         self.shuffle()
 
     def shuffle(self):
         random.shuffle(self.cards)
 
     def deal(self):
-        return self.cards.pop()
\ No newline at end of file
+        return CARDS[self.cards.pop()]
+
+    def deal_hands(self):
+        # Deals the remaining cards round-robin, the same order as repeated deal() calls
+        hands = [0, 0, 0, 0]
+        for i, card in enumerate(reversed(self.cards)):
+            hands[i % 4] |= 1 << card
+        self.cards = []
+        return hands
\ No newline at end of file
@@ -1,4 +1,8 @@
+from .bitboard import SUIT_MASKS, SUIT_NAMES, has_card
+from .card import CARD_BY_NAME
+from .deck import Deck
 from .game_state import GameState
+from .player import Player
 
 class Bidding:
     def __init__(self):
@@ -41,9 +45,8 @@ class GameLogic:
         self.deal_cards()
 
     def deal_cards(self):
-        for _ in range(13):
-            for player in self.players:
-                player.receive_card(self.deck.deal())
+        for player, hand in zip(self.players, self.deck.deal_hands()):
+            player.mask |= hand
 
     def get_current_player(self):
         return self.players[self.current_player_index]
@@ -65,16 +68,16 @@ class GameLogic:
         return True
 
     def play_card(self, player, card_str):
-        card_obj = next((c for c in player.hand if str(c) == card_str), None)
-        if not card_obj:
+        card_obj = CARD_BY_NAME.get(card_str)
+        if card_obj is None or not has_card(player.mask, card_obj.index):
             print("Invalid card. Try again.")
             return False
 
         # Check if the player follows the lead suit if possible
         if self.tricks and self.tricks[-1].cards:
-            leading_suit = self.tricks[-1].cards[0][1].suit
-            if any(c.suit == leading_suit for c in player.hand) and card_obj.suit != leading_suit:
-                print(f"You must follow suit with {leading_suit} if you have one.")
+            leading_suit = self.tricks[-1].cards[0][1].index // 13
+            if player.mask & SUIT_MASKS[leading_suit] and card_obj.index // 13 != leading_suit:
+                print(f"You must follow suit with {SUIT_NAMES[leading_suit]} if you have one.")
                 return False
 
         self.tricks[-1].play_card(player, player.play_card(card_obj))
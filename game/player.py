@@ -1,14 +1,26 @@
+from .bitboard import SUIT_INDEX, SUIT_MASKS, has_card, iter_cards
+from .card import CARDS
+
 class Player:
     def __init__(self, name):
         self.name = name
-        self.hand = []
+        self.mask = 0  # 52-bit hand
+
+    @property
+    def hand(self):
+        return [CARDS[card] for card in iter_cards(self.mask)]
 
     def receive_card(self, card):
-        self.hand.append(card)
+        self.mask |= 1 << card.index
 
     def play_card(self, card):
-        self.hand.remove(card)
+        if not has_card(self.mask, card.index):
+            raise ValueError(f"{card} is not in {self.name}'s hand")
+        self.mask ^= 1 << card.index
         return card
 
+    def has_suit(self, suit):
+        return self.mask & SUIT_MASKS[SUIT_INDEX[suit]] != 0
+
     def show_hand(self):
         return ', '.join(map(str, self.hand))
\ No newline at end of file
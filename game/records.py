@@ -0,0 +1,636 @@
+import argparse
+import gzip
+import multiprocessing
+import re
+import sys
+from collections import deque
+
+from .bids import BID_ORDINAL, DOUBLE, NUM_BIDS, PASS, REDOUBLE, legal_bid_mask, legal_bid_masks
+from .bitboard import FULL_DECK, RANK_INDEX, SUIT_INDEX, SUIT_MASKS, trick_winner
+
+'''
+Streaming readers for recorded boards in PBN (Portable Bridge Notation) and LIN (BBO) files.
+
+iter_pbn(lines) and iter_lin(lines) are generators over any iterable of text lines, so a file of any size
+is read one board at a time. Every board is validated before it is yielded: four 13-card hands covering
+the deck (a single unknown hand is completed from the other three), an auction that is legal call by
+call under the game/bids.py rules and complete, and the play, when recorded, following suit from the
+right hands. strict=False skips invalid boards instead of raising RecordError; pass a list as rejected to
+collect (board, reason) for them.
+
+Seats are 0 N, 1 E, 2 S, 3 W (north-south even, as in the engine). Auctions are bid ordinals
+(game/bids.py), cards are 0..51 (game/bitboard.py).
+
+iter_chunks splits a file into lists of lines on board boundaries without parsing it (LIN files are read
+in blocks and cut between fields, since boards often share a line), and map_chunks runs a picklable
+function over the parsed boards of each chunk in a spawn process pool, in file order, with at most
+2 * workers chunks in flight, so memory is bounded by the chunk size and not the file size.
+
+python -m game.records boards.pbn --workers 4 --archive deals.bin
+'''
+
+SEATS = 'NESW'
+SEAT_INDEX = {seat: i for i, seat in enumerate(SEATS)}
+PBN_SUITS = 'SHDC'  # order of the suits in a PBN hand
+LIN_DEALER = {'1': 2, '2': 3, '3': 0, '4': 1}  # LIN dealer digit -> seat, hands are listed S, W, N, E
+LIN_SEATS = [2, 3, 0, 1]
+VULNERABLE = {'none': (False, False), 'love': (False, False), '-': (False, False), 'o': (False, False),
+              '0': (False, False), 'ns': (True, False), 'n': (True, False), 'ew': (False, True),
+              'e': (False, True), 'all': (True, True), 'both': (True, True), 'b': (True, True)}
+# Board 1..16 vulnerability, for files that leave it out (same table as duplicate.py)
+BOARD_VULNERABILITY = [(False, False), (True, False), (False, True), (True, True),
+                       (True, False), (False, True), (True, True), (False, False),
+                       (False, True), (True, True), (False, False), (True, False),
+                       (True, True), (False, False), (True, False), (False, True)]
+
+PBN_TAG = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+LIN_BOARD = re.compile(r'(\d+)')
+
+
+class RecordError(ValueError):
+    pass
+
+
+class BoardRecord:
+    # One validated board: hands as four 52-bit masks, auction as bid ordinals, play as cards in order
+    def __init__(self, board, dealer, vulnerable, hands, auction, play=(), declarer_tricks=None):
+        self.board = board
+        self.dealer = dealer
+        self.vulnerable = vulnerable
+        self.hands = hands
+        self.auction = auction
+        self.play = list(play)
+        self.declarer_tricks = declarer_tricks  # from the Result tag or a LIN claim, None when not recorded
+
+    def contract(self):
+        # -> (contract ordinal, declarer seat, doubled), contract None when passed out
+        return auction_contract(self.dealer, self.auction)
+
+    def __repr__(self):
+        return f"BoardRecord(board={self.board}, dealer={SEATS[self.dealer]}, calls={len(self.auction)})"
+
+
+def parse_call(text):
+    # 'Pass', 'P', 'X', 'D', 'XX', 'R', '1N', '1NT', '3s!' ... -> ordinal, None for unrecognized text
+    call = text.rstrip('!?').upper()
+    if call in ('P', 'PASS'):
+        return PASS
+    if call in ('X', 'D', 'DBL'):
+        return DOUBLE
+    if call in ('XX', 'R', 'RDBL'):
+        return REDOUBLE
+    if call.endswith('N'):
+        call += 'T'
+    ordinal = BID_ORDINAL.get(call)
+    return ordinal if ordinal is not None and ordinal < NUM_BIDS else None
+
+
+def parse_card(text):
+    # 'SA', 'hT', 'D10' -> card, None for unrecognized text
+    text = text.strip().upper()
+    if len(text) < 2 or text[0] not in SUIT_INDEX:
+        return None
+    rank = RANK_INDEX.get('10' if text[1:] == 'T' else text[1:])
+    return None if rank is None else SUIT_INDEX[text[0]] * 13 + rank
+
+
+def suit_ranks_mask(suit, ranks):
+    mask = 0
+    for rank in ranks.upper().replace('10', 'T'):
+        index = RANK_INDEX.get('10' if rank == 'T' else rank)
+        if index is None:
+            raise RecordError(f"bad rank {rank!r}")
+        card = SUIT_INDEX[suit] * 13 + index
+        if mask >> card & 1:
+            raise RecordError(f"card {rank}{suit} listed twice")
+        mask |= 1 << card
+    return mask
+
+
+def complete_hands(hands):
+    # Fills a single unknown (None) hand from the other three, then checks 13 cards each and the full deck
+    missing = [seat for seat, hand in enumerate(hands) if hand is None]
+    if len(missing) > 1:
+        raise RecordError(f"{len(missing)} hands missing")
+    if missing:
+        rest = 0
+        for hand in hands:
+            rest |= hand or 0
+        hands[missing[0]] = FULL_DECK & ~rest
+    seen = 0
+    for seat, hand in enumerate(hands):
+        if bin(hand).count('1') != 13:
+            raise RecordError(f"{SEATS[seat]} holds {bin(hand).count('1')} cards")
+        if seen & hand:
+            raise RecordError("a card is dealt twice")
+        seen |= hand
+    return hands
+
+
+def auction_steps(auction):
+    # -> (call, highest, doubled, passes) per call, the auction state before the call
+    highest, doubled, passes = -1, 0, 0
+    for call in auction:
+        yield call, highest, doubled, passes
+        if call == PASS:
+            passes += 1
+        elif call == DOUBLE:
+            doubled, passes = 1, 0
+        elif call == REDOUBLE:
+            doubled, passes = 2, 0
+        else:
+            highest, doubled, passes = call, 0, 0
+
+
+def check_auction(auction):
+    # Raises RecordError unless every call is legal and the auction is over after the last one
+    for i, (call, highest, doubled, passes) in enumerate(auction_steps(auction)):
+        if (i >= 4 or highest >= 0) and passes >= 3:
+            raise RecordError(f"call {i + 1} after the auction ended")
+        if not legal_bid_mask(highest, doubled, passes)[call]:
+            raise RecordError(f"illegal call {i + 1}")
+    trailing = len(auction) - max([i + 1 for i, call in enumerate(auction) if call != PASS], default=0)
+    if len(auction) < 4 or trailing < 3:
+        raise RecordError("auction is not complete")
+
+
+def legal_masks(auction):
+    # (calls, NUM_BID_ACTIONS) legal actions before each call
+    _, highest, doubled, passes = zip(*auction_steps(auction)) if auction else ((), (), (), ())
+    return legal_bid_masks(highest, doubled, passes)
+
+
+def auction_contract(dealer, auction):
+    # Declarer is the first player of the declaring side to name the final strain
+    contract, doubled, last = None, 0, None
+    for i, call in enumerate(auction):
+        if call < NUM_BIDS:
+            contract, doubled, last = call, 0, (dealer + i) % 4
+        elif call == DOUBLE:
+            doubled = 1
+        elif call == REDOUBLE:
+            doubled = 2
+    if contract is None:
+        return None, None, 0
+    for i, call in enumerate(auction):
+        seat = (dealer + i) % 4
+        if call < NUM_BIDS and call % 5 == contract % 5 and seat % 2 == last % 2:
+            return contract, seat, doubled
+
+
+def check_play(hands, dealer, auction, play):
+    # Raises RecordError unless each card is held by the player on turn and follows suit when it can
+    contract, declarer, _ = auction_contract(dealer, auction)
+    if contract is None:
+        if play:
+            raise RecordError("cards played on a passed-out board")
+        return
+    if len(play) > 52:
+        raise RecordError("more than 52 cards played")
+    trump = None if contract % 5 == 4 else contract % 5
+    hands = list(hands)
+    seat = (declarer + 1) % 4
+    trick = []
+    for card in play:
+        if not hands[seat] >> card & 1:
+            raise RecordError(f"{SEATS[seat]} does not hold card {card}")
+        if trick:
+            led = trick[0] // 13
+            if card // 13 != led and hands[seat] & SUIT_MASKS[led]:
+                raise RecordError(f"{SEATS[seat]} revoked")
+        hands[seat] &= ~(1 << card)
+        trick.append(card)
+        if len(trick) == 4:
+            seat = (seat + 1 + trick_winner(trick, trump)) % 4
+            trick = []
+        else:
+            seat = (seat + 1) % 4
+
+
+def make_record(board, dealer, vulnerable, hands, auction, play, declarer_tricks):
+    hands = complete_hands(hands)
+    check_auction(auction)
+    check_play(hands, dealer, auction, play)
+    return BoardRecord(board, dealer, vulnerable, hands, auction, play, declarer_tricks)
+
+
+def board_defaults(board):
+    # Dealer and vulnerability of the standard rotation
+    if board is None:
+        return 0, (False, False)
+    return (board - 1) % 4, BOARD_VULNERABILITY[(board - 1) % 16]
+
+
+def _emit(build, board, strict, rejected):
+    try:
+        return build()
+    except RecordError as error:
+        if strict:
+            raise RecordError(f"board {board}: {error}") from None
+        if rejected is not None:
+            rejected.append((board, str(error)))
+    return None
+
+
+# PBN
+
+def pbn_hands(deal):
+    # 'N:AKQ.JT9.876.5432 - ...' -> four masks by seat, None for a '-' hand
+    first, _, rest = deal.strip().partition(':')
+    if first.upper() not in SEAT_INDEX:
+        raise RecordError(f"bad Deal tag {deal!r}")
+    hands = [None] * 4
+    texts = rest.split()
+    if len(texts) != 4:
+        raise RecordError(f"bad Deal tag {deal!r}")
+    for i, text in enumerate(texts):
+        if text == '-':
+            continue
+        suits = text.split('.')
+        if len(suits) != 4:
+            raise RecordError(f"bad hand {text!r}")
+        hand = 0
+        for suit, ranks in zip(PBN_SUITS, suits):
+            hand |= suit_ranks_mask(suit, ranks.replace('-', ''))
+        hands[(SEAT_INDEX[first.upper()] + i) % 4] = hand
+    return hands
+
+
+def pbn_tokens(lines):
+    tokens = []
+    for line in lines:
+        for token in line.split():
+            if token == '*' or token.startswith('='):
+                continue  # end marker, note reference
+            if token.startswith('$') or token in ('-', '+'):
+                continue  # annotation, no call, contract continues
+            tokens.append(token)
+    return tokens
+
+
+def close_auction(auction):
+    # 'AP': the passes that end the auction
+    trailing = 0
+    while trailing < len(auction) and auction[-1 - trailing] == PASS:
+        trailing += 1
+    needed = 4 if trailing == len(auction) else 3
+    return auction + [PASS] * max(0, needed - trailing)
+
+
+def pbn_auction(tokens):
+    auction = []
+    for token in tokens:
+        if token.upper() == 'AP':
+            auction = close_auction(auction)
+            continue
+        call = parse_call(token)
+        if call is None:
+            raise RecordError(f"bad call {token!r}")
+        auction.append(call)
+    return auction
+
+
+def pbn_play(dealer, auction, leader, lines):
+    # PBN lists each trick by seat starting with the Play tag seat; turns it into play order
+    contract, declarer, _ = auction_contract(dealer, auction)
+    if contract is None:
+        return []
+    trump = None if contract % 5 == 4 else contract % 5
+    play = []
+    seat = (declarer + 1) % 4
+    for line in lines:
+        tokens = [token for token in line.split() if not token.startswith(('=', '$'))]
+        if not tokens or tokens == ['*']:
+            continue
+        cards = []
+        for token in tokens[:4]:
+            card = None if token in ('-', '*') else parse_card(token)
+            if card is None and token not in ('-', '*'):
+                raise RecordError(f"bad card {token!r}")
+            cards.append(card)
+        by_seat = {(leader + i) % 4: card for i, card in enumerate(cards)}
+        trick = [by_seat.get((seat + i) % 4) for i in range(4)]
+        if None in trick:
+            # An incomplete trick ends the recorded play (claim)
+            play += trick[:trick.index(None)]
+            break
+        play += trick
+        seat = (seat + trick_winner(trick, trump)) % 4
+    return play
+
+
+def iter_pbn(lines, strict=True, rejected=None, inherited=None):
+    # inherited - tag values of the previous board, for '#' values at the start of a chunk
+    previous = dict(inherited or {})
+    tags, sections, section = {}, {}, None
+    comment = False
+
+    def flush():
+        board_tag = tags.get('Board', '')
+        board = int(board_tag) if board_tag.isdigit() else None
+
+        def build():
+            if 'Deal' not in tags:
+                raise RecordError("no Deal tag")
+            default_dealer, default_vulnerable = board_defaults(board)
+            dealer = SEAT_INDEX.get(tags.get('Dealer', '').upper(), default_dealer)
+            vulnerable = VULNERABLE.get(tags.get('Vulnerable', '').lower(), default_vulnerable)
+            hands = pbn_hands(tags['Deal'])
+            auction = pbn_auction(pbn_tokens(sections.get('Auction', [])))
+            if not auction:
+                raise RecordError("no auction")
+            leader = SEAT_INDEX.get(tags.get('Play', '').upper())
+            play = []
+            if leader is not None and sections.get('Play'):
+                play = pbn_play(dealer, auction, leader, sections['Play'])
+            result = tags.get('Result', '')
+            return make_record(board, dealer, vulnerable, hands, auction, play,
+                               int(result) if result.isdigit() else None)
+
+        return _emit(build, board, strict, rejected)
+
+    for line in lines:
+        line = line.strip()
+        if comment:
+            comment = '}' not in line
+            continue
+        if line.startswith('{'):
+            comment = '}' not in line
+            continue
+        if line.startswith(('%', ';')):
+            continue
+        if not line:
+            if tags:
+                record = flush()
+                previous.update(tags)
+                tags, sections, section = {}, {}, None
+                if record is not None:
+                    yield record
+            continue
+        match = PBN_TAG.match(line)
+        if match:
+            name, value = match.groups()
+            tags[name] = previous.get(name, '') if value == '#' else value
+            section = name if name in ('Auction', 'Play') else None
+            if section:
+                sections[section] = []
+        elif section:
+            sections[section].append(line.split(';')[0])
+    if tags:
+        record = flush()
+        if record is not None:
+            yield record
+
+
+# LIN
+
+def lin_hands(md):
+    # '3SAKQHT98D...,S...,S...,' -> dealer seat, four masks by seat (None for a left-out hand)
+    if not md or md[0] not in LIN_DEALER:
+        raise RecordError(f"bad md {md!r}")
+    dealer = LIN_DEALER[md[0]]
+    hands = [None] * 4
+    for seat, text in zip(LIN_SEATS, md[1:].split(',')):
+        if not text.strip():
+            continue
+        hand, suit = 0, None
+        for part in re.findall(r'[SHDC]|[^SHDC]+', text.strip().upper()):
+            if part in SUIT_INDEX:
+                suit = part
+            elif suit is None:
+                raise RecordError(f"bad hand {text!r}")
+            else:
+                hand |= suit_ranks_mask(suit, part)
+        hands[seat] = hand
+    return dealer, hands
+
+
+def lin_blocks(f, size=1 << 16):
+    # A LIN file as fixed-size blocks with the line breaks removed, so a file that is one long line is
+    # still read a block at a time
+    for block in iter(lambda: f.read(size), ''):
+        yield block.replace('\r', '').replace('\n', '')
+
+
+def lin_fields(lines):
+    # Key/value pairs of a LIN stream; lines are joined, so values may wrap across lines
+    pending = ''
+    for line in lines:
+        fields = (pending + line.rstrip('\r\n')).split('|')
+        # The last field is unterminated, and a key waits for its value
+        complete = (len(fields) - 1) // 2 * 2
+        for i in range(0, complete, 2):
+            yield fields[i].strip().lower(), fields[i + 1]
+        pending = '|'.join(fields[complete:])
+
+
+def iter_lin(lines, strict=True, rejected=None):
+    board = {}
+
+    def flush():
+        number = board.get('board')
+
+        def build():
+            dealer, hands = lin_hands(board['md'])
+            default_dealer, default_vulnerable = board_defaults(number)
+            vulnerable = VULNERABLE.get(board.get('sv', '').strip().lower(), default_vulnerable)
+            auction = []
+            for text in board['mb']:
+                call = parse_call(text.strip())
+                if call is None:
+                    raise RecordError(f"bad call {text!r}")
+                auction.append(call)
+            play = []
+            for text in board['pc']:
+                card = parse_card(text)
+                if card is None:
+                    raise RecordError(f"bad card {text!r}")
+                play.append(card)
+            claim = board.get('mc', '').strip()
+            return make_record(number, dealer, vulnerable, hands, auction, play, int(claim) if claim.isdigit() else None)
+
+        return _emit(build, number, strict, rejected)
+
+    for key, value in lin_fields(lines):
+        if key in ('qx', 'pn', 'md') and 'md' in board:
+            record = flush()
+            board = {}
+            if record is not None:
+                yield record
+        if key == 'qx' or key == 'ah':
+            number = LIN_BOARD.search(value)
+            if number:
+                board['board'] = int(number.group(1))
+        elif key == 'md':
+            board['md'] = value
+            board['mb'], board['pc'] = [], []
+        elif key in ('mb', 'pc') and 'md' in board:
+            board[key].append(value)
+        elif key in ('sv', 'mc'):
+            board[key] = value
+    if 'md' in board:
+        record = flush()
+        if record is not None:
+            yield record
+
+
+# Files and chunks
+
+FORMATS = {'pbn': iter_pbn, 'lin': iter_lin}
+
+
+def file_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    extension = name.rsplit('.', 1)[-1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"unknown record format {path!r}, expected .pbn or .lin")
+    return extension
+
+
+def open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, encoding='utf-8', errors='replace')
+
+
+def iter_records(path, strict=True, rejected=None):
+    # Boards of a .pbn or .lin file (optionally .gz), streamed
+    with open_text(path) as f:
+        if file_format(path) == 'pbn':
+            yield from iter_pbn(f, strict, rejected)
+        else:
+            yield from iter_lin(lin_blocks(f), strict, rejected)
+
+
+def iter_chunks(path, chunk_boards=1000):
+    # -> (lines, inherited PBN tags) with about chunk_boards boards each, split on board boundaries
+    if file_format(path) == 'lin':
+        yield from _lin_chunks(path, chunk_boards)
+        return
+    tags, inherited = {}, {}
+    lines, boards = [], 0
+    with open_text(path) as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped.startswith('['):
+                match = PBN_TAG.match(stripped)
+                if match and match.group(2) != '#':
+                    tags[match.group(1)] = match.group(2)
+            if not stripped and lines and lines[-1].strip():
+                boards += 1
+                if boards >= chunk_boards:
+                    lines.append(line)
+                    yield lines, inherited
+                    lines, boards = [], 0
+                    inherited = dict(tags)
+                    continue
+            lines.append(line)
+    if lines:
+        yield lines, inherited
+
+
+def _lin_chunks(path, chunk_boards):
+    # LIN boards often share one line, so the stream is cut between fields, where iter_lin ends a board:
+    # a qx, pn or md after the board's md. Each chunk is a list of 'key|value|' strings
+    fields, boards, dealt = [], 0, False
+    with open_text(path) as f:
+        for key, value in lin_fields(lin_blocks(f)):
+            if key in ('qx', 'pn', 'md') and dealt:
+                boards += 1
+                dealt = False
+                if boards >= chunk_boards:
+                    yield fields, {}
+                    fields, boards = [], 0
+            dealt = dealt or key == 'md'
+            fields.append(f"{key}|{value}|")
+    if fields:
+        yield fields, {}
+
+
+_chunk_function = None
+
+
+def _init_worker(function):
+    global _chunk_function
+    _chunk_function = function
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(1)
+
+
+def _parse_chunk(fmt, lines, inherited, strict):
+    rejected = []
+    if fmt == 'pbn':
+        records = list(iter_pbn(lines, strict, rejected, inherited))
+    else:
+        records = list(iter_lin(lines, strict, rejected))
+    return records, rejected
+
+
+def _run_chunk(fmt, lines, inherited, strict):
+    records, rejected = _parse_chunk(fmt, lines, inherited, strict)
+    return _chunk_function(records), rejected
+
+
+def map_chunks(path, function=list, workers=1, chunk_boards=1000, strict=False, rejected=None):
+    # Yields function(boards of a chunk) per chunk in file order; function must be a picklable top-level
+    # function when workers > 1. Invalid boards go to rejected when it is a list
+    fmt = file_format(path)
+    if workers <= 1:
+        for lines, inherited in iter_chunks(path, chunk_boards):
+            records, chunk_rejected = _parse_chunk(fmt, lines, inherited, strict)
+            if rejected is not None:
+                rejected.extend(chunk_rejected)
+            yield function(records)
+        return
+    pool = multiprocessing.get_context('spawn').Pool(workers, _init_worker, (function,))
+    try:
+        pending = deque()
+        for lines, inherited in iter_chunks(path, chunk_boards):
+            pending.append(pool.apply_async(_run_chunk, (fmt, lines, inherited, strict)))
+            # Bounded read-ahead: the reader waits for the oldest chunk before queueing more
+            while len(pending) >= 2 * workers:
+                yield _collect(pending.popleft(), rejected)
+        while pending:
+            yield _collect(pending.popleft(), rejected)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _collect(result, rejected):
+    value, chunk_rejected = result.get()
+    if rejected is not None:
+        rejected.extend(chunk_rejected)
+    return value
+
+
+def records_hands(records):
+    # Boards -> (N, 4) uint64 hands, the DealArchive layout
+    import numpy as np
+    return np.array([record.hands for record in records], dtype=np.uint64).reshape(-1, 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate PBN/LIN boards and optionally archive the deals")
+    parser.add_argument('paths', nargs='+', help=".pbn or .lin files, optionally gzipped")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--chunk-boards', type=int, default=1000)
+    parser.add_argument('--archive', help="deal archive (game/deals.py) to append the deals to")
+    parser.add_argument('--show-rejected', type=int, default=10, help="number of rejected boards to print")
+    args = parser.parse_args()
+
+    from .deals import append_hands
+    boards, rejected = 0, []
+    for path in args.paths:
+        for hands in map_chunks(path, records_hands, args.workers, args.chunk_boards, rejected=rejected):
+            boards += len(hands)
+            if args.archive and len(hands):
+                append_hands(args.archive, hands)
+    print(f"boards: {boards}")
+    print(f"rejected: {len(rejected)}")
+    for board, reason in rejected[:args.show_rejected]:
+        print(f"  board {board}: {reason}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import numpy as np
+
+from .bids import NUM_BIDS, bid_level, bid_strain
+
+'''
+Duplicate contract scoring. contract is a bid ordinal 0..34 (see bids.py), doubled 0/1/2 for
+undoubled/doubled/redoubled, tricks are the declarer side's tricks. Scores are from the declarer's side.
+
+SCORE_TABLE precomputes every case so batches are scored with one gather (score_batch).
+'''
+
+
+def trick_points(strain, level):
+    # Contract trick points undoubled: minors 20, majors 30, no trump 40 for the first trick and 30 after
+    if strain == 4:
+        return 40 + 30 * (level - 1)
+    return (20 if strain < 2 else 30) * level
+
+
+def undertrick_penalty(down, doubled, vulnerable):
+    if doubled == 0:
+        return down * (100 if vulnerable else 50)
+    if vulnerable:
+        penalty = 200 + 300 * (down - 1)
+    else:
+        penalty = 100 + 200 * min(down - 1, 2) + 300 * max(down - 3, 0)
+    return penalty * doubled
+
+
+def contract_score(contract, doubled, vulnerable, tricks):
+    level, strain = bid_level(contract), bid_strain(contract)
+    needed = level + 6
+    if tricks < needed:
+        return -undertrick_penalty(needed - tricks, doubled, vulnerable)
+
+    points = trick_points(strain, level) * (1, 2, 4)[doubled]
+    score = points + (500 if vulnerable else 300) if points >= 100 else points + 50
+    if level == 6:
+        score += 750 if vulnerable else 500
+    elif level == 7:
+        score += 1500 if vulnerable else 1000
+    score += 50 * doubled
+
+    overtricks = tricks - needed
+    if doubled == 0:
+        score += overtricks * (20 if strain < 2 else 30)
+    else:
+        score += overtricks * (200 if vulnerable else 100) * doubled
+    return score
+
+
+def _score_table():
+    # table[contract, doubled, vulnerable, tricks]; the extra last row is for passed out deals (contract -1)
+    table = np.zeros((NUM_BIDS + 1, 3, 2, 14), dtype=np.int32)
+    for contract in range(NUM_BIDS):
+        for doubled in range(3):
+            for vulnerable in range(2):
+                for tricks in range(14):
+                    table[contract, doubled, vulnerable, tricks] = contract_score(contract, doubled, vulnerable, tricks)
+    table.flags.writeable = False
+    return table
+
+
+SCORE_TABLE = _score_table()
+IMP_BOUNDS = np.array([20, 50, 90, 130, 170, 220, 270, 320, 370, 430, 500, 600, 750, 900, 1100, 1300, 1500, 1750,
+                       2000, 2250, 2500, 3000, 3500, 4000])
+
+
+def score_batch(contracts, doubled, vulnerable, tricks):
+    # Declarer side scores of N deals with one gather, all arguments broadcast; contract -1 scores 0
+    return SCORE_TABLE[contracts, doubled, np.asarray(vulnerable, dtype=np.int8), tricks]
+
+
+def imps(difference):
+    # Point differences -> IMPs, elementwise
+    difference = np.asarray(difference)
+    return np.sign(difference) * np.searchsorted(IMP_BOUNDS, np.abs(difference), side='right')
+
+
+def matchpoints(scores):
+    # scores (boards, tables) for one direction -> matchpoints, 2 per table beaten and 1 per tie
+    scores = np.asarray(scores)
+    compared = scores[..., :, None] - scores[..., None, :]
+    return 2 * (compared > 0).sum(axis=-1) + (compared == 0).sum(axis=-1) - 1
+
+
+def matchpoint_percentages(scores):
+    tables = np.shape(scores)[-1]
+    return matchpoints(scores) / (2 * (tables - 1))
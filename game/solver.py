@@ -0,0 +1,349 @@
+import warnings
+from multiprocessing import Pool
+
+from .bitboard import SUIT_MASKS, trick_winner
+
+try:
+    from endplay import dds
+    from endplay.types import Deal
+except ImportError:
+    dds = None
+
+'''
+Double-dummy solver over bitboard hands (see bitboard.py).
+
+hands   - four 52-bit masks indexed by seat, seats 0 and 2 are north-south
+strain  - 0..3 suit index (C, D, H, S), 4 for no trump, same order as BID_SUITS
+results - solve_deal returns table[declarer][strain] = tricks taken by the declarer's side
+
+solve_deal, solve_deals and solve_contract use the DDS library (Haglund's C++ solver, through the
+optional endplay package, pip install endplay) when it is installed: all 20 results of a full deal in a
+fraction of a second, solve_deals runs DDS's own threads over batches of tables. Without it they fall
+back to DoubleDummySolver, the pure Python search below, which takes many minutes per full deal and is
+meant for endings and for checking; a full deal solved that way issues a RuntimeWarning.
+'''
+
+NO_TRUMP = 4
+STRAINS = ['C', 'D', 'H', 'S', 'NT']
+
+
+def _squeeze_table(bits):
+    # _squeeze_table(n)[live][x] packs the bits of x selected by live into the low bits
+    table = []
+    for live in range(1 << bits):
+        positions = [i for i in range(bits) if live >> i & 1]
+        row = []
+        for x in range(1 << bits):
+            row.append(sum(1 << j for j, i in enumerate(positions) if x >> i & 1))
+        table.append(row)
+    return table
+
+
+SQUEEZE_LOW = _squeeze_table(6)
+SQUEEZE_HIGH = _squeeze_table(7)
+
+
+def relative_key(hands, leader):
+    # Same key for positions that differ only in cards already played, since only relative ranks matter
+    h0, h1, h2, h3 = hands
+    live = h0 | h1 | h2 | h3
+    key = [leader]
+    for shift in (0, 13, 26, 39):
+        suit_live = live >> shift & 0x1FFF
+        low_live = suit_live & 63
+        high_live = suit_live >> 6
+        low = SQUEEZE_LOW[low_live]
+        high = SQUEEZE_HIGH[high_live]
+        width = low_live.bit_count()
+        for hand in (h0, h1, h2):
+            suit = hand >> shift
+            key.append(low[suit & 63] | high[suit >> 6 & 127] << width)
+        key.append(suit_live.bit_count())
+    return tuple(key)
+
+
+class DoubleDummySolver:
+    def __init__(self):
+        self.trump = None
+        self.table = {}  # relative_key at trick start -> (lower, upper, best lead) with bounds on NS tricks
+        self.nodes = 0
+
+    def set_strain(self, strain):
+        trump = None if strain == NO_TRUMP else strain
+        if trump != self.trump or not self.table:
+            self.trump = trump
+            self.table = {}
+
+    def solve(self, hands, strain, declarer):
+        self.set_strain(strain)
+        leader = (declarer + 1) % 4
+        ns_tricks = self.max_tricks(hands, leader)
+        return ns_tricks if declarer % 2 == 0 else hands[leader].bit_count() - ns_tricks
+
+    def solve_deal(self, hands):
+        # All 20 declarer/strain combinations; the table is shared between the four leads of a strain
+        table = [[0] * 5 for _ in range(4)]
+        for strain in range(5):
+            self.table = {}
+            for declarer in range(4):
+                table[declarer][strain] = self.solve(hands, strain, declarer)
+        return table
+
+    def max_tricks(self, hands, leader):
+        # Maximum tricks north-south can take from a trick boundary with leader on lead
+        hands = [int(hand) for hand in hands]
+        lower, upper = 0, hands[leader].bit_count()
+        while lower < upper:
+            target = (lower + upper + 1) // 2
+            if self._trick_start(hands, leader, target):
+                lower = target
+            else:
+                upper = target - 1
+        return lower
+
+    def _trick_start(self, hands, leader, target):
+        # Can north-south take at least target of the remaining tricks?
+        remaining = hands[leader].bit_count()
+        if target <= 0:
+            return True
+        if target > remaining:
+            return False
+
+        key = relative_key(hands, leader)
+        entry = self.table.get(key)
+        if entry is None:
+            lower, upper, best = 0, remaining, None
+        else:
+            lower, upper, best = entry
+            if lower >= target:
+                return True
+            if upper < target:
+                return False
+
+        quick = self._quick_tricks(hands, leader)
+        if leader % 2 == 0:
+            lower = max(lower, quick)
+        else:
+            upper = min(upper, remaining - quick)
+        if self.trump is not None:
+            lower = max(lower, self._sure_trump_tricks(hands, 0))
+            upper = min(upper, remaining - self._sure_trump_tricks(hands, 1))
+
+        if lower >= target:
+            result = True
+        elif upper < target:
+            result = False
+        else:
+            result, best = self._play(hands, leader, [], target, best)
+            if result:
+                lower = target
+            else:
+                upper = target - 1
+        self.table[key] = (lower, upper, best)
+        return result
+
+    def _play(self, hands, leader, trick, target, first=None):
+        # Returns the result and the card that decided it (None when every move was tried)
+        self.nodes += 1
+        seat = (leader + len(trick)) % 4
+        hand = hands[seat]
+        legal = hand
+        if trick:
+            legal = hand & SUIT_MASKS[trick[0] // 13] or hand
+
+        moves = self._moves(hands, seat, legal, trick)
+        if first is not None and first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+
+        maximizing = seat % 2 == 0
+        for card in moves:
+            bit = 1 << card
+            hands[seat] ^= bit
+            trick.append(card)
+            if len(trick) == 4:
+                winner = (leader + trick_winner(trick, self.trump)) % 4
+                result = self._trick_start(hands, winner, target - (winner % 2 == 0))
+            else:
+                result = self._play(hands, leader, trick, target)[0]
+            trick.pop()
+            hands[seat] ^= bit
+            if result == maximizing:
+                return result, card
+        return not maximizing, None
+
+    def _moves(self, hands, seat, legal, trick):
+        live = hands[0] | hands[1] | hands[2] | hands[3]
+        for card in trick:
+            live |= 1 << card
+        others = live & ~hands[seat]
+
+        # Equivalent cards: touching cards once the other players' holdings are taken into account
+        moves = []
+        for suit in range(4):
+            cards = legal & SUIT_MASKS[suit]
+            previous = None
+            while cards:
+                card = cards.bit_length() - 1
+                cards ^= 1 << card
+                if previous is not None and not others & ((1 << previous) - (1 << (card + 1))):
+                    moves[-1] = card
+                else:
+                    moves.append(card)
+                previous = card
+
+        if len(moves) < 2:
+            return moves
+
+        trump = self.trump
+        if not trick:
+            # Lead winners first, then from the longest suit
+            def score(card):
+                suit = card // 13
+                above = others & SUIT_MASKS[suit] & ~((1 << (card + 1)) - 1)
+                return (above == 0, (legal & SUIT_MASKS[suit]).bit_count(), -card)
+            return sorted(moves, key=score, reverse=True)
+
+        best_position = trick_winner(trick, trump)
+        best = trick[best_position]
+        partner_winning = (len(trick) - best_position) == 2
+
+        def beats(card):
+            if card // 13 == best // 13:
+                return card > best
+            return card // 13 == trump
+
+        if partner_winning:
+            # Play low, keep trumps
+            return sorted(moves, key=lambda card: (card // 13 == trump, card % 13))
+        if len(trick) == 1 and best // 13 != trump:
+            # Second hand low, ruff when void
+            return sorted(moves, key=lambda card: (card // 13 != trump, card % 13))
+        # Cheapest winning card first, otherwise play low
+        return sorted(moves, key=lambda card: (not beats(card), card // 13 == trump and not beats(card), card % 13))
+
+    def _quick_tricks(self, hands, leader):
+        # Tricks the side on lead can cash from the top before the opponents get in
+        hand = hands[leader]
+        partner = hands[(leader + 2) % 4]
+        lho = hands[(leader + 1) % 4]
+        rho = hands[(leader + 3) % 4]
+        opponents = lho | rho
+        trump = self.trump
+
+        ruffers = []
+        if trump is not None:
+            ruffers = [opponent for opponent in (lho, rho) if opponent & SUIT_MASKS[trump]]
+
+        if ruffers:
+            # Opponents may unguard other side suits while we cash, so count trumps and one side suit
+            total = 0
+            best_side_suit = 0
+            for suit in range(4):
+                mine = hand & SUIT_MASKS[suit]
+                winners = (mine >> ((partner | opponents) & SUIT_MASKS[suit]).bit_length()).bit_count()
+                if suit == trump:
+                    total += winners
+                    continue
+                for opponent in ruffers:
+                    winners = min(winners, (opponent & SUIT_MASKS[suit]).bit_count())
+                best_side_suit = max(best_side_suit, winners)
+            return min(total + best_side_suit, hand.bit_count())
+
+        # No ruffs possible: cash our own winners, then cross once to partner's winners
+        own = 0
+        rest = hand
+        cashed = []
+        for suit in range(4):
+            mine = hand & SUIT_MASKS[suit]
+            above = ((partner | opponents) & SUIT_MASKS[suit]).bit_length()
+            cashed.append((mine >> above).bit_count())
+            own += cashed[suit]
+            rest &= ~((mine >> above) << above)
+
+        partner_winners = 0
+        crossing = False
+        for suit in range(4):
+            # Partner follows low to our winners and keeps their top cards
+            theirs = partner & SUIT_MASKS[suit]
+            winners = (theirs >> ((rest | opponents) & SUIT_MASKS[suit]).bit_length()).bit_count()
+            winners = max(0, min(winners, theirs.bit_count() - cashed[suit]))
+            partner_winners += winners
+            if winners and rest & SUIT_MASKS[suit]:
+                crossing = True
+
+        if crossing:
+            own += min(partner_winners, partner.bit_count() - own)
+        return min(own, hand.bit_count())
+
+    def _sure_trump_tricks(self, hands, side):
+        # Each trump above all the opponents' trumps wins the trick it is played to
+        trumps = SUIT_MASKS[self.trump]
+        above = ((hands[1 - side] | hands[3 - side]) & trumps).bit_length()
+        return max(((hands[side] & trumps) >> above).bit_count(), ((hands[side + 2] & trumps) >> above).bit_count())
+
+
+# DDS computes at most this many tables per call
+DDS_TABLES = 32
+PBN_RANKS = '23456789TJQKA'
+
+
+def pbn_deal(hands):
+    # 'N:spades.hearts.diamonds.clubs ...' with the ranks high to low
+    def holding(hand, suit):
+        return ''.join(PBN_RANKS[rank] for rank in range(12, -1, -1) if hand >> (suit * 13 + rank) & 1)
+    return 'N:' + ' '.join('.'.join(holding(hand, suit) for suit in (3, 2, 1, 0)) for hand in hands)
+
+
+def dds_tables(deals):
+    # DDS result rows are strains S, H, D, C, NT and columns the declarers N, E, S, W, counted as if the
+    # tricks already played had gone to the declarer
+    tables = []
+    for start in range(0, len(deals), DDS_TABLES):
+        chunk = deals[start:start + DDS_TABLES]
+        results = dds.calc_all_tables([Deal.from_pbn(pbn_deal(hands)) for hands in chunk])
+        for hands, result in zip(chunk, results):
+            rows = result.to_list()
+            played = 13 - hands[0].bit_count()
+            tables.append([[rows[3 - strain if strain < 4 else 4][declarer] - played for strain in range(5)]
+                           for declarer in range(4)])
+    return tables
+
+
+def _warn_python_search(hands):
+    if hands[0].bit_count() == 13:
+        warnings.warn("endplay is not installed, full deals are solved by the pure Python search, which takes "
+                      "many minutes per deal (pip install endplay)", RuntimeWarning, stacklevel=3)
+
+
+def solve_deal(hands):
+    hands = [int(hand) for hand in hands]
+    if dds is not None:
+        return dds_tables([hands])[0]
+    _warn_python_search(hands)
+    return _python_deal(hands)
+
+
+def _python_deal(hands):
+    return DoubleDummySolver().solve_deal(hands)
+
+
+def solve_contract(hands, strain, declarer):
+    # Tricks for the declarer's side in one strain
+    hands = [int(hand) for hand in hands]
+    if dds is not None:
+        return dds_tables([hands])[0][declarer][strain]
+    _warn_python_search(hands)
+    return DoubleDummySolver().solve(hands, strain, declarer)
+
+
+def solve_deals(deals, processes=None):
+    # deals - iterable of four-mask hands; returns one 4x5 table per deal. processes sizes the pool of the
+    # Python fallback, DDS picks its own thread count
+    deals = [[int(hand) for hand in hands] for hands in deals]
+    if dds is not None:
+        return dds_tables(deals)
+    if deals:
+        _warn_python_search(deals[0])
+    with Pool(processes) as pool:
+        return pool.map(_python_deal, deals, chunksize=4)
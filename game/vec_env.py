@@ -0,0 +1,227 @@
+import numpy as np
+
+from .bids import BID_NAMES, DOUBLE, NUM_BIDS, PASS, REDOUBLE, can_double, can_redouble, legal_bid_masks
+from .bitboard import SUIT_MASKS
+from .deals import card_bits, deal_hands
+from .scoring import score_batch
+
+'''
+N deals kept as NumPy arrays and advanced in lockstep, same rules as game_local.GameLogic.
+
+bid actions  - bid ordinals 0..37 (see bids.py)
+card actions - card index 0..51 (see bitboard.py)
+seats        - 0..3 (Player 1..4), team 0 is seats 0 and 2, team 1 is seats 1 and 3
+trump        - 0..3 suit index, -1 for no trump
+'''
+
+MAX_AUCTION_LENGTH = 320  # 3 passes, then every bid doubled and redoubled with passes in between
+
+BIDDING = 0
+PLAYING = 1
+
+ONE = np.uint64(1)
+SUIT_MASKS_U64 = np.array(SUIT_MASKS, dtype=np.uint64)
+CARD_BITS = ONE << np.arange(52, dtype=np.uint64)
+
+
+def follow_suit(hands, lead):
+    # uint64 masks of the cards each hand may play; lead is the suit led, -1 where the hand is on lead
+    in_suit = hands & SUIT_MASKS_U64[np.maximum(lead, 0)]
+    return np.where((lead >= 0) & (in_suit != 0), in_suit, hands)
+
+
+class VecBridgeEnv:
+    def __init__(self, num_envs, seed=None, dealer=0, deals=None):
+        self.num_envs = num_envs
+        self.dealer = dealer
+        self.rng = np.random.default_rng(seed)
+        self.deals = deals  # optional DealArchive to draw deals from instead of dealing
+
+        self.hands = np.zeros((num_envs, 4), dtype=np.uint64)
+        self.phase = np.zeros(num_envs, dtype=np.int8)
+        self.seat = np.zeros(num_envs, dtype=np.int8)
+
+        # Auction state
+        self.auction = np.full((num_envs, MAX_AUCTION_LENGTH), -1, dtype=np.int8)
+        self.auction_length = np.zeros(num_envs, dtype=np.int16)
+        self.highest_bid = np.full(num_envs, -1, dtype=np.int8)
+        self.declarer = np.full(num_envs, -1, dtype=np.int8)
+        self.doubled = np.zeros(num_envs, dtype=np.int8)
+        self.passes = np.zeros(num_envs, dtype=np.int8)
+
+        # Play state
+        self.trump = np.full(num_envs, -1, dtype=np.int8)
+        self.trick = np.full((num_envs, 4), -1, dtype=np.int8)  # cards in play order from the leader
+        self.trick_size = np.zeros(num_envs, dtype=np.int8)
+        self.leader = np.zeros(num_envs, dtype=np.int8)
+        self.tricks_played = np.zeros(num_envs, dtype=np.int8)
+        self.tricks_won = np.zeros((num_envs, 2), dtype=np.int8)
+
+        # Outcome of deals that finished in the last step (valid where done)
+        self.final_contract = np.full(num_envs, -1, dtype=np.int8)
+        self.final_declarer = np.full(num_envs, -1, dtype=np.int8)
+        self.final_doubled = np.zeros(num_envs, dtype=np.int8)
+        self.final_declarer_tricks = np.zeros(num_envs, dtype=np.int8)
+
+        self.reset()
+
+    def reset(self, hands=None):
+        self.reset_deals(np.arange(self.num_envs), hands)
+
+    def reset_deals(self, idx, hands=None):
+        if hands is None:
+            hands = deal_hands(self.rng, len(idx)) if self.deals is None else self.deals.next_hands(len(idx))
+        self.hands[idx] = hands
+        self.phase[idx] = BIDDING
+        self.seat[idx] = self.dealer
+        self.auction[idx] = -1
+        self.auction_length[idx] = 0
+        self.highest_bid[idx] = -1
+        self.declarer[idx] = -1
+        self.doubled[idx] = 0
+        self.passes[idx] = 0
+        self.trump[idx] = -1
+        self.trick[idx] = -1
+        self.trick_size[idx] = 0
+        self.leader[idx] = 0
+        self.tricks_played[idx] = 0
+        self.tricks_won[idx] = 0
+
+    def current_hands(self):
+        return self.hands[np.arange(self.num_envs), self.seat]
+
+    def leading_suit(self):
+        # -1 where the seat to move is on lead
+        return np.where(self.trick_size > 0, self.trick[:, 0] // 13, -1)
+
+    def legal_cards(self):
+        return follow_suit(self.current_hands(), self.leading_suit())
+
+    def can_double(self):
+        return can_double(self.highest_bid, self.doubled, self.passes)
+
+    def can_redouble(self):
+        return can_redouble(self.doubled, self.passes)
+
+    def legal_bid_mask(self):
+        # (N, 38) bool, meaningful for deals in the bidding phase
+        return legal_bid_masks(self.highest_bid, self.doubled, self.passes)
+
+    def legal_play_mask(self):
+        # (N, 52) bool, meaningful for deals in the playing phase
+        return card_bits(self.legal_cards()).astype(bool)
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        done = np.zeros(self.num_envs, dtype=bool)
+
+        bidding = np.flatnonzero(self.phase == BIDDING)
+        if len(bidding):
+            self._step_bidding(bidding, actions[bidding], done)
+
+        playing = np.flatnonzero(self.phase == PLAYING)
+        playing = playing[~np.isin(playing, bidding)]
+        if len(playing):
+            self._step_playing(playing, actions[playing], done)
+
+        finished = np.flatnonzero(done)
+        if len(finished):
+            self.reset_deals(finished)
+        return done
+
+    def _step_bidding(self, idx, bids, done):
+        is_pass = bids == PASS
+        is_bid = (bids >= 0) & (bids < NUM_BIDS)
+        is_double = bids == DOUBLE
+        is_redouble = bids == REDOUBLE
+        valid = is_pass | (is_bid & (bids > self.highest_bid[idx])) | (is_double & self.can_double()[idx]) | \
+            (is_redouble & self.can_redouble()[idx])
+        if not valid.all():
+            bad = idx[~valid][0]
+            raise ValueError(f"Invalid bid {action_name(bids[~valid][0])} in deal {bad}")
+
+        self.auction[idx, self.auction_length[idx]] = bids
+        self.auction_length[idx] += 1
+
+        placed = idx[is_bid]
+        self.highest_bid[placed] = bids[is_bid]
+        self.declarer[placed] = self.seat[placed]
+        self.doubled[placed] = 0
+        self.doubled[idx[is_double]] = 1
+        self.doubled[idx[is_redouble]] = 2
+        self.passes[idx[~is_pass]] = 0
+        self.passes[idx[is_pass]] += 1
+
+        over = (self.auction_length[idx] >= 4) & (self.passes[idx] >= 3)
+        passed_out = idx[over & (self.highest_bid[idx] < 0)]
+        contract = idx[over & (self.highest_bid[idx] >= 0)]
+        still_bidding = idx[~over]
+
+        self.seat[still_bidding] = (self.seat[still_bidding] + 1) % 4
+
+        self._finish(passed_out, done)
+
+        strain = self.highest_bid[contract] % 5
+        self.trump[contract] = np.where(strain == 4, -1, strain)
+        self.leader[contract] = (self.declarer[contract] + 1) % 4
+        self.seat[contract] = self.leader[contract]
+        self.phase[contract] = PLAYING
+
+    def _step_playing(self, idx, cards, done):
+        seat = self.seat[idx]
+        hand = self.hands[idx, seat]
+        size = self.trick_size[idx]
+        lead = np.where(size > 0, self.trick[idx, 0] // 13, -1)
+
+        in_range = (cards >= 0) & (cards < 52)
+        bit = CARD_BITS[np.where(in_range, cards, 0)]
+        held = in_range & ((hand & bit) != 0)
+        void = (hand & SUIT_MASKS_U64[np.maximum(lead, 0)]) == 0
+        valid = held & ((lead < 0) | (cards // 13 == lead) | void)
+        if not valid.all():
+            bad = idx[~valid][0]
+            raise ValueError(f"Invalid card {cards[~valid][0]} in deal {bad}")
+
+        self.hands[idx, seat] = hand & ~bit
+        self.trick[idx, size] = cards
+        self.trick_size[idx] = size + 1
+        self.seat[idx] = (seat + 1) % 4
+
+        complete = idx[self.trick_size[idx] == 4]
+        if not len(complete):
+            return
+
+        trick = self.trick[complete].astype(np.int16)
+        suits = trick // 13
+        trump = self.trump[complete, None]
+        lead = suits[:, :1]
+        key = np.where(suits == trump, 200 + trick, np.where(suits == lead, 100 + trick, 0))
+        winner = (self.leader[complete] + key.argmax(axis=1)) % 4
+
+        self.tricks_won[complete, winner % 2] += 1
+        self.tricks_played[complete] += 1
+        self.leader[complete] = winner
+        self.seat[complete] = winner
+        self.trick[complete] = -1
+        self.trick_size[complete] = 0
+
+        self._finish(complete[self.tricks_played[complete] == 13], done)
+
+    def _finish(self, idx, done):
+        if not len(idx):
+            return
+        declarer = self.declarer[idx]
+        self.final_contract[idx] = self.highest_bid[idx]
+        self.final_declarer[idx] = declarer
+        self.final_doubled[idx] = self.doubled[idx]
+        self.final_declarer_tricks[idx] = np.where(declarer >= 0, self.tricks_won[idx, declarer % 2], 0)
+        done[idx] = True
+
+    def final_scores(self, vulnerable=False):
+        # Duplicate scores of the last finished deal in each env for the declarer's side, 0 when passed out;
+        # vulnerable is a bool or an (N,) array for the declaring side
+        return score_batch(self.final_contract, self.final_doubled, vulnerable, self.final_declarer_tricks)
+
+
+def action_name(action):
+    return BID_NAMES[action] if 0 <= action < len(BID_NAMES) else str(action)
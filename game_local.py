@@ -1,4 +1,11 @@
-import random
+from game.bids import (BID_NAMES, BID_ORDINAL, DOUBLE, NO_LEGAL_BIDS, NUM_BIDS, PASS, REDOUBLE, can_double, can_redouble,
+                       legal_bid_mask)
+from game.bitboard import SUIT_INDEX, SUIT_MASKS, has_card, legal_cards, parse_card, trick_winner
+from game.card import CARDS, Card
+from game.deals import card_bits
+from game.deck import Deck
+from game.player import Player
+from game.scoring import contract_score
 
 '''
 quarterback - one player that won bidding and will play the hand
@@ -14,54 +21,40 @@ BID_SUITS = ['C', 'D', 'H', 'S', 'NT']  # Club, Diamond, Heart, Spade, No Trump
 
 VALID_BIDS = [f"{rank}{suit}" for rank in range(1, 8) for suit in BID_SUITS]
 
-class Card:
-    def __init__(self, suit, rank):
-        self.suit = suit
-        self.rank = rank
-
-    def __repr__(self):
-        return f"{self.rank}{self.suit}"
-
-class Deck:
-    def __init__(self):
-        self.cards = [Card(suit, rank) for suit in SUITS for rank in RANKS]
-        random.shuffle(self.cards)
-
-    def deal(self):
-        return self.cards.pop()
-
-class Player:
-    def __init__(self, name):
-        self.name = name
-        self.hand = []
-
-    def receive_card(self, card):
-        self.hand.append(card)
-
-    def play_card(self, card):
-        self.hand.remove(card)
-        return card
-
-    def show_hand(self):
-        return ', '.join(map(str, self.hand))
+BID_TOKEN = 0  # undo token kinds, see GameLogic.apply
+CARD_TOKEN = 1
 
 class Bidding:
     def __init__(self):
         self.bids = []
         self.passes = 0
         self.current_highest_bid = None
+        self.highest = -1  # ordinal of current_highest_bid (see game/bids.py)
+        self.doubled = 0  # 0, 1 doubled, 2 redoubled
         self.declarer = None
 
     def place_bid(self, player, bid):
         self.bids.append((player.name, bid))
         self.passes = 0
         self.current_highest_bid = bid
+        self.highest = BID_ORDINAL[bid]
+        self.doubled = 0
         self.declarer = player
 
     def pass_bid(self, player):
         self.bids.append((player.name, "Pass"))
         self.passes += 1
 
+    def double(self, player):
+        self.bids.append((player.name, "X"))
+        self.passes = 0
+        self.doubled = 1
+
+    def redouble(self, player):
+        self.bids.append((player.name, "XX"))
+        self.passes = 0
+        self.doubled = 2
+
     def is_bidding_over(self):
         return len(self.bids) >= 4 and self.passes >= 3
 
@@ -71,17 +64,23 @@ class Bidding:
         return all(bid == "Pass" for _, bid in self.bids[-4:])
 
     def is_valid_bid(self, bid):
-        if bid not in VALID_BIDS:
-            return False
-        if self.current_highest_bid is None:
-            return True
-        bid_value = self.convert_bid_to_value(bid)
-        current_highest_bid_value = self.convert_bid_to_value(self.current_highest_bid)
-        return bid_value > current_highest_bid_value
+        ordinal = BID_ORDINAL.get(bid)
+        return ordinal is not None and ordinal < NUM_BIDS and ordinal > self.highest
+
+    def can_double(self):
+        return can_double(self.highest, self.doubled, self.passes)
+
+    def can_redouble(self):
+        return can_redouble(self.doubled, self.passes)
+
+    def legal_bid_mask(self):
+        if self.is_bidding_over():
+            return NO_LEGAL_BIDS
+        return legal_bid_mask(self.highest, self.doubled, self.passes)
 
     @staticmethod
     def convert_bid_to_value(bid):
-        bid_rank, bid_suit = bid[:-1], bid[-1]
+        bid_rank, bid_suit = bid[0], bid[1:]
         bid_suit_value = BID_SUITS.index(bid_suit)
         return int(bid_rank) * 10 + bid_suit_value
 
@@ -96,20 +95,14 @@ class Trick:
         self.cards.append((player, card))
 
     def determine_winner(self, trump_suit):
-        leading_suit = self.cards[0][1].suit
-        winning_card = self.cards[0]
-        for player, card in self.cards:
-            if card.suit == trump_suit:
-                if winning_card[1].suit != trump_suit or RANKS.index(card.rank) > RANKS.index(winning_card[1].rank):
-                    winning_card = (player, card)
-            elif card.suit == leading_suit and (winning_card[1].suit != trump_suit) and RANKS.index(
-                    card.rank) > RANKS.index(winning_card[1].rank):
-                winning_card = (player, card)
-        return winning_card[0]
+        winner = trick_winner([card.index for _, card in self.cards], SUIT_INDEX.get(trump_suit))
+        return self.cards[winner][0]
 
 class GameLogic:
-    def __init__(self):
-        self.deck = Deck()
+    def __init__(self, hands=None, vulnerable=(False, False)):
+        self.deck = Deck() if hands is None else None
+        self.hands = hands  # optional four 52-bit masks, e.g. from a DealArchive, used instead of the deck
+        self.vulnerable = vulnerable  # (north-south, east-west)
         self.players = [Player(f"Player {i + 1}") for i in range(4)]
         self.bidding = Bidding()
         self.current_player_index = 0
@@ -122,9 +115,9 @@ class GameLogic:
         self.deal_cards()
 
     def deal_cards(self):
-        for _ in range(13):
-            for player in self.players:
-                player.receive_card(self.deck.deal())
+        hands = self.deck.deal_hands() if self.hands is None else self.hands
+        for player, hand in zip(self.players, hands):
+            player.mask |= int(hand)
 
     def get_current_player(self):
         return self.players[self.current_player_index]
@@ -138,6 +131,10 @@ class GameLogic:
             return False
         if bid.lower() == "pass":
             self.bidding.pass_bid(player)
+        elif bid == "X" and self.bidding.can_double():
+            self.bidding.double(player)
+        elif bid == "XX" and self.bidding.can_redouble():
+            self.bidding.redouble(player)
         elif self.bidding.is_valid_bid(bid):
             self.bidding.place_bid(player, bid)
         else:
@@ -146,24 +143,37 @@ class GameLogic:
         return True
 
     def play_card(self, player, card_str):
-        card_obj = next((c for c in player.hand if str(c) == card_str), None)
-        if not card_obj:
+        card = parse_card(card_str)
+        if card is None or not has_card(player.mask, card):
             print("Invalid card. Try again.")
             return False
 
         # Check if the player follows the lead suit if possible
         if self.tricks and self.tricks[-1].cards:
-            leading_suit = self.tricks[-1].cards[0][1].suit
-            if any(c.suit == leading_suit for c in player.hand) and card_obj.suit != leading_suit:
-                print(f"You must follow suit with {leading_suit} if you have one.")
+            leading_suit = self.tricks[-1].cards[0][1].index // 13
+            if player.mask & SUIT_MASKS[leading_suit] and card // 13 != leading_suit:
+                print(f"You must follow suit with {SUITS[leading_suit]} if you have one.")
                 return False
 
-        self.tricks[-1].play_card(player, player.play_card(card_obj))
+        self.tricks[-1].play_card(player, player.play_card(CARDS[card]))
         return True
 
+    def leading_suit(self):
+        # Suit led to the trick in progress, None when the next card leads
+        if self.tricks and 0 < len(self.tricks[-1].cards) < 4:
+            return self.tricks[-1].cards[0][1].index // 13
+        return None
+
+    def legal_cards(self, seat):
+        # 52-bit mask of the cards seat may play, following suit if possible
+        return legal_cards(self.players[seat].mask, self.leading_suit())
+
+    def legal_play_mask(self, seat):
+        return card_bits([self.legal_cards(seat)])[0].astype(bool)
+
     def set_trump_and_declarer(self):
         if self.bidding.current_highest_bid:
-            bid_suit = self.bidding.current_highest_bid[-1]
+            bid_suit = self.bidding.current_highest_bid[1:]
             self.trump_suit = None if bid_suit == 'NT' else bid_suit
             self.declarer = self.bidding.declarer
 
@@ -179,6 +189,111 @@ class GameLogic:
                 self.current_player_index = i
                 break
 
+    def complete_trick(self):
+        # Scores the finished last trick and gives the lead to its winner
+        winner = self.tricks[-1].determine_winner(self.trump_suit)
+        self.tricks_won[1 if self.players.index(winner) % 2 == 0 else 2] += 1
+        self.set_current_player_to_winner(winner)
+        return winner
+
+    # Make / unmake for search. apply takes a bid ordinal (see game/bids.py) during the auction and a card
+    # index during the play, and returns a token for undo. Undo must be called in reverse order.
+    def apply(self, action):
+        seat = self.current_player_index
+        player = self.players[seat]
+        bidding = self.bidding
+        if not bidding.is_bidding_over():
+            if not bidding.legal_bid_mask()[action]:
+                raise ValueError(f"Illegal bid {BID_NAMES[action]}")
+            token = (BID_TOKEN, seat, bidding.passes, bidding.current_highest_bid, bidding.highest, bidding.doubled,
+                     bidding.declarer, self.trump_suit, self.declarer)
+            if action == PASS:
+                bidding.pass_bid(player)
+            elif action == DOUBLE:
+                bidding.double(player)
+            elif action == REDOUBLE:
+                bidding.redouble(player)
+            else:
+                bidding.place_bid(player, BID_NAMES[action])
+            self.current_player_index = (seat + 1) % 4
+            if bidding.is_bidding_over() and bidding.declarer is not None:
+                self.set_trump_and_declarer()
+                self.set_current_player_to_next_of_declarer()
+            return token
+
+        if self.declarer is None:
+            raise ValueError("The deal was passed out")
+        started = not self.tricks or len(self.tricks[-1].cards) == 4
+        leading_suit = self.tricks[-1].cards[0][1].index // 13 if not started and self.tricks[-1].cards else None
+        if not legal_cards(player.mask, leading_suit) >> action & 1:
+            raise ValueError(f"Illegal card {CARDS[action]} for {player.name}")
+        if started:
+            self.tricks.append(Trick())
+        trick = self.tricks[-1]
+        player.mask ^= 1 << action
+        trick.cards.append((player, CARDS[action]))
+        winner = -1
+        if len(trick.cards) == 4:
+            # The fourth card is played by the seat before the leader
+            winner = (seat + 1 + trick_winner([card.index for _, card in trick.cards],
+                                              SUIT_INDEX.get(self.trump_suit))) % 4
+            self.tricks_won[1 if winner % 2 == 0 else 2] += 1
+            self.current_player_index = winner
+        else:
+            self.current_player_index = (seat + 1) % 4
+        return (CARD_TOKEN, seat, action, started, winner)
+
+    def undo(self, token):
+        if token[0] == BID_TOKEN:
+            bidding = self.bidding
+            _, seat, bidding.passes, bidding.current_highest_bid, bidding.highest, bidding.doubled, \
+                bidding.declarer, self.trump_suit, self.declarer = token
+            bidding.bids.pop()
+            self.current_player_index = seat
+            return
+        _, seat, card, started, winner = token
+        self.tricks[-1].cards.pop()
+        self.players[seat].mask |= 1 << card
+        if winner >= 0:
+            self.tricks_won[1 if winner % 2 == 0 else 2] -= 1
+        if started:
+            self.tricks.pop()
+        self.current_player_index = seat
+
+    def snapshot(self):
+        # Fixed-size copy of the mutable state. restore goes back to it as long as the game has only moved
+        # forward from it since (any branch, any number of actions)
+        bidding = self.bidding
+        return (self.players[0].mask, self.players[1].mask, self.players[2].mask, self.players[3].mask,
+                self.current_player_index, self.tricks_won[1], self.tricks_won[2], len(self.tricks),
+                len(self.tricks[-1].cards) if self.tricks else 0, len(bidding.bids), bidding.passes,
+                bidding.current_highest_bid, bidding.highest, bidding.doubled, bidding.declarer, self.trump_suit,
+                self.declarer)
+
+    def restore(self, snapshot):
+        bidding = self.bidding
+        (self.players[0].mask, self.players[1].mask, self.players[2].mask, self.players[3].mask,
+         self.current_player_index, self.tricks_won[1], self.tricks_won[2], tricks, cards, bids, bidding.passes,
+         bidding.current_highest_bid, bidding.highest, bidding.doubled, bidding.declarer, self.trump_suit,
+         self.declarer) = snapshot
+        del self.tricks[tricks:]
+        if tricks:
+            del self.tricks[-1].cards[cards:]
+        del bidding.bids[bids:]
+
+    def legal_action_mask(self):
+        # Bid ordinals during the auction, card indices during the play, for the player to act
+        if not self.bidding.is_bidding_over():
+            return self.bidding.legal_bid_mask()
+        return self.legal_play_mask(self.current_player_index)
+
+    def is_over(self):
+        if not self.bidding.is_bidding_over():
+            return False
+        if self.declarer is None:
+            return True
+        return len(self.tricks) == 13 and len(self.tricks[-1].cards) == 4
+
 def main():
     game = GameLogic()
     game.start_game()
@@ -194,7 +309,7 @@ def main():
     while not game.bidding.is_bidding_over():
         current_player = game.get_current_player()
         print(f"{current_player.name}'s turn to bid.")
-        bid = input("Enter your bid (e.g., '1C', '2D', 'Pass'): ").strip().upper()
+        bid = input("Enter your bid (e.g., '1C', '2D', 'Pass', 'X', 'XX'): ").strip().upper()
         if game.bid(current_player, bid):
             if game.bidding.is_four_consecutive_passes():
                 print("Four consecutive passes. The game ends with no contract.")
@@ -243,20 +358,16 @@ def main():
             tricks_won = sum(1 for trick in game.tricks if trick.determine_winner(game.trump_suit) == player)
             print(f"{player.name} won {tricks_won} tricks.")
 
-        if game.bidding.declarer in [game.players[0], game.players[2]]:
-            contract = int(game.bidding.current_highest_bid[0])
-            print(f"Declarer's team needed to win {contract + 6} tricks.")
-            if game.tricks_won[1] >= contract + 6:
-                print("Declarer's team fulfilled the contract!")
-            else:
-                print("Declarer's team failed to fulfill the contract.")
+        declarer_team = 1 if game.players.index(game.bidding.declarer) % 2 == 0 else 2
+        contract = int(game.bidding.current_highest_bid[0])
+        print(f"Declarer's team needed to win {contract + 6} tricks.")
+        if game.tricks_won[declarer_team] >= contract + 6:
+            print("Declarer's team fulfilled the contract!")
         else:
-            contract = int(game.bidding.current_highest_bid[0])
-            print(f"Declarer's team needed to win {contract + 6} tricks.")
-            if game.tricks_won[2] >= contract + 6:
-                print("Declarer's team fulfilled the contract!")
-            else:
-                print("Declarer's team failed to fulfill the contract.")
+            print("Declarer's team failed to fulfill the contract.")
+        score = contract_score(game.bidding.highest, game.bidding.doubled, game.vulnerable[declarer_team - 1],
+                               game.tricks_won[declarer_team])
+        print(f"Score for the declarer's team: {score}")
     else:
         print("No valid contract was made. The game ends with no contract.")
 
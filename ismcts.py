@@ -0,0 +1,258 @@
+import math
+import multiprocessing
+import random
+import time
+
+from agents import HONOUR_POINTS
+from game.bitboard import FULL_DECK, SUIT_MASKS, iter_cards
+
+'''
+Information-set MCTS for the card play (single observer, Cowling et al.).
+
+Each iteration samples the hidden hands from the observer's point of view, replays the tree on that
+determinization with GameLogic.apply and finishes with a random playout. The tree is keyed by card,
+a child is only selectable in iterations where its card is legal, and UCB uses the number of those
+iterations. Rewards are the final tricks of the side that played the card, out of 13.
+
+The observer is the player to act, or the declarer when the dummy is to act. It knows its own hand,
+the dummy once the opening lead is made, the cards played and the voids they show. A HandConstraint
+adds what the auction showed (agents.auction_ranges): suit length caps are respected while the cards
+are dealt, samples outside the point and minimum length ranges are rejected, and when no sample fits
+the ranges are widened step by step.
+
+Root parallelization: search() splits the budget over a process pool, each worker searches its own
+tree, and the root visit counts are summed.
+'''
+
+EXPLORATION = 0.7
+# High card points of every 13-bit suit holding
+SUIT_POINTS = [sum(points for rank, points in HONOUR_POINTS.items() if holding >> rank & 1)
+               for holding in range(1 << 13)]
+
+
+class Node:
+    __slots__ = ('seat', 'visits', 'value', 'available', 'children')
+
+    def __init__(self, seat):
+        self.seat = seat  # seat that played the card leading to this node
+        self.visits = 0
+        self.value = 0.0
+        self.available = 0
+        self.children = {}
+
+
+def observer_of(game, seat):
+    dummy = (game.players.index(game.declarer) + 2) % 4
+    return (dummy + 2) % 4 if seat == dummy else seat
+
+
+def played_cards(game):
+    # (seat, card) in play order
+    seats = {player.name: i for i, player in enumerate(game.players)}
+    return [(seats[player.name], card.index) for trick in game.tricks for player, card in trick.cards]
+
+
+def information_set(game, seat):
+    # Everything the observer knows: visible hands, the hidden seats with their card counts and their voids
+    observer = observer_of(game, seat)
+    declarer = game.players.index(game.declarer)
+    dummy = (declarer + 2) % 4
+    history = played_cards(game)
+    visible = {observer}
+    if history:
+        visible.add(dummy)
+    hidden = [s for s in range(4) if s not in visible]
+    unknown = FULL_DECK
+    for s in visible:
+        unknown &= ~game.players[s].mask
+    for _, card in history:
+        unknown &= ~(1 << card)
+
+    voids = {s: set() for s in hidden}
+    played = {s: 0 for s in hidden}
+    for start in range(0, len(history), 4):
+        trick = history[start:start + 4]
+        suit = trick[0][1] // 13
+        for s, card in trick:
+            if s in voids:
+                played[s] |= 1 << card
+                if card // 13 != suit:
+                    voids[s].add(suit)
+    counts = {s: game.players[s].mask.bit_count() for s in hidden}
+    return hidden, list(iter_cards(unknown)), counts, voids, played
+
+
+class HandConstraint:
+    # Ranges for the original hands of some seats (the cards they have played included), e.g. from
+    # agents.auction_ranges: {seat: ((min points, max points), [(min, max) length per suit])}. slack widens
+    # every range
+    def __init__(self, ranges, slack=0):
+        self.ranges = ranges
+        self.slack = slack
+
+    def caps(self, seat, played):
+        # Most cards of each suit the seat can still hold
+        if seat not in self.ranges:
+            return [13] * 4
+        return [max(0, high + self.slack - (played & SUIT_MASKS[suit]).bit_count())
+                for suit, (low, high) in enumerate(self.ranges[seat][1])]
+
+    def __call__(self, hands, played):
+        slack = self.slack
+        for seat, hand in hands.items():
+            if seat not in self.ranges:
+                continue
+            (low, high), lengths = self.ranges[seat]
+            hand |= played[seat]
+            points = sum(SUIT_POINTS[hand >> shift & 0x1FFF] for shift in (0, 13, 26, 39))
+            if not low - slack <= points <= high + slack:
+                return False
+            for suit, (shortest, longest) in enumerate(lengths):
+                if not shortest - slack <= (hand & SUIT_MASKS[suit]).bit_count() <= longest + slack:
+                    return False
+        return True
+
+    def relaxed(self):
+        # The next wider ranges, None once they no longer exclude any hand
+        return None if self.slack >= 37 else HandConstraint(self.ranges, 2 * self.slack or 1)
+
+
+def sample_hidden(rng, hidden, unknown, counts, voids, played, constraint=None, attempts=100):
+    # Random hands for the hidden seats with the right counts, no cards in a shown void and no more cards
+    # in a suit than the constraint allows
+    base_caps = {s: [0 if suit in voids[s] else 13 for suit in range(4)] for s in hidden}
+    if constraint is not None:
+        for s in hidden:
+            base_caps[s] = [min(a, b) for a, b in zip(base_caps[s], constraint.caps(s, played[s]))]
+    for _ in range(attempts):
+        cards = unknown[:]
+        rng.shuffle(cards)
+        # Dealing the shuffled cards in order is uniform and usually fits the caps
+        hands, start = {}, 0
+        for s in hidden:
+            hand = 0
+            for card in cards[start:start + counts[s]]:
+                hand |= 1 << card
+            hands[s] = hand
+            start += counts[s]
+        if all((hands[s] & SUIT_MASKS[suit]).bit_count() <= base_caps[s][suit] for s in hidden for suit in range(4)):
+            return hands
+        # Otherwise cards that fewer seats can take are placed first
+        cards.sort(key=lambda card: sum(base_caps[s][card // 13] > 0 for s in hidden))
+        room = dict(counts)
+        caps = {s: base_caps[s][:] for s in hidden}
+        hands = {s: 0 for s in hidden}
+        for card in cards:
+            suit = card // 13
+            eligible = [s for s in hidden if room[s] and caps[s][suit]]
+            if not eligible:
+                break
+            s = rng.choices(eligible, weights=[room[s] for s in eligible])[0]
+            hands[s] |= 1 << card
+            room[s] -= 1
+            caps[s][suit] -= 1
+        else:
+            return hands
+    raise ValueError("No deal consistent with the shown voids")
+
+
+def determinize(rng, info, constraint=None, attempts=200):
+    # A sample of the hidden hands that satisfies the constraint (a HandConstraint); after `attempts`
+    # rejections the constraint is relaxed and sampling goes on
+    while constraint is not None:
+        try:
+            for _ in range(attempts):
+                hands = sample_hidden(rng, *info, constraint=constraint)
+                if constraint(hands, info[4]):
+                    return hands
+        except ValueError:
+            pass
+        constraint = constraint.relaxed()
+    return sample_hidden(rng, *info)
+
+
+def playout(game, rng):
+    while not game.is_over():
+        seat = game.current_player_index
+        game.apply(rng.choice(list(iter_cards(game.legal_cards(seat)))))
+
+
+def run_search(game, simulations=None, time_limit=None, prior=None, constraint=None, seed=None):
+    # Searches from the position in game (restored on return), returns {card: root visits}
+    if simulations is None and time_limit is None:
+        raise ValueError("run_search needs simulations or time_limit")
+    rng = random.Random(seed)
+    seat = game.current_player_index
+    info = information_set(game, seat)
+    start = game.snapshot()
+    root = Node(None)
+    deadline = time.perf_counter() + time_limit if time_limit is not None else None
+    iterations = 0
+    try:
+        while (simulations is None or iterations < simulations) and (deadline is None or time.perf_counter() < deadline):
+            for s, hand in determinize(rng, info, constraint).items():
+                game.players[s].mask = hand
+            iterate(game, root, rng, prior)
+            game.restore(start)
+            iterations += 1
+    finally:
+        game.restore(start)
+    return {card: child.visits for card, child in root.children.items()}
+
+
+def iterate(game, root, rng, prior):
+    node = root
+    path = [root]
+    while not game.is_over():
+        seat = game.current_player_index
+        legal = list(iter_cards(game.legal_cards(seat)))
+        untried = [card for card in legal if card not in node.children]
+        if untried:
+            card = max(untried, key=lambda c: prior[c]) if prior is not None and node is root else rng.choice(untried)
+            child = node.children[card] = Node(seat)
+            game.apply(card)
+            path.append(child)
+            break
+        best_card, best_score = None, -1.0
+        for card in legal:
+            child = node.children[card]
+            child.available += 1
+            score = child.value / child.visits + EXPLORATION * math.sqrt(math.log(child.available) / child.visits)
+            if prior is not None and node is root:
+                # PUCT-style bonus from the policy network, fading with visits
+                score += prior[card] * math.sqrt(child.available) / (1 + child.visits)
+            if score > best_score:
+                best_card, best_score = card, score
+        node = node.children[best_card]
+        game.apply(best_card)
+        path.append(node)
+
+    playout(game, rng)
+    north_south = game.tricks_won[1] / 13
+    for node in path[1:]:
+        node.visits += 1
+        node.value += north_south if node.seat % 2 == 0 else 1 - north_south
+    root.visits += 1
+
+
+def _search_worker(args):
+    return run_search(*args)
+
+
+def search(game, simulations=None, time_limit=None, prior=None, constraint=None, pool=None, workers=1, seed=None):
+    # Root-parallel search, returns {card: visits summed over the workers}
+    if simulations is None and time_limit is None:
+        raise ValueError("search needs simulations or time_limit")
+    if pool is None or workers <= 1:
+        return run_search(game, simulations, time_limit, prior, constraint, seed)
+    share = None if simulations is None else -(-simulations // workers)
+    seeds = [None if seed is None else seed * workers + i for i in range(workers)]
+    visits = {}
+    for result in pool.map(_search_worker, [(game, share, time_limit, prior, constraint, s) for s in seeds]):
+        for card, count in result.items():
+            visits[card] = visits.get(card, 0) + count
+    return visits
+
+
+def make_pool(workers):
+    return multiprocessing.get_context('spawn').Pool(workers)
@@ -0,0 +1,196 @@
+import argparse
+import time
+
+import numpy as np
+
+import profiling
+from agents import AGENTS, MODEL_AGENTS, make_agent
+from game.bids import BID_NAMES, bid_level, bid_strain
+from game.bitboard import CARD_NAMES
+from game.deals import DealArchive, generate_deals
+from game_local import CARDS, GameLogic, Trick
+
+'''
+Headless match runner. Drives GameLogic with four agents (see agents.py) and no console input,
+the declarer's agent also plays the dummy. With verbose off nothing is printed per action.
+deal_steps is the deal itself as a generator, so drivers other than MatchRunner (server.py) can
+supply the actions.
+
+python match.py --deals 10000 --agents rule random rule random --seed 1
+'''
+
+
+class Observation:
+    # What the player to act sees; the full game is kept for agents that want more
+    def __init__(self, game, seat, dealer, bids, declarer, contract, doubled, dummy, trick, tricks_won):
+        self.game = game
+        self.seat = seat
+        self.hand = game.players[seat].mask
+        self.dealer = dealer
+        self.bids = bids  # (seat, ordinal) in auction order
+        self.declarer = declarer
+        self.contract = contract
+        self.doubled = doubled
+        self.trump = None if contract is None or bid_strain(contract) == 4 else bid_strain(contract)
+        self.dummy = dummy  # dummy's hand once the opening lead is made
+        self.trick = trick  # (seat, card) played to the current trick
+        self.tricks_won = tricks_won  # [north-south, east-west]
+
+
+class IllegalAction(ValueError):
+    pass
+
+
+def deal_steps(hands, dealer, vulnerable, listeners, log=print):
+    # One deal as a generator: yields ('bid' | 'card', seat to act, Observation, legal mask) and is sent the
+    # chosen action; the declarer's seat is asked for the dummy's cards. Listeners get the agent hooks
+    # (reset, observe_bid, start_play, observe_card). Returns the result dict
+    game = GameLogic(hands=hands, vulnerable=vulnerable)
+    game.start_game()
+    game.current_player_index = dealer
+    for listener in listeners:
+        listener.reset(hands, dealer, vulnerable)
+
+    bids = []
+    while not game.bidding.is_bidding_over():
+        seat = game.current_player_index
+        obs = Observation(game, seat, dealer, bids, None, None, game.bidding.doubled, None, [], [0, 0])
+        action = yield 'bid', seat, obs, game.bidding.legal_bid_mask()
+        if not game.bid(game.players[seat], BID_NAMES[action]):
+            raise IllegalAction(f"made an illegal bid {BID_NAMES[action]}")
+        log(f"{seat}: {BID_NAMES[action]}")
+        bids.append((seat, action))
+        for listener in listeners:
+            listener.observe_bid(seat, action)
+        game.next_turn()
+
+    result = {'dealer': dealer, 'auction': [action for _, action in bids], 'contract': None, 'declarer': None,
+              'doubled': 0, 'declarer_tricks': 0, 'made': False}
+    if game.bidding.declarer is None:
+        log("Passed out")
+        return result
+
+    contract = game.bidding.highest
+    game.set_trump_and_declarer()
+    game.set_current_player_to_next_of_declarer()
+    declarer = game.players.index(game.declarer)
+    dummy = (declarer + 2) % 4
+    for listener in listeners:
+        listener.start_play(declarer, contract)
+
+    tricks_won = [0, 0]
+    for _ in range(13):
+        game.tricks.append(Trick())
+        trick = []
+        for _ in range(4):
+            seat = game.current_player_index
+            shown = game.players[dummy].mask if trick or game.tricks[:-1] else None
+            obs = Observation(game, seat, dealer, bids, declarer, contract, game.bidding.doubled, shown, trick,
+                              tricks_won)
+            card = yield 'card', declarer if seat == dummy else seat, obs, game.legal_play_mask(seat)
+            player = game.players[seat]
+            if not game.legal_cards(seat) >> card & 1:
+                raise IllegalAction(f"played an illegal card {CARD_NAMES[card]}")
+            game.tricks[-1].play_card(player, player.play_card(CARDS[card]))
+            log(f"{seat}: {CARD_NAMES[card]}")
+            trick.append((seat, card))
+            for listener in listeners:
+                listener.observe_card(seat, card)
+            game.next_turn()
+        winner = game.players.index(game.complete_trick())
+        tricks_won[winner % 2] += 1
+        log(f"Trick to {winner}")
+
+    result.update(contract=contract, declarer=declarer, doubled=game.bidding.doubled,
+                  declarer_tricks=tricks_won[declarer % 2])
+    result['made'] = result['declarer_tricks'] >= bid_level(contract) + 6
+    return result
+
+
+class MatchRunner:
+    def __init__(self, agents, verbose=False):
+        self.agents = list(agents)
+        self.verbose = verbose
+        self.unique_agents = list({id(agent): agent for agent in self.agents}.values())
+
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+
+    def play_deal(self, hands, dealer=0, vulnerable=(False, False)):
+        steps = deal_steps(hands, dealer, vulnerable, self.unique_agents, self._log)
+        try:
+            kind, seat, obs, mask = next(steps)
+            while True:
+                agent = self.agents[seat]
+                action = agent.choose_bid(obs, mask) if kind == 'bid' else agent.choose_card(obs, mask)
+                try:
+                    kind, seat, obs, mask = steps.send(action)
+                except IllegalAction as error:
+                    raise ValueError(f"{type(agent).__name__} {error}") from None
+        except StopIteration as stop:
+            return stop.value
+
+    def play(self, deals, dealer=None):
+        # deals - iterable of four-mask hands; the dealer rotates with the deal number unless given
+        for i, hands in enumerate(deals):
+            yield self.play_deal([int(hand) for hand in hands], i % 4 if dealer is None else dealer)
+
+
+def summarize(results, seconds):
+    played = [result for result in results if result['contract'] is not None]
+    calls = sum(len(result['auction']) for result in results)
+    summary = {
+        'deals': len(results),
+        'seconds': seconds,
+        'deals_per_second': len(results) / seconds if seconds else float('inf'),
+        'actions_per_second': (calls + 52 * len(played)) / seconds if seconds else float('inf'),
+        'passed_out': len(results) - len(played),
+        'made': sum(result['made'] for result in played),
+        'declared_by_ns': sum(result['declarer'] % 2 == 0 for result in played),
+        'average_declarer_tricks': float(np.mean([result['declarer_tricks'] for result in played])) if played else 0.0,
+        'average_level': float(np.mean([bid_level(result['contract']) for result in played])) if played else 0.0,
+        'doubled': sum(result['doubled'] > 0 for result in played),
+    }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play bot-vs-bot deals without console input")
+    parser.add_argument('--deals', type=int, default=1000)
+    parser.add_argument('--agents', nargs='+', default=['random'], choices=list(AGENTS) + MODEL_AGENTS,
+                        help="one agent for all seats, two for north-south / east-west, or four by seat")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--archive', help="deal archive to read deals from instead of dealing them")
+    parser.add_argument('--verbose', action='store_true', help="print every bid and card")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+
+    names = args.agents * (4 // len(args.agents)) if len(args.agents) in (1, 2) else args.agents
+    if len(names) != 4:
+        parser.error("--agents takes 1, 2 or 4 names")
+    agents = {}
+    for seat, name in enumerate(names):
+        # Partners with the same agent type share one agent
+        if (name, seat % 2) not in agents:
+            agents[name, seat % 2] = make_agent(name, seed=args.seed * 4 + seat)
+    runner = MatchRunner([agents[name, seat % 2] for seat, name in enumerate(names)], verbose=args.verbose)
+
+    deals = DealArchive(args.archive)[:args.deals] if args.archive else generate_deals(args.deals, args.seed)
+    profiled = profiling.from_args(args)
+    start = time.perf_counter()
+    results = []
+    for result in runner.play(deals):
+        results.append(result)
+        profiling.step(1)
+    summary = summarize(results, time.perf_counter() - start)
+    if profiled:
+        profiling.disable()
+
+    print(f"agents: {' '.join(names)}")
+    for key, value in summary.items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import cProfile
+import sys
+import time
+import tracemalloc
+
+'''
+Hot-path instrumentation for the engine, the encoder, the models and the training loop.
+
+Nothing is wrapped until enable() is called: the hot functions listed in HOT_PATHS are then replaced on
+their class or module by timing wrappers, and disable() puts the originals back, so a disabled run
+executes exactly the uninstrumented code. Only modules already imported are patched, call enable()
+after importing what is to be profiled. Timers are inclusive (play_episode contains the model forwards
+and the encoder updates); worker processes (actor_learner.py, duplicate.py pools) are not covered.
+
+step(episodes) marks one iteration of a driving loop (a training batch, a match deal). Every
+report_every seconds it logs the window: per timer the calls, ms per call, ms per decision and share
+of the wall time, decisions per second (bids and cards played) and, with allocations=True,
+the bytes each timer left allocated (tracemalloc, which slows everything down noticeably).
+
+capture='cprofile' or 'torch' records a cProfile or torch.profiler trace from step capture_start for
+capture_steps steps and writes it to capture_out (pstats file, or a Chrome trace for torch).
+
+python -m AI train --episodes 2000 --profile-every 10 --capture cprofile --capture-start 20
+python match.py --deals 2000 --agents rule --profile
+'''
+
+# (module, attribute, timer); the attribute is a module function or Class.method
+HOT_PATHS = [
+    ('game_local', 'GameLogic.deal_cards', 'engine.deal'),
+    ('game_local', 'GameLogic.bid', 'engine.bid'),
+    ('game_local', 'Bidding.is_valid_bid', 'engine.is_valid_bid'),
+    ('game_local', 'GameLogic.play_card', 'engine.play_card'),
+    ('game_local', 'GameLogic.legal_cards', 'engine.legal_cards'),
+    ('game_local', 'Trick.play_card', 'engine.trick_card'),
+    ('game_local', 'Trick.determine_winner', 'engine.determine_winner'),
+    ('game_local', 'GameLogic.apply', 'engine.apply'),
+    ('AI.encoding', 'StateEncoder.reset', 'encode.reset'),
+    ('AI.encoding', 'StateEncoder.record_bid', 'encode.bid'),
+    ('AI.encoding', 'StateEncoder.start_play', 'encode.start_play'),
+    ('AI.encoding', 'StateEncoder.record_card', 'encode.card'),
+    ('AI.models', 'BiddingModel.forward', 'model.bidding'),
+    ('AI.models', 'PlayingModel.forward', 'model.playing'),
+    ('AI.models', 'SharedPlayingModel.forward', 'model.playing'),
+    ('AI.training', 'play_episode', 'train.episode'),
+    ('AI.training', 'update_models', 'train.update'),
+    ('AI.replay', 'ReplayMemory.add', 'train.replay_add'),
+    ('AI.replay', 'ReplayMemory.update', 'train.replay_update'),
+]
+# Timers whose calls are decisions: every bid and every card placed on a trick (GameLogic.play_card and
+# match.deal_steps both end in Trick.play_card; GameLogic.apply search moves are not counted)
+DECISION_TIMERS = ('engine.bid', 'engine.trick_card')
+
+
+class Profiler:
+    def __init__(self, report_every=10.0, allocations=False, capture=None, capture_start=10, capture_steps=5,
+                 capture_out=None, log=print):
+        self.report_every = report_every  # seconds between reports, None for reports only on demand
+        self.allocations = allocations
+        self.capture = capture
+        self.capture_start = capture_start
+        self.capture_steps = capture_steps
+        self.capture_out = capture_out or ('profile.json' if capture == 'torch' else 'profile.prof')
+        self.log = log
+        self.stats = {}  # timer -> [calls, seconds, bytes]
+        self.counters = {}
+        self.patched = []
+        self.steps = 0
+        self.capturing = None
+        self.window_start = time.perf_counter()
+
+    def stat(self, name):
+        return self.stats.setdefault(name, [0, 0.0, 0])
+
+    def wrap(self, function, name):
+        stat = self.stat(name)
+        clock = time.perf_counter
+        if self.allocations:
+            traced = tracemalloc.get_traced_memory
+
+            def wrapper(*args, **kwargs):
+                start, before = clock(), traced()[0]
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    stat[0] += 1
+                    stat[1] += clock() - start
+                    stat[2] += traced()[0] - before
+        else:
+            def wrapper(*args, **kwargs):
+                start = clock()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    stat[0] += 1
+                    stat[1] += clock() - start
+        wrapper.__wrapped__ = function
+        wrapper.__name__ = getattr(function, '__name__', name)
+        wrapper.__qualname__ = getattr(function, '__qualname__', name)
+        return wrapper
+
+    def patch(self):
+        for module_name, attribute, name in HOT_PATHS:
+            module = sys.modules.get(module_name)
+            if module is None:
+                continue
+            owner_name, _, attr = attribute.rpartition('.')
+            owner = getattr(module, owner_name) if owner_name else module
+            original = vars(owner).get(attr)
+            if original is None or hasattr(original, '__wrapped__'):
+                continue
+            setattr(owner, attr, self.wrap(original, name))
+            self.patched.append((owner, attr, original))
+
+    def unpatch(self):
+        for owner, attr, original in reversed(self.patched):
+            setattr(owner, attr, original)
+        self.patched = []
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def step(self, episodes=0):
+        self.steps += 1
+        if episodes:
+            self.count('episodes', episodes)
+        if self.capture and self.steps == self.capture_start:
+            self.start_capture()
+        elif self.capturing is not None and self.steps >= self.capture_start + self.capture_steps:
+            self.stop_capture()
+        if self.report_every is not None and time.perf_counter() - self.window_start >= self.report_every:
+            self.report()
+
+    def start_capture(self):
+        if self.capture == 'torch':
+            import torch
+            self.capturing = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU])
+            self.capturing.__enter__()
+        else:
+            self.capturing = cProfile.Profile()
+            self.capturing.enable()
+
+    def stop_capture(self):
+        if self.capture == 'torch':
+            self.capturing.__exit__(None, None, None)
+            self.capturing.export_chrome_trace(self.capture_out)
+        else:
+            self.capturing.disable()
+            self.capturing.dump_stats(self.capture_out)
+        self.capturing = None
+        self.log(f"profile: {self.capture} capture of steps {self.capture_start + 1}.."
+                 f"{self.capture_start + self.capture_steps} written to {self.capture_out}")
+
+    def snapshot(self):
+        # Aggregates of the current window
+        seconds = time.perf_counter() - self.window_start
+        decisions = sum(self.stats.get(name, [0])[0] for name in DECISION_TIMERS)
+        timers = {}
+        for name, (calls, total, allocated) in sorted(self.stats.items(), key=lambda item: -item[1][1]):
+            if calls:
+                timers[name] = {'calls': calls, 'ms': total * 1000, 'ms_per_call': total * 1000 / calls,
+                                'ms_per_decision': total * 1000 / decisions if decisions else None,
+                                'share': total / seconds if seconds else 0.0, 'bytes': allocated}
+        report = {'seconds': seconds, 'steps': self.steps, 'decisions': decisions,
+                  'decisions_per_second': decisions / seconds if seconds else 0.0, 'counters': dict(self.counters),
+                  'timers': timers}
+        if self.allocations:
+            report['traced_bytes'], report['peak_bytes'] = tracemalloc.get_traced_memory()
+        return report
+
+    def reset_window(self):
+        for stat in self.stats.values():
+            stat[:] = [0, 0.0, 0]
+        self.counters = {}
+        self.window_start = time.perf_counter()
+
+    def report(self):
+        # Logs the window and starts a new one; returns the snapshot
+        report = self.snapshot()
+        self.reset_window()
+        episodes = report['counters'].get('episodes', 0)
+        self.log(f"profile: {report['seconds']:.1f}s  steps {report['steps']}  episodes {episodes}  decisions "
+                 f"{report['decisions']} ({report['decisions_per_second']:.1f}/s)"
+                 + (f"  traced {report['traced_bytes'] / 1e6:.1f} MB  peak {report['peak_bytes'] / 1e6:.1f} MB"
+                    if self.allocations else ""))
+        self.log(f"  {'timer':<24}{'calls':>10}{'ms':>11}{'ms/call':>10}{'ms/decision':>13}{'wall':>7}"
+                 + (f"{'alloc KB':>11}" if self.allocations else ""))
+        for name, timer in report['timers'].items():
+            per_decision = '-' if timer['ms_per_decision'] is None else f"{timer['ms_per_decision']:.4f}"
+            self.log(f"  {name:<24}{timer['calls']:>10}{timer['ms']:>11.1f}{timer['ms_per_call']:>10.4f}"
+                     f"{per_decision:>13}{timer['share']:>7.1%}"
+                     + (f"{timer['bytes'] / 1024:>11.1f}" if self.allocations else ""))
+        return report
+
+
+_profiler = None
+
+
+def enable(**options):
+    # Profiler options (see Profiler); replaces a running profiler
+    global _profiler
+    disable(report=False)
+    _profiler = Profiler(**options)
+    if _profiler.allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _profiler.patch()
+    return _profiler
+
+
+def disable(report=True):
+    # Restores the hot paths; logs a last report of the open window unless report=False
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return None
+    if profiler.capturing is not None:
+        profiler.stop_capture()
+    profiler.unpatch()
+    last = profiler.report() if report else None
+    if profiler.allocations and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return last
+
+
+def enabled():
+    return _profiler is not None
+
+
+def step(episodes=0):
+    if _profiler is not None:
+        _profiler.step(episodes)
+
+
+def count(name, n=1):
+    if _profiler is not None:
+        _profiler.count(name, n)
+
+
+def report():
+    return None if _profiler is None else _profiler.report()
+
+
+def add_arguments(parser):
+    # Command line flags shared by the entry points; see from_args
+    group = parser.add_argument_group('profiling')
+    group.add_argument('--profile', action='store_true', help="time the hot paths and report at the end")
+    group.add_argument('--profile-every', type=float, help="seconds between profile reports (implies --profile)")
+    group.add_argument('--profile-allocations', action='store_true', help="track allocations with tracemalloc")
+    group.add_argument('--capture', choices=['cprofile', 'torch'], help="record a profiler trace window")
+    group.add_argument('--capture-start', type=int, default=10, help="step the capture starts at")
+    group.add_argument('--capture-steps', type=int, default=5)
+    group.add_argument('--capture-out', help="trace file, profile.prof or profile.json by default")
+
+
+def from_args(args):
+    # Enables profiling when any of the add_arguments flags asks for it, returns whether it did
+    if not (args.profile or args.profile_every or args.profile_allocations or args.capture):
+        return False
+    enable(report_every=args.profile_every, allocations=args.profile_allocations, capture=args.capture,
+           capture_start=args.capture_start, capture_steps=args.capture_steps, capture_out=args.capture_out)
+    return True
@@ -0,0 +1,420 @@
+import argparse
+import asyncio
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from agents import AGENTS, MODEL_AGENTS, RuleBasedAgent, make_agent
+from duplicate import board_conditions, north_south_score
+from game.bids import BID_NAMES, BID_ORDINAL
+from game.bitboard import CARD_NAMES, iter_cards, parse_card
+from game.deals import deal_hands
+from match import deal_steps
+
+'''
+Asyncio table server. One event loop hosts any number of tables, each a task stepping match.deal_steps;
+seats are humans on a TCP connection or bots. Bot decisions run on a thread pool (torch releases the GIL
+during inference), so a slow model never blocks the loop. Every move has a timeout; a seat that misses it,
+or whose player disconnected, is played for by a rule-based fallback that has followed the deal.
+
+Protocol: one JSON object per line.
+client -> {"type": "join", "table": id, "seat": 0, "wait": false, "boards": 8}
+              all optional; without a table id a new table is opened. wait keeps the table open for more
+              humans until {"type": "start"} or four humans have joined, the other seats are bots
+          {"type": "bid", "call": "1H" | "Pass" | "X" | "XX", "turn": n}, {"type": "card", "card": "10S", "turn": n}
+          {"type": "start"}, {"type": "leave"}
+server -> joined, deal (own hand), bid, contract, dummy, card, turn (id, kind, seat to play for, legal
+          actions, timeout), timeout (the fallback's action), result, error
+A bid or card must echo the id of the turn it answers; replies to an earlier turn (one that timed out)
+are dropped, so a late answer is never applied to a later decision.
+
+python server.py serve --port 8765 --bot rule --move-timeout 30
+python server.py play --port 8765
+'''
+
+BOT_TIMEOUT = 10.0
+
+
+def bot_factory(spec, greedy=True):
+    # seed -> new agent; checkpoint weights are loaded once and shared by all the bots
+    if spec in AGENTS or spec in MODEL_AGENTS:
+        return lambda seed: make_agent(spec, seed)
+    from AI.agents import ModelAgent
+    from AI.checkpoint import load_checkpoint
+    bidding_model, playing_models, _ = load_checkpoint(spec)
+    return lambda seed: ModelAgent(bidding_model, playing_models, greedy=greedy, seed=seed)
+
+
+def action_name(kind, action):
+    return BID_NAMES[action] if kind == 'bid' else CARD_NAMES[action]
+
+
+def legal_names(kind, mask):
+    return [action_name(kind, action) for action in np.flatnonzero(mask)]
+
+
+class Seat:
+    # Listener for one seat; the fallback follows every deal so it can take over at any move
+    def __init__(self, seat):
+        self.seat = seat
+        self.fallback = RuleBasedAgent()
+
+    def reset(self, hands, dealer, vulnerable):
+        self.fallback.reset(hands, dealer, vulnerable)
+
+    def observe_bid(self, seat, action):
+        self.fallback.observe_bid(seat, action)
+
+    def start_play(self, declarer, contract):
+        self.fallback.start_play(declarer, contract)
+
+    def observe_card(self, seat, card):
+        self.fallback.observe_card(seat, card)
+
+    def fallback_action(self, kind, obs, mask):
+        return self.fallback.choose_bid(obs, mask) if kind == 'bid' else self.fallback.choose_card(obs, mask)
+
+
+class BotSeat(Seat):
+    # make_agent() -> new agent. The deal's events are logged so that after a timeout, while the abandoned
+    # agent is still busy on its thread, a fresh agent can be brought up to date and the old one is never
+    # touched again
+    def __init__(self, seat, make_agent, executor, timeout=BOT_TIMEOUT):
+        super().__init__(seat)
+        self.make_agent = make_agent
+        self.agent = make_agent()
+        self.executor = executor
+        self.timeout = timeout
+        self.events = []
+
+    def _event(self, name, *args):
+        self.events.append((name, args))
+        getattr(self.agent, name)(*args)
+
+    def reset(self, hands, dealer, vulnerable):
+        super().reset(hands, dealer, vulnerable)
+        self.events = []
+        self._event('reset', hands, dealer, vulnerable)
+
+    def observe_bid(self, seat, action):
+        super().observe_bid(seat, action)
+        self._event('observe_bid', seat, action)
+
+    def start_play(self, declarer, contract):
+        super().start_play(declarer, contract)
+        self._event('start_play', declarer, contract)
+
+    def observe_card(self, seat, card):
+        super().observe_card(seat, card)
+        self._event('observe_card', seat, card)
+
+    def replace_agent(self):
+        self.agent = self.make_agent()
+        for name, args in self.events:
+            getattr(self.agent, name)(*args)
+
+    async def choose(self, kind, obs, mask):
+        choose = self.agent.choose_bid if kind == 'bid' else self.agent.choose_card
+        future = asyncio.get_running_loop().run_in_executor(self.executor, choose, obs, mask)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.replace_agent()
+            return self.fallback_action(kind, obs, mask)
+
+
+class Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.messages = asyncio.Queue()
+        self.closed = False
+
+    def send(self, message):
+        if not self.closed:
+            self.writer.write(json.dumps(message).encode() + b'\n')
+
+    async def read(self):
+        # Feeds self.messages until the client goes away, then queues None
+        try:
+            async for line in self.reader:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    self.send({'type': 'error', 'message': "invalid JSON"})
+                    continue
+                if isinstance(message, dict):
+                    await self.messages.put(message)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.closed = True
+            await self.messages.put(None)
+
+    async def flush(self):
+        if not self.closed:
+            try:
+                await self.writer.drain()
+            except ConnectionError:
+                self.closed = True
+
+
+class HumanSeat(Seat):
+    def __init__(self, seat, connection, timeout):
+        super().__init__(seat)
+        self.connection = connection
+        self.timeout = timeout
+        self.hands = None
+        self.dummy = None
+        self.played = 0
+        self.turn = 0
+
+    @property
+    def connected(self):
+        return not self.connection.closed
+
+    def reset(self, hands, dealer, vulnerable):
+        super().reset(hands, dealer, vulnerable)
+        self.hands = hands
+        self.played = 0
+        self.connection.send({'type': 'deal', 'seat': self.seat, 'dealer': dealer, 'vulnerable': list(vulnerable),
+                              'hand': [CARD_NAMES[card] for card in iter_cards(hands[self.seat])]})
+
+    def observe_bid(self, seat, action):
+        super().observe_bid(seat, action)
+        self.connection.send({'type': 'bid', 'seat': seat, 'call': BID_NAMES[action]})
+
+    def start_play(self, declarer, contract):
+        super().start_play(declarer, contract)
+        self.dummy = (declarer + 2) % 4
+        self.connection.send({'type': 'contract', 'declarer': declarer, 'contract': BID_NAMES[contract]})
+
+    def observe_card(self, seat, card):
+        super().observe_card(seat, card)
+        self.connection.send({'type': 'card', 'seat': seat, 'card': CARD_NAMES[card]})
+        self.played += 1
+        if self.played == 1:
+            self.connection.send({'type': 'dummy', 'seat': self.dummy,
+                                  'hand': [CARD_NAMES[c] for c in iter_cards(self.hands[self.dummy])]})
+
+    async def choose(self, kind, obs, mask):
+        if self.connected:
+            self.turn += 1
+            self.connection.send({'type': 'turn', 'turn': self.turn, 'kind': kind, 'seat': obs.seat,
+                                  'legal': legal_names(kind, mask), 'timeout': self.timeout})
+            await self.connection.flush()
+            try:
+                return await asyncio.wait_for(self._receive(kind, mask, self.turn), self.timeout)
+            except asyncio.TimeoutError:
+                pass
+        action = self.fallback_action(kind, obs, mask)
+        self.connection.send({'type': 'timeout', 'kind': kind, 'action': action_name(kind, action)})
+        return action
+
+    async def _receive(self, kind, mask, turn):
+        # Next legal action for this turn from the client; raises TimeoutError at once if it disconnects
+        while True:
+            message = await self.connection.messages.get()
+            if message is None or message.get('type') == 'leave':
+                self.connection.closed = True
+                raise asyncio.TimeoutError
+            if message.get('type') in ('bid', 'card') and message.get('turn') != turn:
+                # Late answer to a turn that has already been played by the fallback
+                self.connection.send({'type': 'error', 'message': "stale turn", 'turn': message.get('turn')})
+                continue
+            if message.get('type') != kind:
+                if message.get('type') in ('bid', 'card'):
+                    self.connection.send({'type': 'error', 'message': f"expected a {kind}"})
+                continue
+            action = BID_ORDINAL.get(message.get('call')) if kind == 'bid' else parse_card(message.get('card'))
+            if action is not None and mask[action]:
+                return action
+            self.connection.send({'type': 'error', 'message': "illegal action",
+                                  'legal': legal_names(kind, mask)})
+
+
+class Table:
+    def __init__(self, table_id, make_bot, executor, move_timeout, seed=None, boards=None):
+        self.id = table_id
+        self.make_bot = make_bot
+        self.executor = executor
+        self.move_timeout = move_timeout
+        self.rng = np.random.default_rng(seed)
+        self.boards = boards
+        self.seats = [None] * 4
+        self.started = asyncio.Event()
+        self.task = None
+
+    def free_seats(self):
+        return [seat for seat in range(4) if self.seats[seat] is None]
+
+    def humans(self):
+        return [seat for seat in self.seats if isinstance(seat, HumanSeat)]
+
+    def sit(self, seat, connection):
+        self.seats[seat] = HumanSeat(seat, connection, self.move_timeout)
+        if not self.free_seats():
+            self.start()
+
+    def start(self):
+        if self.task is None:
+            for seat in self.free_seats():
+                seed = int(self.rng.integers(2 ** 31))
+                self.seats[seat] = BotSeat(seat, lambda seed=seed: self.make_bot(seed), self.executor)
+            self.started.set()
+            self.task = asyncio.create_task(self.run())
+        return self.task
+
+    async def run(self):
+        # Boards until the last human has left (or `boards` are done)
+        for board in itertools.count(1):
+            if not any(seat.connected for seat in self.humans()):
+                break
+            if self.boards is not None and board > self.boards:
+                break
+            dealer, vulnerable = board_conditions(board)
+            result = await self.play_board([int(hand) for hand in deal_hands(self.rng, 1)[0]], dealer, vulnerable)
+            message = {'type': 'result', 'table': self.id, 'board': board,
+                       'contract': None if result['contract'] is None else BID_NAMES[result['contract']],
+                       'declarer': result['declarer'], 'doubled': result['doubled'],
+                       'declarer_tricks': result['declarer_tricks'],
+                       'north_south_score': north_south_score(result, vulnerable)}
+            for seat in self.humans():
+                seat.connection.send(message)
+                await seat.connection.flush()
+        for seat in self.humans():
+            seat.connection.send({'type': 'closed', 'table': self.id})
+            await seat.connection.flush()
+
+    async def play_board(self, hands, dealer, vulnerable):
+        steps = deal_steps(hands, dealer, vulnerable, self.seats, log=lambda message: None)
+        try:
+            kind, seat, obs, mask = next(steps)
+            while True:
+                action = await self.seats[seat].choose(kind, obs, mask)
+                kind, seat, obs, mask = steps.send(action)
+        except StopIteration as stop:
+            return stop.value
+
+
+class TableServer:
+    def __init__(self, bot='rule', workers=8, move_timeout=30.0, seed=0):
+        self.make_bot = bot_factory(bot)
+        self.executor = ThreadPoolExecutor(workers)
+        self.move_timeout = move_timeout
+        self.seeds = itertools.count(seed)
+        self.tables = {}
+        self.table_ids = itertools.count(1)
+
+    async def handle(self, reader, writer):
+        connection = Connection(reader, writer)
+        reading = asyncio.create_task(connection.read())
+        try:
+            table = await self._join(connection)
+            if table is not None:
+                await table.started.wait()
+                await table.task
+                self.tables.pop(table.id, None)
+        finally:
+            reading.cancel()
+            writer.close()
+
+    async def _join(self, connection):
+        while True:
+            message = await connection.messages.get()
+            if message is None:
+                return None
+            if message.get('type') != 'join':
+                connection.send({'type': 'error', 'message': "join first"})
+                continue
+            table = self.tables.get(message.get('table'))
+            if table is None:
+                table_id = message.get('table') or f"t{next(self.table_ids)}"
+                table = self.tables[table_id] = Table(table_id, self.make_bot, self.executor, self.move_timeout,
+                                                      next(self.seeds), message.get('boards'))
+            free = table.free_seats()
+            seat = message.get('seat', free[0] if free else None)
+            if table.task is not None or seat not in free:
+                connection.send({'type': 'error', 'message': "seat not available", 'free': free})
+                continue
+            table.sit(seat, connection)
+            connection.send({'type': 'joined', 'table': table.id, 'seat': seat})
+            if not message.get('wait', False):
+                table.start()
+            else:
+                asyncio.create_task(self._wait_for_start(table, connection))
+            return table
+
+    async def _wait_for_start(self, table, connection):
+        # Watches a waiting human for start / leave until the table starts
+        started = asyncio.create_task(table.started.wait())
+        while not started.done():
+            receive = asyncio.create_task(connection.messages.get())
+            await asyncio.wait({started, receive}, return_when=asyncio.FIRST_COMPLETED)
+            if not receive.done():
+                receive.cancel()
+                return
+            message = receive.result()
+            if message is None or message.get('type') in ('start', 'leave'):
+                table.start()
+                return
+            if started.done():
+                # Started by someone else meanwhile, the message belongs to the game
+                await connection.messages.put(message)
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+async def play_console(host, port, seat, table=None):
+    # Console client for one human seat, input() runs off the event loop
+    reader, writer = await asyncio.open_connection(host, port)
+    join = {'type': 'join', 'seat': seat}
+    if table:
+        join['table'] = table
+    writer.write(json.dumps(join).encode() + b'\n')
+    loop = asyncio.get_running_loop()
+    async for line in reader:
+        message = json.loads(line)
+        if message['type'] != 'turn':
+            print(' '.join(f"{key}={value}" for key, value in message.items()))
+            if message['type'] == 'closed':
+                break
+            continue
+        print(f"Seat {message['seat']} to {message['kind']}, legal: {' '.join(message['legal'])}")
+        action = (await loop.run_in_executor(None, input, "> ")).strip()
+        key = 'call' if message['kind'] == 'bid' else 'card'
+        writer.write(json.dumps({'type': message['kind'], key: action, 'turn': message['turn']}).encode() + b'\n')
+        await writer.drain()
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-table bridge server and console client")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--bot', default='rule', help="agent name from agents.py or a checkpoint path")
+    serve.add_argument('--workers', type=int, default=8, help="bot decision threads")
+    serve.add_argument('--move-timeout', type=float, default=30.0, help="seconds per human move")
+    serve.add_argument('--seed', type=int, default=0)
+    play = commands.add_parser('play')
+    play.add_argument('--host', default='127.0.0.1')
+    play.add_argument('--port', type=int, default=8765)
+    play.add_argument('--seat', type=int, default=0)
+    play.add_argument('--table', help="join this table instead of opening one")
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        asyncio.run(TableServer(args.bot, args.workers, args.move_timeout, args.seed).serve(args.host, args.port))
+    else:
+        asyncio.run(play_console(args.host, args.port, args.seat, args.table))
+
+
+if __name__ == "__main__":
+    main()
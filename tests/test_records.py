@@ -0,0 +1,88 @@
+from game.bids import BID_ORDINAL, PASS
+from game.bitboard import CARD_BY_NAME
+from game.records import iter_chunks, iter_records, map_chunks
+
+NORTH = 'AKQJ.AKQ.AKQ.AKQ'
+EAST = 'T987.JT9.JT9.JT9'
+SOUTH = '6543.876.876.876'
+WEST = '2.5432.5432.5432'
+
+PBN = f'''[Event "test"]
+[Board "1"]
+[Dealer "N"]
+[Vulnerable "None"]
+[Deal "N:{NORTH} {EAST} {SOUTH} {WEST}"]
+[Auction "N"]
+1NT Pass Pass Pass
+[Play "E"]
+ST S3 S2 SA
+H9 H6 H2 HA
+*
+[Result "12"]
+
+[Board "2"]
+[Dealer "E"]
+[Vulnerable "NS"]
+[Deal "E:{EAST} {SOUTH} {WEST} {NORTH}"]
+[Auction "E"]
+Pass 1S Pass Pass
+Pass
+'''
+
+
+def lin_hand(pbn_hand):
+    return ''.join(suit + ranks for suit, ranks in zip('SHDC', pbn_hand.split('.')))
+
+
+# Three boards on one line, hands listed S, W, N, E; the last board leaves out east's hand
+LIN = (f"qx|o1|md|3{lin_hand(SOUTH)},{lin_hand(WEST)},{lin_hand(NORTH)},{lin_hand(EAST)}|sv|o|"
+       f"mb|1N|mb|p|mb|p|mb|p|pc|ST|pc|S3|pc|S2|pc|SA|pc|HA|pc|H9|pc|H6|pc|H2|mc|12|pg||"
+       f"qx|o2|md|4{lin_hand(SOUTH)},{lin_hand(WEST)},{lin_hand(NORTH)},{lin_hand(EAST)}|sv|n|"
+       f"mb|p|mb|1S|mb|p|mb|p|mb|p|pg||"
+       f"qx|o3|md|1{lin_hand(SOUTH)},{lin_hand(WEST)},{lin_hand(NORTH)},|sv|e|mb|p|mb|p|mb|p|mb|p|pg||")
+
+
+def mask(pbn_hand):
+    cards = [rank + suit for suit, ranks in zip('SHDC', pbn_hand.split('.')) for rank in ranks]
+    return sum(1 << CARD_BY_NAME[card.replace('T', '10')] for card in cards)
+
+
+HANDS = [mask(NORTH), mask(EAST), mask(SOUTH), mask(WEST)]
+PLAY = [CARD_BY_NAME[card] for card in ('10S', '3S', '2S', 'AS', 'AH', '9H', '6H', '2H')]
+
+
+def fields(record):
+    return record.board, record.dealer, record.vulnerable, record.hands, record.auction, record.play, \
+        record.declarer_tricks
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_pbn_round_trip(tmp_path):
+    path = write(tmp_path, 'boards.pbn', PBN)
+    records = list(iter_records(path))
+    assert [fields(record) for record in records] == [
+        (1, 0, (False, False), HANDS, [BID_ORDINAL['1NT'], PASS, PASS, PASS], PLAY, 12),
+        (2, 1, (True, False), HANDS, [PASS, BID_ORDINAL['1S'], PASS, PASS, PASS], [], None),
+    ]
+    assert records[0].contract() == (BID_ORDINAL['1NT'], 0, 0)
+    chunks = list(map_chunks(path, list, chunk_boards=1))
+    assert [[fields(record) for record in chunk] for chunk in chunks] == [[fields(record)] for record in records]
+
+
+def test_single_line_lin(tmp_path):
+    path = write(tmp_path, 'boards.lin', LIN)
+    records = list(iter_records(path))
+    assert [fields(record) for record in records] == [
+        (1, 0, (False, False), HANDS, [BID_ORDINAL['1NT'], PASS, PASS, PASS], PLAY, 12),
+        (2, 1, (True, False), HANDS, [PASS, BID_ORDINAL['1S'], PASS, PASS, PASS], [], None),
+        (3, 2, (False, True), HANDS, [PASS] * 4, [], None),
+    ]
+    assert len(list(iter_chunks(path, chunk_boards=1))) == 3
+    chunks = list(map_chunks(path, list, chunk_boards=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert [fields(record) for chunk in chunks for record in chunk] == [fields(record) for record in records]
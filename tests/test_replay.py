@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from AI.replay import ReplayBuffer, SumTree
+
+
+def test_sum_tree_matches_linear_scan():
+    rng = np.random.default_rng(0)
+    capacity = 37
+    tree = SumTree(capacity)
+    priorities = np.zeros(capacity)
+    for _ in range(20):
+        slots = rng.choice(capacity, size=rng.integers(1, 10), replace=False)
+        priorities[slots] = rng.random(len(slots)) * 5
+        tree.update(slots, priorities[slots])
+        assert tree.total() == pytest.approx(priorities.sum())
+        assert np.allclose(tree.priorities(np.arange(capacity)), priorities)
+
+        values = rng.random(50) * priorities.sum()
+        # The slot whose cumulative priority range holds each value
+        expected = np.searchsorted(np.cumsum(priorities), values, side='left')
+        assert (tree.find(values) == expected).all()
+
+
+def test_sample_from_empty_buffer():
+    with pytest.raises(ValueError):
+        ReplayBuffer(8, 4, 3).sample(2)
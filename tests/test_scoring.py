@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from game.bids import BID_ORDINAL
+from game.scoring import contract_score, imps, score_batch
+
+
+@pytest.mark.parametrize('contract, doubled, vulnerable, tricks, score', [
+    ('1C', 0, False, 7, 70),
+    ('1NT', 0, False, 7, 90),
+    ('2C', 0, False, 9, 110),
+    ('3NT', 0, False, 9, 400),
+    ('3NT', 0, True, 9, 600),
+    ('4S', 0, False, 10, 420),
+    ('4S', 0, True, 11, 650),
+    ('6S', 0, False, 12, 980),
+    ('6S', 0, True, 12, 1430),
+    ('7NT', 0, True, 13, 2220),
+    ('1NT', 1, False, 7, 180),
+    ('2S', 1, False, 8, 470),
+    ('2S', 1, True, 8, 670),
+    ('1NT', 2, False, 7, 560),
+    ('3NT', 1, True, 10, 950),
+    ('4S', 0, True, 8, -200),
+    ('4S', 1, False, 9, -100),
+    ('4S', 1, False, 8, -300),
+    ('4S', 1, False, 7, -500),
+    ('4S', 1, False, 6, -800),
+    ('4S', 1, True, 9, -200),
+    ('4S', 1, True, 7, -800),
+    ('4S', 2, False, 9, -200),
+])
+def test_contract_score(contract, doubled, vulnerable, tricks, score):
+    assert contract_score(BID_ORDINAL[contract], doubled, vulnerable, tricks) == score
+
+
+def test_score_batch_matches_contract_score():
+    contracts = np.array([BID_ORDINAL['3NT'], BID_ORDINAL['4S'], -1])
+    scores = score_batch(contracts, np.array([0, 1, 0]), np.array([True, False, False]), np.array([9, 8, 0]))
+    assert scores.tolist() == [600, -300, 0]
+
+
+def test_imps():
+    differences = [0, 10, 20, 40, 50, 90, 120, 130, 420, 430, 740, 750, 1990, 2000, 3990, 4000, 9000, -450, -20]
+    expected = [0, 0, 1, 1, 2, 3, 3, 4, 9, 10, 12, 13, 18, 19, 23, 24, 24, -10, -1]
+    assert imps(differences).tolist() == expected
@@ -0,0 +1,86 @@
+import random
+from functools import lru_cache
+
+import pytest
+
+from game import solver
+from game.bitboard import SUIT_MASKS, iter_cards, trick_winner
+from game.solver import NO_TRUMP, DoubleDummySolver
+
+
+def random_ending(rng, cards):
+    deck = rng.sample(range(52), 4 * cards)
+    return tuple(sum(1 << card for card in deck[seat::4]) for seat in range(4))
+
+
+def brute_force(strain):
+    # f(hands, leader) -> maximum north-south tricks by plain minimax over every legal card, memoised at trick
+    # boundaries
+    trump = None if strain == NO_TRUMP else strain
+
+    @lru_cache(maxsize=None)
+    def trick_start(hands, leader):
+        if not hands[leader]:
+            return 0
+        return play(list(hands), leader, [])
+
+    def play(hands, leader, trick):
+        seat = (leader + len(trick)) % 4
+        legal = hands[seat]
+        if trick:
+            legal = hands[seat] & SUIT_MASKS[trick[0] // 13] or hands[seat]
+        results = []
+        for card in iter_cards(legal):
+            hands[seat] ^= 1 << card
+            trick.append(card)
+            if len(trick) == 4:
+                winner = (leader + trick_winner(trick, trump)) % 4
+                results.append((winner % 2 == 0) + trick_start(tuple(hands), winner))
+            else:
+                results.append(play(hands, leader, trick))
+            trick.pop()
+            hands[seat] ^= 1 << card
+        return max(results) if seat % 2 == 0 else min(results)
+
+    return trick_start
+
+
+@lru_cache(maxsize=None)
+def expected_table(hands):
+    # table[declarer][strain] of declarer-side tricks, the declarer's left-hand opponent on lead
+    table = [[0] * 5 for _ in range(4)]
+    for strain in range(5):
+        ns_tricks = brute_force(strain)
+        for declarer in range(4):
+            ns = ns_tricks(hands, (declarer + 1) % 4)
+            table[declarer][strain] = ns if declarer % 2 == 0 else hands[0].bit_count() - ns
+    return table
+
+
+ENDINGS = [random_ending(random.Random(seed), 4 if seed % 4 else 5) for seed in range(8)]
+
+
+@pytest.mark.parametrize('hands', ENDINGS)
+def test_python_search_matches_brute_force(hands):
+    assert DoubleDummySolver().solve_deal(hands) == expected_table(hands)
+
+
+def test_solve_contract(monkeypatch):
+    monkeypatch.setattr(solver, 'dds', None)
+    hands = ENDINGS[0]
+    table = expected_table(hands)
+    for strain in range(5):
+        for declarer in range(4):
+            assert solver.solve_contract(hands, strain, declarer) == table[declarer][strain]
+
+
+def test_dds_tables_of_partial_deals():
+    pytest.importorskip('endplay')
+    assert solver.dds_tables(ENDINGS) == [expected_table(hands) for hands in ENDINGS]
+
+
+def test_full_deal_without_dds_warns(monkeypatch):
+    monkeypatch.setattr(solver, 'dds', None)
+    monkeypatch.setattr(solver, '_python_deal', lambda hands: None)
+    with pytest.warns(RuntimeWarning):
+        solver.solve_deal(random_ending(random.Random(0), 13))
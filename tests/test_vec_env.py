@@ -0,0 +1,46 @@
+import numpy as np
+
+from game.bids import PASS
+from game.vec_env import BIDDING, VecBridgeEnv
+from game_local import GameLogic
+
+
+def new_game(hands):
+    game = GameLogic(hands=[int(hand) for hand in hands])
+    game.start_game()
+    return game
+
+
+def test_matches_game_logic():
+    # Random legal actions on seeded deals, each deal also played through GameLogic.apply
+    env = VecBridgeEnv(16, seed=1)
+    rng = np.random.default_rng(2)
+    games = [new_game(hands) for hands in env.hands]
+    finished = 0
+    while finished < 60:
+        bid_masks, play_masks = env.legal_bid_mask(), env.legal_play_mask()
+        actions = []
+        for i, game in enumerate(games):
+            assert env.seat[i] == game.current_player_index
+            assert env.hands[i].tolist() == [player.mask for player in game.players]
+            bidding = env.phase[i] == BIDDING
+            legal = bid_masks[i] if bidding else play_masks[i]
+            assert (legal == game.legal_action_mask()).all()
+            # Mostly passes, so that auctions end
+            actions.append(PASS if bidding and rng.random() < 0.6 else int(rng.choice(np.flatnonzero(legal))))
+        for game, action in zip(games, actions):
+            game.apply(action)
+
+        done = env.step(np.array(actions))
+        for i, game in enumerate(games):
+            assert game.is_over() == done[i]
+            if not done[i]:
+                continue
+            declarer = -1 if game.declarer is None else game.players.index(game.declarer)
+            assert env.final_contract[i] == game.bidding.highest
+            assert env.final_declarer[i] == declarer
+            assert env.final_doubled[i] == game.bidding.doubled
+            if declarer >= 0:
+                assert env.final_declarer_tricks[i] == game.tricks_won[1 + declarer % 2]
+            games[i] = new_game(env.hands[i])
+            finished += 1